@@ -0,0 +1,170 @@
+"""Replay every game in PGN files through the move generator and report statistics.
+
+Games are streamed one at a time, so collections of any size run in
+constant memory. Each move is checked for legality, and the final position
+against the recorded result. Batches of games go to a process pool.
+
+    python analyze_pgn.py games.pgn.gz --output stats.jsonl
+    python analyze_pgn.py --workers 1 --check-fen --limit 1000 games.pgn
+
+--output writes one JSON object per game, in file order. --check-fen also
+round-trips every position through FEN and checks the incremental hash
+key against one computed from scratch.
+"""
+import argparse
+import collections
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bitboard import PAWN, Position, move_from, move_to
+from pgn import PGNError, iter_game_texts, open_pgn, parse_game, parse_san, start_position
+from pieces import type_of
+
+# Expected result for the side that got mated
+MATED_RESULT = ('0-1', '1-0')
+
+
+def analyze_game(index, text, check_fen=False):
+    """Statistics for one game's PGN text, as a dict."""
+    game = parse_game(text)
+    stats = {'index': index, 'white': game.headers.get('White', '?'),
+             'black': game.headers.get('Black', '?'), 'result': game.result,
+             'plies': 0, 'captures': 0, 'checks': 0, 'legal_moves': 0, 'final': None,
+             'error': None}
+    try:
+        position = start_position(game.headers)
+    except (ValueError, IndexError) as e:
+        stats['error'] = f"bad FEN: {e}"
+        return stats
+
+    for ply, san in enumerate(game.moves, 1):
+        legal = position.legal_moves()
+        stats['legal_moves'] += len(legal)
+        try:
+            move = parse_san(position, san, legal)
+        except PGNError as e:
+            stats['error'] = f"ply {ply}: {e}"
+            return stats
+        to = move_to(move)
+        if position.mailbox[to] or (to == position.ep_square
+                                    and type_of(position.mailbox[move_from(move)]) == PAWN):
+            stats['captures'] += 1
+        position.make_move(move)
+        stats['plies'] = ply
+        if position.in_check():
+            stats['checks'] += 1
+        if check_fen:
+            error = _check_position(position)
+            if error:
+                stats['error'] = f"ply {ply}: {error}"
+                return stats
+
+    legal = position.legal_moves()
+    if not legal:
+        stats['final'] = 'checkmate' if position.in_check() else 'stalemate'
+    if stats['final'] == 'checkmate' and game.result != MATED_RESULT[position.side]:
+        stats['error'] = f"result {game.result} after checkmate"
+    elif stats['final'] == 'stalemate' and game.result not in ('1/2-1/2', '*'):
+        stats['error'] = f"result {game.result} after stalemate"
+    return stats
+
+
+def _check_position(position):
+    if position.key != position.compute_key():
+        return "incremental key differs from computed key"
+    fen = position.to_fen()
+    copy = Position.from_fen(fen)
+    if copy.key != position.key or copy.to_fen() != fen:
+        return f"FEN round trip differs: {fen}"
+    return None
+
+
+def _analyze_batch(batch):
+    start, texts, check_fen = batch
+    return [analyze_game(start + i, text, check_fen) for i, text in enumerate(texts)]
+
+
+def _batches(texts, batch_size, check_fen):
+    index = 0
+    while True:
+        chunk = list(itertools.islice(texts, batch_size))
+        if not chunk:
+            return
+        yield index, chunk, check_fen
+        index += len(chunk)
+
+
+def analyze(texts, workers=None, batch_size=64, check_fen=False):
+    """Yield per-game statistics for an iterable of game texts, in order.
+
+    With more than one worker, at most two batches per worker are queued
+    at a time, so memory stays bounded however long the input is.
+    """
+    batches = _batches(iter(texts), batch_size, check_fen)
+    if workers == 1:
+        for batch in batches:
+            yield from _analyze_batch(batch)
+        return
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = collections.deque()
+        for batch in batches:
+            pending.append(pool.submit(_analyze_batch, batch))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def read_texts(paths):
+    for path in paths:
+        with open_pgn(path) as f:
+            yield from iter_game_texts(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='+', help="PGN files (.gz/.bz2/.xz ok, - for stdin)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes (default: CPU count, 1 runs in-process)")
+    parser.add_argument('--batch-size', type=int, default=64,
+                        help="games sent to a worker at a time")
+    parser.add_argument('--limit', type=int, default=None, help="stop after this many games")
+    parser.add_argument('--output', help="write per-game statistics here as JSON lines")
+    parser.add_argument('--check-fen', action='store_true',
+                        help="also check FEN round trips and hash keys at every ply")
+    args = parser.parse_args(argv)
+
+    texts = itertools.islice(read_texts(args.paths), args.limit)
+    output = open(args.output, 'w') if args.output else None
+    games = errors = plies = 0
+    finals = collections.Counter()
+    start = time.perf_counter()
+    try:
+        for stats in analyze(texts, args.workers, args.batch_size, args.check_fen):
+            games += 1
+            plies += stats['plies']
+            finals[stats['final']] += 1
+            if stats['error']:
+                errors += 1
+                print(f"game {stats['index'] + 1} ({stats['white']} - {stats['black']}): "
+                      f"{stats['error']}", file=sys.stderr)
+            if output:
+                output.write(json.dumps(stats) + '\n')
+    finally:
+        if output:
+            output.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"{games} games, {plies} plies, {errors} with errors")
+    print(f"  {finals['checkmate']} checkmates, {finals['stalemate']} stalemates")
+    print(f"  {elapsed:.2f}s, {games / elapsed:,.0f} games/s, {plies / elapsed:,.0f} plies/s")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""Engine search in a worker process, so the pygame loop never waits on it.
+
+The UI sends requests through one queue and polls results from another
+with poll(), which never blocks. The worker has its own interpreter, so
+a long search does not compete with drawing for the GIL, and its
+transposition table lasts from move to move.
+
+    searcher = BackgroundSearch()
+    searcher.start(game.position, movetime=2.0)
+    ...                               # each frame or timer tick:
+    updated, result = searcher.poll()  # searcher.progress has the latest iteration
+    if result:
+        game.play_move(result.best_move)
+        searcher.ponder(game.position, result.pv[1])  # think on the opponent's time
+
+Every search has an id. Results from a cancelled or replaced search are
+dropped, so the UI only ever sees the search it last started.
+"""
+import multiprocessing
+import queue
+import threading
+import time
+
+from search import Engine
+
+
+def _worker(requests, results, hash_mb):
+    engine = Engine(hash_mb)
+    jobs = queue.Queue()
+    # Highest cancelled search id, the running id and ponderhit deadlines
+    # for searches that have not started yet, shared with the listener
+    state = {'cancelled': 0, 'running': None, 'deadlines': {}}
+    lock = threading.Lock()
+
+    def listen():
+        # Control messages must get through while the main thread is searching
+        while True:
+            message = requests.get()
+            kind = message[0]
+            with lock:
+                if kind == 'search':
+                    jobs.put(message)
+                elif kind == 'stop':
+                    state['cancelled'] = max(state['cancelled'], message[1])
+                    if state['running'] is not None and state['running'] <= message[1]:
+                        engine.stop()
+                elif kind == 'ponderhit':
+                    _, search_id, movetime = message
+                    deadline = time.perf_counter() + movetime if movetime is not None else None
+                    if state['running'] == search_id:
+                        engine.deadline = deadline
+                    else:
+                        state['deadlines'][search_id] = deadline
+                elif kind == 'quit':
+                    engine.stop()
+                    jobs.put(None)
+                    return
+
+    threading.Thread(target=listen, daemon=True).start()
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        _, search_id, position, depth, movetime = job
+        with lock:
+            if search_id <= state['cancelled']:
+                continue
+            state['running'] = search_id
+            if search_id in state['deadlines']:
+                deadline = state['deadlines'].pop(search_id)
+                movetime = deadline - time.perf_counter() if deadline is not None else None
+
+        def report(info, search_id=search_id):
+            results.put(('info', search_id, info))
+            # A stop that arrived before search() reset the flag is caught here
+            if search_id <= state['cancelled']:
+                engine.stop()
+
+        result = engine.search(position, depth=depth, movetime=movetime, info=report)
+        with lock:
+            state['running'] = None
+        results.put(('done', search_id, result))
+
+
+class BackgroundSearch:
+    """Client side of a search worker process.
+
+    progress is the SearchInfo of the active search's last completed
+    depth, or None. pondering is true while searching the position
+    after the opponent's predicted reply; opponent_moved() turns a
+    correct prediction into the real search without starting over.
+    """
+
+    def __init__(self, hash_mb=16):
+        # spawn: forking a process that already has a pygame window is unsafe
+        context = multiprocessing.get_context('spawn')
+        self._requests = context.Queue()
+        self._results = context.Queue()
+        self._process = context.Process(target=_worker, args=(self._requests, self._results,
+                                                              hash_mb), daemon=True)
+        self._process.start()
+        self._next_id = 0
+        self.search_id = None
+        self.progress = None
+        self._ponder_key = None
+        self._ponder_result = None
+        self._ready = None
+
+    @property
+    def busy(self):
+        return self.search_id is not None or self._ready is not None
+
+    @property
+    def pondering(self):
+        return self._ponder_key is not None
+
+    def start(self, position, movetime=None, depth=None):
+        """Search position, replacing any current search. Returns the search id."""
+        self.cancel()
+        self._next_id += 1
+        self.search_id = self._next_id
+        self._requests.put(('search', self.search_id, position.copy(), depth, movetime))
+        return self.search_id
+
+    def cancel(self):
+        if self.search_id is not None:
+            self._requests.put(('stop', self.search_id))
+        self.search_id = None
+        self.progress = None
+        self._ponder_key = None
+        self._ponder_result = None
+        self._ready = None
+
+    def ponder(self, position, predicted):
+        """Search position after the predicted move, with no time limit, until opponent_moved()."""
+        child = position.copy()
+        child.make_move(predicted)
+        self.start(child)
+        self._ponder_key = child.key
+
+    def opponent_moved(self, position, movetime=None, depth=None):
+        """Start thinking about position, keeping the ponder search if it predicted this move."""
+        if self._ponder_key is not None and position.key == self._ponder_key:
+            self._ponder_key = None
+            if self._ponder_result is not None:
+                self._ready, self._ponder_result = self._ponder_result, None
+            else:
+                self._requests.put(('ponderhit', self.search_id, movetime))
+            return self.search_id
+        return self.start(position, movetime, depth)
+
+    def poll(self):
+        """Read worker messages without blocking. Returns (progress updated, finished SearchInfo)."""
+        updated = False
+        result, self._ready = self._ready, None
+        if result is not None:
+            self.search_id = None
+        while True:
+            try:
+                kind, search_id, info = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if search_id != self.search_id:
+                continue
+            if kind == 'info':
+                self.progress = info
+                updated = True
+            elif self._ponder_key is not None:
+                # Finished (found a mate, or hit the depth limit) before the opponent moved
+                self._ponder_result = info
+            else:
+                self.search_id = None
+                result = info
+        return updated, result
+
+    def close(self):
+        self.cancel()
+        self._requests.put(('quit',))
+        self._process.join(timeout=1.0)
+        if self._process.is_alive():
+            self._process.terminate()
@@ -0,0 +1,702 @@
+"""Bitboard position representation and move generation.
+
+Squares are numbered 0..63 from a1 to h8 (``square = rank * 8 + file``).
+The pygame front-end works in ``(x, y)`` coordinates with ``y == 0`` on
+black's back rank; ``to_square`` and ``to_pos`` convert between the two.
+
+Moves are plain ints: ``from | to << 6 | promotion << 12``. The mailbox
+holds one pieces.py code per square (0 when empty).
+"""
+import random
+from collections.abc import MutableMapping
+
+# Piece constants live in pieces.py and are re-exported from here
+from pieces import (BISHOP, BLACK, COLOR_NAMES, DECODE, EMPTY, KING, KNIGHT, PAWN,
+                    PIECE_NAMES, PIECE_SYMBOLS, QUEEN, ROOK, TYPE_MASK, WHITE, color_of,
+                    parse_piece, piece_dict, type_of)
+
+FULL = (1 << 64) - 1
+FILE_A = 0x0101010101010101
+FILE_H = FILE_A << 7
+RANK_1 = 0xFF
+RANK_2 = RANK_1 << 8
+RANK_3 = RANK_1 << 16
+RANK_6 = RANK_1 << 40
+RANK_7 = RANK_1 << 48
+RANK_8 = RANK_1 << 56
+
+# Castling rights bits
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+ALL_CASTLING = 15
+CASTLING_SYMBOLS = {'K': WHITE_KINGSIDE, 'Q': WHITE_QUEENSIDE,
+                    'k': BLACK_KINGSIDE, 'q': BLACK_QUEENSIDE}
+
+PROMOTION_PIECES = (QUEEN, ROOK, BISHOP, KNIGHT)
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+
+def to_square(pos):
+    x, y = pos
+    return (7 - y) * 8 + x
+
+
+def to_pos(square):
+    return (square & 7, 7 - (square >> 3))
+
+
+def encode_move(from_sq, to_sq, promotion=0):
+    return from_sq | (to_sq << 6) | (promotion << 12)
+
+
+def move_from(move):
+    return move & 63
+
+
+def move_to(move):
+    return (move >> 6) & 63
+
+
+def move_promotion(move):
+    return move >> 12
+
+
+def square_name(sq):
+    return 'abcdefgh'[sq & 7] + str((sq >> 3) + 1)
+
+
+def parse_square(name):
+    return (int(name[1]) - 1) * 8 + 'abcdefgh'.index(name[0])
+
+
+def move_to_uci(move):
+    uci = square_name(move & 63) + square_name((move >> 6) & 63)
+    if move >> 12:
+        uci += PIECE_SYMBOLS[move >> 12].lower()
+    return uci
+
+
+def iter_squares(bb):
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def _step_table(deltas):
+    table = []
+    for sq in range(64):
+        f, r = sq & 7, sq >> 3
+        bb = 0
+        for df, dr in deltas:
+            nf, nr = f + df, r + dr
+            if 0 <= nf < 8 and 0 <= nr < 8:
+                bb |= 1 << (nr * 8 + nf)
+        table.append(bb)
+    return table
+
+
+def _ray_table(df, dr):
+    table = []
+    for sq in range(64):
+        f, r = sq & 7, sq >> 3
+        bb = 0
+        f, r = f + df, r + dr
+        while 0 <= f < 8 and 0 <= r < 8:
+            bb |= 1 << (r * 8 + f)
+            f, r = f + df, r + dr
+        table.append(bb)
+    return table
+
+
+KNIGHT_ATTACKS = _step_table(((1, 2), (2, 1), (2, -1), (1, -2),
+                              (-1, -2), (-2, -1), (-2, 1), (-1, 2)))
+KING_ATTACKS = _step_table(((1, 0), (1, 1), (0, 1), (-1, 1),
+                            (-1, 0), (-1, -1), (0, -1), (1, -1)))
+# PAWN_ATTACKS[color][sq] is the set of squares a pawn of that color on sq attacks
+PAWN_ATTACKS = (_step_table(((-1, 1), (1, 1))), _step_table(((-1, -1), (1, -1))))
+
+# Rays that walk towards higher square indices use the lowest blocker,
+# the others use the highest one.
+NORTH = _ray_table(0, 1)
+EAST = _ray_table(1, 0)
+NORTH_EAST = _ray_table(1, 1)
+NORTH_WEST = _ray_table(-1, 1)
+SOUTH = _ray_table(0, -1)
+WEST = _ray_table(-1, 0)
+SOUTH_WEST = _ray_table(-1, -1)
+SOUTH_EAST = _ray_table(1, -1)
+
+
+def rook_attacks(sq, occ):
+    attacks = 0
+    ray = NORTH[sq]
+    blockers = ray & occ
+    if blockers:
+        ray ^= NORTH[(blockers & -blockers).bit_length() - 1]
+    attacks |= ray
+    ray = EAST[sq]
+    blockers = ray & occ
+    if blockers:
+        ray ^= EAST[(blockers & -blockers).bit_length() - 1]
+    attacks |= ray
+    ray = SOUTH[sq]
+    blockers = ray & occ
+    if blockers:
+        ray ^= SOUTH[blockers.bit_length() - 1]
+    attacks |= ray
+    ray = WEST[sq]
+    blockers = ray & occ
+    if blockers:
+        ray ^= WEST[blockers.bit_length() - 1]
+    return attacks | ray
+
+
+def bishop_attacks(sq, occ):
+    attacks = 0
+    ray = NORTH_EAST[sq]
+    blockers = ray & occ
+    if blockers:
+        ray ^= NORTH_EAST[(blockers & -blockers).bit_length() - 1]
+    attacks |= ray
+    ray = NORTH_WEST[sq]
+    blockers = ray & occ
+    if blockers:
+        ray ^= NORTH_WEST[(blockers & -blockers).bit_length() - 1]
+    attacks |= ray
+    ray = SOUTH_WEST[sq]
+    blockers = ray & occ
+    if blockers:
+        ray ^= SOUTH_WEST[blockers.bit_length() - 1]
+    attacks |= ray
+    ray = SOUTH_EAST[sq]
+    blockers = ray & occ
+    if blockers:
+        ray ^= SOUTH_EAST[blockers.bit_length() - 1]
+    return attacks | ray
+
+
+def queen_attacks(sq, occ):
+    return rook_attacks(sq, occ) | bishop_attacks(sq, occ)
+
+
+# Castling rights that survive a move touching each square
+CASTLING_MASK = [ALL_CASTLING] * 64
+CASTLING_MASK[0] &= ~WHITE_QUEENSIDE
+CASTLING_MASK[4] &= ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASK[7] &= ~WHITE_KINGSIDE
+CASTLING_MASK[56] &= ~BLACK_QUEENSIDE
+CASTLING_MASK[60] &= ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASK[63] &= ~BLACK_KINGSIDE
+
+BACK_RANK_ORDER = (ROOK, KNIGHT, BISHOP, QUEEN, KING, BISHOP, KNIGHT, ROOK)
+
+# Zobrist keys, from a fixed seed so hashes are stable across runs and processes
+_zobrist_rng = random.Random(0x5EED)
+ZOBRIST_PIECES = [[[_zobrist_rng.getrandbits(64) for _ in range(64)] for _ in range(6)]
+                  for _ in range(2)]
+ZOBRIST_CASTLING = [_zobrist_rng.getrandbits(64) for _ in range(16)]
+ZOBRIST_EP_FILE = [_zobrist_rng.getrandbits(64) for _ in range(8)]
+ZOBRIST_SIDE = _zobrist_rng.getrandbits(64)
+del _zobrist_rng
+
+
+def _line_tables():
+    # BETWEEN[a][b]: squares strictly between two aligned squares.
+    # LINE[a][b]: the whole edge-to-edge line through them (0 if not aligned).
+    between = [[0] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+    rays = ((NORTH, SOUTH), (EAST, WEST), (NORTH_EAST, SOUTH_WEST), (NORTH_WEST, SOUTH_EAST))
+    for a in range(64):
+        for forward, backward in rays:
+            full = forward[a] | backward[a] | (1 << a)
+            for ray in (forward, backward):
+                for b in iter_squares(ray[a]):
+                    between[a][b] = ray[a] & ~ray[b] & ~(1 << b)
+                    line[a][b] = full
+    return between, line
+
+
+BETWEEN, LINE = _line_tables()
+
+
+class Position:
+    """Chess position stored as one 64-bit int per piece type and color."""
+
+    __slots__ = ('pieces', 'occupied', 'mailbox', 'kings', 'side', 'castling',
+                 'ep_square', 'halfmove_clock', 'fullmove_number', 'history', 'key')
+
+    def __init__(self):
+        self.pieces = [[0] * 6, [0] * 6]
+        self.occupied = [0, 0]
+        self.mailbox = bytearray(64)
+        # Cached king square per color, -1 when the color has no king
+        self.kings = [-1, -1]
+        self.side = WHITE
+        self.castling = 0
+        self.ep_square = -1
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        # Undo stack of (move, captured, castling, ep_square, halfmove_clock, key)
+        self.history = []
+        # Zobrist hash, kept up to date by put/remove/make_move
+        self.key = 0
+
+    @classmethod
+    def initial(cls):
+        position = cls()
+        for f in range(8):
+            position.put(8 + f, WHITE, PAWN)
+            position.put(48 + f, BLACK, PAWN)
+            position.put(f, WHITE, BACK_RANK_ORDER[f])
+            position.put(56 + f, BLACK, BACK_RANK_ORDER[f])
+        position.castling = ALL_CASTLING
+        position.key = position.compute_key()
+        return position
+
+    @classmethod
+    def from_fen(cls, fen):
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError(f"Invalid FEN: {fen!r}")
+        position = cls()
+        ranks = fields[0].split('/')
+        if len(ranks) != 8:
+            raise ValueError(f"Invalid FEN board: {fields[0]!r}")
+        for i, rank in enumerate(ranks):
+            f = 0
+            for char in rank:
+                if char.isdigit():
+                    f += int(char)
+                elif char.upper() in PIECE_SYMBOLS and f < 8:
+                    color = WHITE if char.isupper() else BLACK
+                    position.put((7 - i) * 8 + f, color, PIECE_SYMBOLS.index(char.upper()))
+                    f += 1
+                else:
+                    raise ValueError(f"Invalid FEN board: {fields[0]!r}")
+            if f != 8:
+                raise ValueError(f"Invalid FEN board: {fields[0]!r}")
+        if fields[1] not in ('w', 'b'):
+            raise ValueError(f"Invalid FEN side to move: {fields[1]!r}")
+        position.side = WHITE if fields[1] == 'w' else BLACK
+        if fields[2] != '-':
+            for char in fields[2]:
+                if char not in CASTLING_SYMBOLS:
+                    raise ValueError(f"Invalid FEN castling rights: {fields[2]!r}")
+                position.castling |= CASTLING_SYMBOLS[char]
+        position.ep_square = -1 if fields[3] == '-' else parse_square(fields[3])
+        if len(fields) >= 6:
+            position.halfmove_clock = int(fields[4])
+            position.fullmove_number = int(fields[5])
+        position.key = position.compute_key()
+        return position
+
+    def to_fen(self):
+        ranks = []
+        for rank in range(7, -1, -1):
+            row = ''
+            empty = 0
+            for f in range(8):
+                piece = self.mailbox[rank * 8 + f]
+                if not piece:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                symbol = PIECE_SYMBOLS[type_of(piece)]
+                row += symbol if color_of(piece) == WHITE else symbol.lower()
+            ranks.append(row + (str(empty) if empty else ''))
+        castling = ''.join(symbol for symbol, bit in CASTLING_SYMBOLS.items()
+                           if self.castling & bit) or '-'
+        ep = square_name(self.ep_square) if self.ep_square >= 0 else '-'
+        return (f"{'/'.join(ranks)} {'w' if self.side == WHITE else 'b'} {castling} {ep} "
+                f"{self.halfmove_clock} {self.fullmove_number}")
+
+    def copy(self):
+        position = Position.__new__(Position)
+        position.pieces = [self.pieces[0][:], self.pieces[1][:]]
+        position.occupied = self.occupied[:]
+        position.mailbox = self.mailbox[:]
+        position.kings = self.kings[:]
+        position.side = self.side
+        position.castling = self.castling
+        position.ep_square = self.ep_square
+        position.halfmove_clock = self.halfmove_clock
+        position.fullmove_number = self.fullmove_number
+        position.history = self.history[:]
+        position.key = self.key
+        return position
+
+    def put(self, sq, color, ptype):
+        if self.mailbox[sq]:
+            self.remove(sq)
+        bit = 1 << sq
+        self.pieces[color][ptype] |= bit
+        self.occupied[color] |= bit
+        self.mailbox[sq] = (color << 3) | (ptype + 1)
+        self.key ^= ZOBRIST_PIECES[color][ptype][sq]
+        if ptype == KING:
+            self.kings[color] = sq
+
+    def remove(self, sq):
+        """Take the piece off sq and return its code (EMPTY if there was none)."""
+        piece = self.mailbox[sq]
+        if not piece:
+            return EMPTY
+        color, ptype = DECODE[piece]
+        mask = ~(1 << sq)
+        self.pieces[color][ptype] &= mask
+        self.occupied[color] &= mask
+        self.mailbox[sq] = EMPTY
+        self.key ^= ZOBRIST_PIECES[color][ptype][sq]
+        if ptype == KING:
+            self.kings[color] = -1
+        return piece
+
+    def compute_key(self):
+        """Zobrist hash of the position computed from scratch."""
+        key = 0
+        for sq, piece in enumerate(self.mailbox):
+            if piece:
+                key ^= ZOBRIST_PIECES[color_of(piece)][type_of(piece)][sq]
+        key ^= ZOBRIST_CASTLING[self.castling]
+        if self.ep_square >= 0:
+            key ^= ZOBRIST_EP_FILE[self.ep_square & 7]
+        if self.side == BLACK:
+            key ^= ZOBRIST_SIDE
+        return key
+
+    def is_repetition(self):
+        """True if this position already occurred since the last irreversible move."""
+        key = self.key
+        history = self.history
+        for i in range(len(history) - 2, max(len(history) - self.halfmove_clock, 0) - 1, -2):
+            if history[i][5] == key:
+                return True
+        return False
+
+    def piece_at(self, sq):
+        """Piece code on sq, EMPTY (0) if the square is empty."""
+        return self.mailbox[sq]
+
+    def king_square(self, color):
+        return self.kings[color]
+
+    def attackers_to(self, sq, by_color, occ=None):
+        if occ is None:
+            occ = self.occupied[0] | self.occupied[1]
+        theirs = self.pieces[by_color]
+        queens = theirs[QUEEN]
+        return ((KNIGHT_ATTACKS[sq] & theirs[KNIGHT])
+                | (KING_ATTACKS[sq] & theirs[KING])
+                | (PAWN_ATTACKS[by_color ^ 1][sq] & theirs[PAWN])
+                | (bishop_attacks(sq, occ) & (theirs[BISHOP] | queens))
+                | (rook_attacks(sq, occ) & (theirs[ROOK] | queens)))
+
+    def is_attacked(self, sq, by_color):
+        return self.attackers_to(sq, by_color) != 0
+
+    def in_check(self, color=None):
+        if color is None:
+            color = self.side
+        king = self.king_square(color)
+        return king >= 0 and self.is_attacked(king, color ^ 1)
+
+    def pseudo_legal_moves(self, from_mask=FULL):
+        us = self.side
+        own = self.occupied[us]
+        enemy = self.occupied[us ^ 1]
+        occ = own | enemy
+        targets = ~own & FULL
+        bbs = self.pieces[us]
+        moves = []
+        append = moves.append
+
+        # Pawns
+        pawns = bbs[PAWN] & from_mask
+        if pawns:
+            self._pawn_moves(pawns, enemy, occ, append)
+
+        # Knights, bishops, rooks and queens
+        for pieces, attacks in ((bbs[KNIGHT], None),
+                                (bbs[BISHOP] | bbs[QUEEN], bishop_attacks),
+                                (bbs[ROOK] | bbs[QUEEN], rook_attacks)):
+            pieces &= from_mask
+            while pieces:
+                low = pieces & -pieces
+                pieces ^= low
+                frm = low.bit_length() - 1
+                if attacks is None:
+                    to_bb = KNIGHT_ATTACKS[frm] & targets
+                else:
+                    to_bb = attacks(frm, occ) & targets
+                while to_bb:
+                    low = to_bb & -to_bb
+                    to_bb ^= low
+                    append(frm | ((low.bit_length() - 1) << 6))
+
+        # King and castling
+        king_bb = bbs[KING] & from_mask
+        if king_bb:
+            frm = king_bb.bit_length() - 1
+            to_bb = KING_ATTACKS[frm] & targets
+            while to_bb:
+                low = to_bb & -to_bb
+                to_bb ^= low
+                append(frm | ((low.bit_length() - 1) << 6))
+            if self.castling:
+                self._castling_moves(frm, occ, append)
+        return moves
+
+    def _pawn_moves(self, pawns, enemy, occ, append):
+        us = self.side
+        empty = ~occ & FULL
+        if us == WHITE:
+            single = (pawns << 8) & empty
+            double = ((single & RANK_3) << 8) & empty
+            push = 8
+            last_rank = RANK_8
+        else:
+            single = (pawns >> 8) & empty
+            double = ((single & RANK_6) >> 8) & empty
+            push = -8
+            last_rank = RANK_1
+        for to in iter_squares(single & last_rank):
+            for promotion in PROMOTION_PIECES:
+                append((to - push) | (to << 6) | (promotion << 12))
+        single &= ~last_rank
+        while single:
+            low = single & -single
+            single ^= low
+            to = low.bit_length() - 1
+            append((to - push) | (to << 6))
+        while double:
+            low = double & -double
+            double ^= low
+            to = low.bit_length() - 1
+            append((to - 2 * push) | (to << 6))
+        if self.ep_square >= 0:
+            enemy |= 1 << self.ep_square
+        attacks = PAWN_ATTACKS[us]
+        while pawns:
+            low = pawns & -pawns
+            pawns ^= low
+            frm = low.bit_length() - 1
+            for to in iter_squares(attacks[frm] & enemy):
+                if (1 << to) & last_rank:
+                    for promotion in PROMOTION_PIECES:
+                        append(frm | (to << 6) | (promotion << 12))
+                else:
+                    append(frm | (to << 6))
+
+    def _castling_moves(self, king, occ, append):
+        us = self.side
+        them = us ^ 1
+        if us == WHITE:
+            if king != 4:
+                return
+            kingside, queenside = WHITE_KINGSIDE, WHITE_QUEENSIDE
+        else:
+            if king != 60:
+                return
+            kingside, queenside = BLACK_KINGSIDE, BLACK_QUEENSIDE
+        rooks = self.pieces[us][ROOK]
+        if self.castling & kingside and rooks & (1 << (king + 3)) \
+                and not occ & (0b11 << (king + 1)):
+            if not (self.is_attacked(king, them) or self.is_attacked(king + 1, them)
+                    or self.is_attacked(king + 2, them)):
+                append(king | ((king + 2) << 6))
+        if self.castling & queenside and rooks & (1 << (king - 4)) \
+                and not occ & (0b111 << (king - 3)):
+            if not (self.is_attacked(king, them) or self.is_attacked(king - 1, them)
+                    or self.is_attacked(king - 2, them)):
+                append(king | ((king - 2) << 6))
+
+    def pinned(self, color):
+        """Bitboard of color's pieces pinned to their own king."""
+        king = self.kings[color]
+        if king < 0:
+            return 0
+        them = self.pieces[color ^ 1]
+        occ = self.occupied[0] | self.occupied[1]
+        enemy = self.occupied[color ^ 1]
+        snipers = ((rook_attacks(king, enemy) & (them[ROOK] | them[QUEEN]))
+                   | (bishop_attacks(king, enemy) & (them[BISHOP] | them[QUEEN])))
+        pinned = 0
+        between = BETWEEN[king]
+        while snipers:
+            low = snipers & -snipers
+            snipers ^= low
+            blockers = between[low.bit_length() - 1] & occ
+            if blockers and not blockers & (blockers - 1):
+                pinned |= blockers
+        return pinned & self.occupied[color]
+
+    def legal_moves(self, from_mask=FULL):
+        us = self.side
+        them = us ^ 1
+        king = self.kings[us]
+        moves = self.pseudo_legal_moves(from_mask)
+        if king < 0:
+            return moves
+
+        checkers = self.attackers_to(king, them)
+        if not checkers:
+            evasion = FULL
+        elif checkers & (checkers - 1):
+            evasion = 0  # double check: only the king may move
+        else:
+            evasion = BETWEEN[king][checkers.bit_length() - 1] | checkers
+        pinned = self.pinned(us)
+        line = LINE[king]
+        ep_square = self.ep_square
+        mailbox = self.mailbox
+        # Squares the king may step to are checked with the king lifted off the board
+        king_occ = (self.occupied[0] | self.occupied[1]) & ~(1 << king)
+
+        legal = []
+        append = legal.append
+        for move in moves:
+            frm = move & 63
+            to = (move >> 6) & 63
+            if frm == king:
+                # Castling legality is settled during generation
+                if abs(to - frm) == 2 or not self.attackers_to(to, them, king_occ):
+                    append(move)
+            elif to == ep_square and type_of(mailbox[frm]) == PAWN:
+                # En passant removes two pieces from a line; just try it
+                self.make_move(move)
+                if not self.attackers_to(king, them):
+                    append(move)
+                self.unmake_move()
+            elif (1 << to) & evasion and (not (1 << frm) & pinned or (1 << to) & line[frm]):
+                append(move)
+        return legal
+
+    def is_checkmate(self):
+        return self.in_check() and not self.legal_moves()
+
+    def make_move(self, move):
+        frm = move & 63
+        to = (move >> 6) & 63
+        promotion = move >> 12
+        us = self.side
+        ptype = (self.mailbox[frm] & TYPE_MASK) - 1
+        captured = self.mailbox[to]
+        self.history.append((move, captured, self.castling, self.ep_square,
+                             self.halfmove_clock, self.key))
+        # put/remove keep the piece part of the key; side, castling and en passant
+        # are swapped in at the end
+        state_key = ZOBRIST_CASTLING[self.castling] ^ ZOBRIST_SIDE
+        if self.ep_square >= 0:
+            state_key ^= ZOBRIST_EP_FILE[self.ep_square & 7]
+
+        self.halfmove_clock += 1
+        if captured:
+            self.remove(to)
+            self.halfmove_clock = 0
+        self.remove(frm)
+
+        if ptype == PAWN:
+            self.halfmove_clock = 0
+            if to == self.ep_square:
+                self.remove(to - 8 if us == WHITE else to + 8)
+            if promotion:
+                ptype = promotion
+        elif ptype == KING and abs(to - frm) == 2:
+            # Castling: move the rook across the king
+            if to > frm:
+                self.remove(frm + 3)
+                self.put(frm + 1, us, ROOK)
+            else:
+                self.remove(frm - 4)
+                self.put(frm - 1, us, ROOK)
+        self.put(to, us, ptype)
+
+        if ptype == PAWN and abs(to - frm) == 16:
+            self.ep_square = (frm + to) >> 1
+        else:
+            self.ep_square = -1
+        self.castling &= CASTLING_MASK[frm] & CASTLING_MASK[to]
+        state_key ^= ZOBRIST_CASTLING[self.castling]
+        if self.ep_square >= 0:
+            state_key ^= ZOBRIST_EP_FILE[self.ep_square & 7]
+        self.key ^= state_key
+        if us == BLACK:
+            self.fullmove_number += 1
+        self.side = us ^ 1
+
+    def unmake_move(self):
+        """Take back the last move played with make_move."""
+        move, captured, castling, ep_square, halfmove_clock, key = self.history.pop()
+        frm = move & 63
+        to = (move >> 6) & 63
+        us = self.side ^ 1
+        ptype = type_of(self.remove(to))
+        if move >> 12:
+            ptype = PAWN
+        self.put(frm, us, ptype)
+
+        if captured:
+            self.put(to, color_of(captured), type_of(captured))
+        elif ptype == PAWN and to == ep_square:
+            self.put(to - 8 if us == WHITE else to + 8, us ^ 1, PAWN)
+        elif ptype == KING and abs(to - frm) == 2:
+            if to > frm:
+                self.remove(frm + 1)
+                self.put(frm + 3, us, ROOK)
+            else:
+                self.remove(frm - 1)
+                self.put(frm - 4, us, ROOK)
+
+        self.castling = castling
+        self.ep_square = ep_square
+        self.halfmove_clock = halfmove_clock
+        self.key = key
+        if us == BLACK:
+            self.fullmove_number -= 1
+        self.side = us
+
+
+class BoardView(MutableMapping):
+    """Dict-of-dicts view of a Position keyed by ``(x, y)`` board coordinates.
+
+    Lets code written against the old ``{(x, y): {'piece', 'color', 'symbol'}}``
+    board keep working on top of the bitboards.
+    """
+
+    def __init__(self, position):
+        self.position = position
+
+    def __getitem__(self, pos):
+        x, y = pos
+        piece = self.position.mailbox[to_square(pos)] if 0 <= x < 8 and 0 <= y < 8 else EMPTY
+        if not piece:
+            raise KeyError(pos)
+        return piece_dict(piece)
+
+    def __setitem__(self, pos, piece):
+        code = parse_piece(piece)
+        self.position.put(to_square(pos), color_of(code), type_of(code))
+
+    def __delitem__(self, pos):
+        if not self.position.remove(to_square(pos)):
+            raise KeyError(pos)
+
+    def __contains__(self, pos):
+        x, y = pos
+        return 0 <= x < 8 and 0 <= y < 8 and self.position.mailbox[to_square(pos)] != EMPTY
+
+    def __iter__(self):
+        occ = self.position.occupied[0] | self.position.occupied[1]
+        return (to_pos(sq) for sq in iter_squares(occ))
+
+    def __len__(self):
+        return (self.position.occupied[0] | self.position.occupied[1]).bit_count()
+
+    def copy(self):
+        return dict(self.items())
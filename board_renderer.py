@@ -0,0 +1,163 @@
+"""Dirty-rectangle board drawing shared by the pygame front-ends.
+
+The checkerboard is rendered once into a background surface. Each frame the
+game describes every square as a look, (fill, sprite, marker), and any
+overlays (text, banners, the timer bar) as (surface, topleft) pairs.
+BoardRenderer compares these with the previous frame, repaints only squares
+whose look changed or that an overlay moved off, and presents just those
+rects with pygame.display.update.
+
+Looks and overlays are compared by value, so pass cached surfaces (sprite
+atlas entries, render_text results) rather than building new ones per frame.
+"""
+from functools import lru_cache
+
+import pygame
+
+from profiling import PROFILER
+from text_cache import get_font
+
+
+@lru_cache(maxsize=None)
+def board_background(square_size, light, dark, board_size=8):
+    surface = pygame.Surface((square_size * board_size, square_size * board_size))
+    for row in range(board_size):
+        for col in range(board_size):
+            color = light if (row + col) % 2 == 0 else dark
+            surface.fill(color, (col * square_size, row * square_size, square_size, square_size))
+    return surface
+
+
+@lru_cache(maxsize=32)
+def banner(text_surface, background, padding=10):
+    """text_surface centred on a solid box padding pixels larger on each side."""
+    rect = text_surface.get_rect().inflate(2 * padding, 2 * padding)
+    surface = pygame.Surface(rect.size)
+    surface.fill(background)
+    surface.blit(text_surface, (padding, padding))
+    return surface
+
+
+def text_panel(text_surfaces, background, padding=6):
+    """text_surfaces stacked top to bottom on a solid box, for multi-line overlays.
+
+    Not cached, since panels like the profiling overlay change every frame.
+    """
+    width = max(surface.get_width() for surface in text_surfaces) + 2 * padding
+    height = sum(surface.get_height() for surface in text_surfaces) + 2 * padding
+    panel = pygame.Surface((width, height))
+    panel.fill(background)
+    y = padding
+    for surface in text_surfaces:
+        panel.blit(surface, (padding, y))
+        y += surface.get_height()
+    return panel
+
+
+def profile_overlay(profiler, bottom, color, background):
+    """(panel, topleft) showing profiler.overlay_lines() in the corner above bottom."""
+    # Rendered straight from the font: these lines change every frame and would churn render_text
+    font = get_font(14, 'Courier')
+    panel = text_panel([font.render(line, True, color) for line in profiler.overlay_lines()],
+                       background)
+    return panel, (0, bottom - panel.get_height())
+
+
+class BoardRenderer:
+    """Draws changed squares and overlays onto screen and presents only those rects.
+
+    A square's look is (fill, sprite, marker): fill is a colour covering the
+    background or None, sprite is drawn at the square's corner and marker is
+    centred on top. Overlays are drawn after the squares, in order. The parts
+    of overlays that lie off the board must be opaque and keep the same rect
+    from frame to frame, since only squares are repainted underneath them.
+    """
+
+    def __init__(self, screen, square_size, light, dark, board_size=8):
+        self.screen = screen
+        self.square_size = square_size
+        self.board_size = board_size
+        self.background = board_background(square_size, light, dark, board_size)
+        self._looks = {}
+        self._overlays = []
+        self._full = True
+
+    def invalidate(self):
+        """Repaint and present everything on the next render()."""
+        self._full = True
+
+    def square_rect(self, pos):
+        col, row = pos
+        return pygame.Rect(col * self.square_size, row * self.square_size,
+                           self.square_size, self.square_size)
+
+    def _squares_under(self, rect):
+        size = self.square_size
+        rect = rect.clip(self.background.get_rect())
+        if not rect.width or not rect.height:
+            return []
+        return [(col, row)
+                for row in range(rect.top // size, (rect.bottom - 1) // size + 1)
+                for col in range(rect.left // size, (rect.right - 1) // size + 1)]
+
+    def render(self, looks, overlays=()):
+        """Draw the frame described by looks ({pos: look}, missing = plain) and overlays."""
+        overlays = [(surface, pygame.Rect(topleft, surface.get_size()))
+                    for surface, topleft in overlays]
+        if self._full:
+            dirty = {(col, row) for row in range(self.board_size) for col in range(self.board_size)}
+        else:
+            dirty = {pos for pos in looks.keys() | self._looks.keys()
+                     if looks.get(pos) != self._looks.get(pos)}
+        changed_overlays = [] if self._full else [
+            overlay for overlay in self._overlays + overlays
+            if (overlay in self._overlays) != (overlay in overlays)
+        ]
+        for _, rect in changed_overlays:
+            dirty.update(self._squares_under(rect))
+
+        # Text overlays are antialiased, so one that is drawn again needs every
+        # square under it repainted first; repeat until that settles
+        redraw = [self._full or overlay in changed_overlays for overlay in overlays]
+        while True:
+            dirty_rects = [self.square_rect(pos) for pos in dirty]
+            grew = False
+            for i, (_, rect) in enumerate(overlays):
+                if not redraw[i] and rect.collidelist(dirty_rects) != -1:
+                    redraw[i] = grew = True
+                if redraw[i]:
+                    under = set(self._squares_under(rect))
+                    grew = grew or not under <= dirty
+                    dirty |= under
+            if not grew:
+                break
+
+        rects = []
+        for pos in dirty:
+            rect = self.square_rect(pos)
+            fill, sprite, marker = looks.get(pos, (None, None, None))
+            if fill is None:
+                self.screen.blit(self.background, rect, rect)
+            else:
+                self.screen.fill(fill, rect)
+            if sprite is not None:
+                self.screen.blit(sprite, rect)
+            if marker is not None:
+                self.screen.blit(marker, marker.get_rect(center=rect.center))
+            rects.append(rect)
+        for (surface, rect), again in zip(overlays, redraw):
+            if again:
+                self.screen.blit(surface, rect)
+                rects.append(rect)
+        rects.extend(rect for _, rect in changed_overlays)
+
+        self._looks = dict(looks)
+        self._overlays = overlays
+        PROFILER.count('squares', len(dirty))
+        with PROFILER.section('present'):
+            if self._full:
+                self._full = False
+                pygame.display.flip()
+            elif rects:
+                pygame.display.update(rects)
+        return rects
@@ -0,0 +1,267 @@
+"""Opening book in the Polyglot binary format, read through mmap.
+
+A book is a file of 16-byte big-endian entries (key, move, weight, learn)
+sorted by key. Looking up a position is a binary search over the mapped
+file. Opening a book reads nothing up front, and engine processes that
+map the same book share its pages.
+
+    python book.py build games.pgn.gz -o book.bin --plies 24 --min-games 3
+    python book.py probe book.bin --fen "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"
+    python book.py check              # transposed move orders share entries
+
+Entries use the Polyglot layout and move encoding (castling as king takes
+rook), but keys are this engine's Zobrist keys (see book_key()), not
+Polyglot's Random64 table, so use books built with build_book().
+"""
+import argparse
+import collections
+import mmap
+import os
+import random
+import struct
+import sys
+import tempfile
+
+from bitboard import (KING, PAWN, PAWN_ATTACKS, START_FEN, ZOBRIST_EP_FILE, Position,
+                      move_from, move_promotion, move_to)
+from pgn import (PGNError, PGNGame, move_to_san, open_pgn, parse_san, read_games,
+                 start_position)
+from pieces import type_of
+
+ENTRY = struct.Struct('>QHHI')
+KEY = struct.Struct('>Q')
+
+# Weight of a move per game result, from the mover's point of view
+RESULT_POINTS = {'win': 2, 'draw': 1, 'loss': 0}
+MAX_WEIGHT = 0xFFFF
+
+# Move orders reaching the same position, FENs of it with no en passant
+# square, and a move to store there; book.py check builds and probes each
+TRANSPOSITIONS = (
+    (('d4 Nf6 c4', 'c4 Nf6 d4'), ('rnbqkb1r/pppppppp/5n2/8/2PP4/8/PP2PPPP/RNBQKBNR b KQkq - 0 2',),
+     'e6'),
+    (('e4',), ('rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1',), 'c5'),
+    (('e4 e5 Nf3 Nc6', 'Nf3 Nc6 e4 e5'), (), 'Bb5'),
+)
+# A double push a pawn can take en passant, and the same position without the right
+EN_PASSANT_PAIR = ('e4 d5 e5 f5', 'rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq - 0 3')
+
+
+def book_key(position):
+    """position.key with the en passant file left out unless a pawn can take en passant.
+
+    Polyglot's rule: transposed move orders then reach the same key, and a
+    FEN with - for the en passant square finds the same entries.
+    """
+    ep_square = position.ep_square
+    side = position.side
+    if ep_square >= 0 and not PAWN_ATTACKS[side ^ 1][ep_square] & position.pieces[side][PAWN]:
+        return position.key ^ ZOBRIST_EP_FILE[ep_square & 7]
+    return position.key
+
+
+def encode_book_move(position, move):
+    """Polyglot move: to | from << 6 | promotion << 12, castling as the king taking its rook."""
+    frm, to = move_from(move), move_to(move)
+    if type_of(position.mailbox[frm]) == KING and abs(to - frm) == 2:
+        to = frm + 3 if to > frm else frm - 4
+    return to | (frm << 6) | (move_promotion(move) << 12)
+
+
+class OpeningBook:
+    """Read-only view of a book file. Use as a context manager or call close()."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size % ENTRY.size:
+            self._file.close()
+            raise ValueError(f"{path}: size {size} is not a multiple of {ENTRY.size}")
+        # mmap cannot map an empty file
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self._count = size // ENTRY.size
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def _first(self, key):
+        """Index of the first entry with a key not less than key."""
+        lo, hi = 0, self._count
+        data = self._map
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if KEY.unpack_from(data, mid * ENTRY.size)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def entries(self, key):
+        """(book move, weight) pairs stored for key."""
+        found = []
+        for i in range(self._first(key), self._count):
+            entry_key, move, weight, _ = ENTRY.unpack_from(self._map, i * ENTRY.size)
+            if entry_key != key:
+                break
+            found.append((move, weight))
+        return found
+
+    def moves(self, position):
+        """(encoded move, weight) for each book move that is legal in position."""
+        entries = self.entries(book_key(position))
+        if not entries:
+            return []
+        legal = {encode_book_move(position, move): move for move in position.legal_moves()}
+        return [(legal[book_move], weight) for book_move, weight in entries if book_move in legal]
+
+    def choose(self, position, rng=random, best=False):
+        """A book move chosen in proportion to its weight (or the heaviest one), or None."""
+        moves = [(move, weight) for move, weight in self.moves(position) if weight]
+        if not moves:
+            return None
+        if best:
+            return max(moves, key=lambda item: item[1])[0]
+        return rng.choices([move for move, _ in moves], [weight for _, weight in moves])[0]
+
+
+def build_book(games, plies=24, min_games=1):
+    """{key: {book move: weight}} from PGNGames, counting the first plies of each game.
+
+    A move scores 2 for a win and 1 for a draw by the side that played it,
+    so moves that only ever lost get weight 0 and are never chosen. Moves
+    seen in fewer than min_games games are left out.
+    """
+    points = collections.defaultdict(collections.Counter)
+    counts = collections.defaultdict(collections.Counter)
+    for game in games:
+        if game.result == '*':
+            continue
+        try:
+            position = start_position(game.headers)
+        except (ValueError, IndexError):
+            continue
+        for san in game.moves[:plies]:
+            try:
+                move = parse_san(position, san)
+            except PGNError:
+                break
+            if game.result == '1/2-1/2':
+                outcome = 'draw'
+            else:
+                outcome = 'win' if game.result == ('1-0', '0-1')[position.side] else 'loss'
+            book_move = encode_book_move(position, move)
+            key = book_key(position)
+            counts[key][book_move] += 1
+            points[key][book_move] += RESULT_POINTS[outcome]
+            position.make_move(move)
+
+    book = {}
+    for key, moves in counts.items():
+        kept = {move: points[key][move] for move, count in moves.items() if count >= min_games}
+        if kept:
+            # Scale down together so the relative weights survive the 16-bit field
+            scale = max(1, -(-max(kept.values()) // MAX_WEIGHT))
+            book[key] = {move: -(-weight // scale) if weight else 0
+                         for move, weight in kept.items()}
+    return book
+
+
+def write_book(path, book):
+    """Write {key: {book move: weight}} as a sorted book file."""
+    with open(path, 'wb') as f:
+        for key in sorted(book):
+            moves = book[key]
+            for move in sorted(moves, key=lambda move: (-moves[move], move)):
+                f.write(ENTRY.pack(key, move, moves[move], 0))
+
+
+def _play(sans, fen=START_FEN):
+    position = Position.from_fen(fen)
+    for san in sans:
+        position.make_move(parse_san(position, san))
+    return position
+
+
+def check_transpositions():
+    """Build a book from one move order per TRANSPOSITIONS entry and probe the others.
+
+    Returns the number of failures, printing a line for each check.
+    """
+    failures = 0
+    games = [PGNGame({}, orders[0].split() + [next_san], '1-0')
+             for orders, _, next_san in TRANSPOSITIONS]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'check.bin')
+        write_book(path, build_book(games))
+        with OpeningBook(path) as book:
+            for orders, fens, next_san in TRANSPOSITIONS:
+                positions = [(order, _play(order.split())) for order in orders]
+                positions += [(fen, _play([], fen)) for fen in fens]
+                for name, position in positions:
+                    found = [move_to_san(position, move) for move, _ in book.moves(position)]
+                    ok = next_san in found
+                    failures += not ok
+                    print(f"{name:<70} {'ok' if ok else f'MISMATCH (book moves {found})'}")
+    sans, fen = EN_PASSANT_PAIR
+    ok = book_key(_play(sans.split())) != book_key(_play([], fen))
+    failures += not ok
+    print(f"{sans + ' keeps its en passant file':<70} {'ok' if ok else 'MISMATCH'}")
+    return failures
+
+
+def _read_games(paths):
+    for path in paths:
+        with open_pgn(path) as f:
+            yield from read_games(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="build a book from PGN files")
+    build.add_argument('paths', nargs='+', help="PGN files (.gz/.bz2/.xz ok, - for stdin)")
+    build.add_argument('-o', '--output', default='book.bin')
+    build.add_argument('--plies', type=int, default=24, help="book depth in half-moves")
+    build.add_argument('--min-games', type=int, default=1,
+                       help="leave out moves played in fewer games")
+    probe = commands.add_parser('probe', help="list the book moves for a position")
+    probe.add_argument('book')
+    probe.add_argument('--fen', default=START_FEN)
+    commands.add_parser('check', help="check that transposed move orders share book entries")
+    args = parser.parse_args(argv)
+
+    if args.command == 'check':
+        return 1 if check_transpositions() else 0
+
+    if args.command == 'build':
+        book = build_book(_read_games(args.paths), args.plies, args.min_games)
+        write_book(args.output, book)
+        entries = sum(len(moves) for moves in book.values())
+        print(f"{args.output}: {len(book)} positions, {entries} entries")
+        return 0
+
+    position = Position.from_fen(args.fen)
+    with OpeningBook(args.book) as book:
+        moves = book.moves(position)
+        total = sum(weight for _, weight in moves) or 1
+        for move, weight in moves:
+            print(f"{move_to_san(position, move):8} {weight:6} {100 * weight / total:5.1f}%")
+        if not moves:
+            print("not in book")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+# build_atlas.py
+"""Bake the piece sprites into one pre-scaled atlas per square size.
+
+Run before packaging (build_mac.py and build_windows.py do this) so the app
+loads a single small PNG instead of decoding and scaling twelve 1024px ones:
+
+    python build_atlas.py            # default sizes
+    python build_atlas.py 100 200    # explicit square sizes in pixels
+"""
+import os
+import sys
+
+from PIL import Image
+
+from sprite_atlas import ATLAS_DIR, COLORS, PIECES, atlas_filename, source_filename
+
+DEFAULT_SIZES = (100,)  # WINDOW_SIZE // 8 in both games
+
+
+def bake_atlas(size, root='.'):
+    atlas = Image.new('RGBA', (size * len(PIECES), size * len(COLORS)), (0, 0, 0, 0))
+    for row, color in enumerate(COLORS):
+        for col, piece in enumerate(PIECES):
+            with Image.open(os.path.join(root, 'sprites', source_filename(color, piece))) as image:
+                scaled = image.convert('RGBA').resize((size, size), Image.LANCZOS)
+            atlas.paste(scaled, (col * size, row * size))
+
+    out_dir = os.path.join(root, ATLAS_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, atlas_filename(size))
+    atlas.save(path, optimize=True)
+    return path
+
+
+def bake_atlases(sizes=DEFAULT_SIZES, root='.'):
+    return [bake_atlas(size, root) for size in sizes]
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    for path in bake_atlases(sizes):
+        print(f"Wrote {path}")
@@ -3,6 +3,8 @@ import PyInstaller.__main__
 import os
 import shutil
 
+from build_atlas import bake_atlases
+
 def build_mac():
     # Clean previous builds
     if os.path.exists('build'):
@@ -10,13 +12,16 @@ def build_mac():
     if os.path.exists('dist'):
         shutil.rmtree('dist')
     
+    # Pre-scale the sprites so the app doesn't decode 1024px PNGs on every launch
+    bake_atlases()
+
     # The key is using the correct path separator and being explicit about data files
     PyInstaller.__main__.run([
         'knight_survival.py',
         '--onefile',
         '--windowed',
         '--name=KnightSurvival',
-        '--add-data=sprites/*:sprites',  # This is the key change - copy all sprite files
+        '--add-data=sprites/atlas/*:sprites/atlas',  # Only the baked atlas; the 1024px sources stay out of the bundle
         '--clean',
     ])
 
@@ -2,6 +2,8 @@ import PyInstaller.__main__
 import os
 import shutil
 
+from build_atlas import bake_atlases
+
 def build_windows():
     # Clean previous builds
     if os.path.exists('build'):
@@ -9,13 +11,16 @@ def build_windows():
     if os.path.exists('dist'):
         shutil.rmtree('dist')
 
+    # Pre-scale the sprites so the app doesn't decode 1024px PNGs on every launch
+    bake_atlases()
+
     # Windows uses semicolon as path separator in --add-data
     PyInstaller.__main__.run([
         'knight_survival.py',
         '--onefile',
         '--windowed',
         '--name=KnightSurvival',
-        '--add-data=sprites/*;sprites',  # Windows uses semicolon instead of colon
+        '--add-data=sprites/atlas/*;sprites/atlas',  # Windows uses semicolon instead of colon; only the baked atlas is bundled
         '--clean',
     ])
 
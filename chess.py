@@ -1,9 +1,18 @@
+import startup_timer
 import pygame
 import sys
 import os
+import multiprocessing
 
-# Initialize Pygame
-pygame.init()
+import chess_core
+import sprite_atlas
+from background_search import BackgroundSearch
+from book import OpeningBook
+from bitboard import move_to_uci
+from board_renderer import BoardRenderer, banner, profile_overlay
+from profiling import PROFILER, start_from_env
+from render_loop import RenderLoop
+from text_cache import render_text
 
 # Constants
 WINDOW_SIZE = 800
@@ -14,287 +23,155 @@ GRAY = (128, 128, 128)
 YELLOW = (255, 255, 0)
 DARK_GRAY = (64, 64, 64)  # Darker color for white pieces on light squares
 
-# Initialize display
-screen = pygame.display.set_mode((WINDOW_SIZE, WINDOW_SIZE))
-pygame.display.set_caption("Chess Game")
+# Computer opponent: CHESS_ENGINE=white or black picks its side; it thinks
+# ENGINE_MOVETIME seconds per move and, with ENGINE_PONDER=1, on your time too
+ENGINE_COLOR = os.environ.get('CHESS_ENGINE', '').lower() or None
+ENGINE_MOVETIME = float(os.environ.get('ENGINE_MOVETIME', 2.0))
+ENGINE_PONDER = os.environ.get('ENGINE_PONDER', '0') == '1'
+# Book file (see book.py) the engine plays from before it starts searching
+OPENING_BOOK = os.environ.get('OPENING_BOOK')
+# How often to read search progress while the engine is thinking
+SEARCH_POLL = 0.05
 
-class ChessGame:
-    def __init__(self):
-        self.board = self.init_board()
-        self.selected_piece = None
-        self.turn = 'white'
-        self.game_over = False
-        self.pieces_sprites = self.load_sprites()
-        
-    def init_board(self):
-        # Initialize standard chess board layout
-        board = {}
-        # Set up pawns
-        for i in range(8):
-            board[(i, 1)] = {'piece': 'pawn', 'color': 'black', 'symbol': 'p'}
-            board[(i, 6)] = {'piece': 'pawn', 'color': 'white', 'symbol': 'P'}
-            
-        # Set up other pieces
-        pieces = [
-            ('rook', 'R'), ('knight', 'N'), ('bishop', 'B'), 
-            ('queen', 'Q'), ('king', 'K'), ('bishop', 'B'), 
-            ('knight', 'N'), ('rook', 'R')
-        ]
-        # Set up back rows
-        for i in range(8):
-            board[(i, 0)] = {'piece': pieces[i][0], 'color': 'black', 'symbol': pieces[i][1].lower()}
-            board[(i, 7)] = {'piece': pieces[i][0], 'color': 'white', 'symbol': pieces[i][1]}
-            
-        return board
-
-    def is_in_check(self, color):
-        # Find king position
-        king_pos = None
-        for pos, piece in self.board.items():
-            if piece['piece'] == 'king' and piece['color'] == color:
-                king_pos = pos
-                break
-        
-        # Check if any opponent piece can capture the king
-        for pos, piece in self.board.items():
-            if piece['color'] != color:
-                valid_moves = self.get_valid_moves(pos, check_check=False)
-                if king_pos in valid_moves:
-                    return True
-        return False
+# Display surface, created by init_display() so importing this module stays headless
+screen = None
 
-    def is_checkmate(self, color):
-        if not self.is_in_check(color):
-            return False
-        
-        # Create a list of positions and pieces to avoid dictionary modification during iteration
-        pieces_to_check = [(pos, piece) for pos, piece in self.board.items() if piece['color'] == color]
-        
-        # Try all possible moves for all pieces
-        for pos, piece in pieces_to_check:
-            valid_moves = self.get_valid_moves(pos)
-            for move in valid_moves:
-                # Try move and see if still in check
-                original_board = self.board.copy()
-                self.board[move] = self.board[pos]
-                del self.board[pos]
-                
-                still_in_check = self.is_in_check(color)
-                self.board = original_board
-                
-                if not still_in_check:
-                    return False
-        return True
 
-    def get_valid_moves(self, pos, check_check=True):
-        piece = self.board.get(pos)
-        if not piece:
-            return []
-        
-        valid_moves = []
-        x, y = pos
-        
-        if piece['piece'] == 'pawn':
-            direction = 1 if piece['color'] == 'black' else -1
-            # Forward move
-            next_pos = (x, y + direction)
-            if 0 <= next_pos[1] < 8 and next_pos not in self.board:
-                valid_moves.append(next_pos)
-                # Initial two-square move
-                if (piece['color'] == 'black' and y == 1) or (piece['color'] == 'white' and y == 6):
-                    double_pos = (x, y + 2*direction)
-                    if double_pos not in self.board:
-                        valid_moves.append(double_pos)
-            # Capture moves diagonally
-            for dx in [-1, 1]:
-                capture_pos = (x + dx, y + direction)
-                if (0 <= capture_pos[0] < 8 and 0 <= capture_pos[1] < 8 and
-                    capture_pos in self.board and self.board[capture_pos]['color'] != piece['color']):
-                    valid_moves.append(capture_pos)
-                    
-        elif piece['piece'] == 'rook':
-            for direction in [(0, 1), (0, -1), (1, 0), (-1, 0)]:
-                for i in range(1, 8):
-                    new_pos = (x + direction[0]*i, y + direction[1]*i)
-                    if not (0 <= new_pos[0] < 8 and 0 <= new_pos[1] < 8):
-                        break
-                    if new_pos in self.board:
-                        if self.board[new_pos]['color'] != piece['color']:
-                            valid_moves.append(new_pos)
-                        break
-                    valid_moves.append(new_pos)
-                    
-        elif piece['piece'] == 'knight':
-            moves = [
-                (x+2, y+1), (x+2, y-1), (x-2, y+1), (x-2, y-1),
-                (x+1, y+2), (x+1, y-2), (x-1, y+2), (x-1, y-2)
-            ]
-            for move in moves:
-                if (0 <= move[0] < 8 and 0 <= move[1] < 8 and 
-                    (move not in self.board or self.board[move]['color'] != piece['color'])):
-                    valid_moves.append(move)
-                    
-        elif piece['piece'] == 'bishop':
-            for direction in [(1, 1), (1, -1), (-1, 1), (-1, -1)]:
-                for i in range(1, 8):
-                    new_pos = (x + direction[0]*i, y + direction[1]*i)
-                    if not (0 <= new_pos[0] < 8 and 0 <= new_pos[1] < 8):
-                        break
-                    if new_pos in self.board:
-                        if self.board[new_pos]['color'] != piece['color']:
-                            valid_moves.append(new_pos)
-                        break
-                    valid_moves.append(new_pos)
-                    
-        elif piece['piece'] == 'queen':
-            directions = [(0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)]
-            for direction in directions:
-                for i in range(1, 8):
-                    new_pos = (x + direction[0]*i, y + direction[1]*i)
-                    if not (0 <= new_pos[0] < 8 and 0 <= new_pos[1] < 8):
-                        break
-                    if new_pos in self.board:
-                        if self.board[new_pos]['color'] != piece['color']:
-                            valid_moves.append(new_pos)
-                        break
-                    valid_moves.append(new_pos)
-                    
-        elif piece['piece'] == 'king':
-            moves = [
-                (x+1, y), (x-1, y), (x, y+1), (x, y-1),
-                (x+1, y+1), (x+1, y-1), (x-1, y+1), (x-1, y-1)
-            ]
-            for move in moves:
-                if (0 <= move[0] < 8 and 0 <= move[1] < 8 and 
-                    (move not in self.board or self.board[move]['color'] != piece['color'])):
-                    valid_moves.append(move)
+def init_display():
+    global screen
+    pygame.init()
+    screen = pygame.display.set_mode((WINDOW_SIZE, WINDOW_SIZE))
+    pygame.display.set_caption("Chess Game")
+    return screen
 
-        # Filter moves that would leave king in check
-        if check_check:
-            filtered_moves = []
-            for move in valid_moves:
-                original_board = self.board.copy()
-                self.board[move] = self.board[pos]
-                del self.board[pos]
-                
-                if not self.is_in_check(piece['color']):
-                    filtered_moves.append(move)
-                    
-                self.board = original_board
-            return filtered_moves
-                    
-        return valid_moves
 
-    def promote_pawn(self, pos):
-        piece = self.board[pos]
-        if piece['piece'] == 'pawn':
-            if (piece['color'] == 'white' and pos[1] == 0) or (piece['color'] == 'black' and pos[1] == 7):
-                # Automatically promote to queen for simplicity
-                symbol = 'Q' if piece['color'] == 'white' else 'q'
-                self.board[pos] = {'piece': 'queen', 'color': piece['color'], 'symbol': symbol}
+class ChessGame(chess_core.ChessGame):
+    def __init__(self, fen=None, book=None):
+        super().__init__(fen, book)
+        self.pieces_sprites = self.load_sprites()
+        self.renderer = None
+        # One-line engine progress shown at the top of the board, or None
+        self.status = None
 
     def load_sprites(self):
-        sprites = {}
-        pieces = ['king', 'queen', 'rook', 'knight', 'bishop', 'pawn']
-        
-        try:
-            for piece in pieces:
-                sprite_root_folder = "./sprites"
-                black_path = f'{sprite_root_folder}/b_{piece}_png_shadow_1024px.png'
-                white_path = f'{sprite_root_folder}/w_{piece}_png_shadow_1024px.png'
-                
-                # Load and scale images
-                black_image = pygame.image.load(black_path)
-                white_image = pygame.image.load(white_path)
-                
-                # Scale images to fit squares
-                black_scaled = pygame.transform.scale(black_image, (SQUARE_SIZE, SQUARE_SIZE))
-                white_scaled = pygame.transform.scale(white_image, (SQUARE_SIZE, SQUARE_SIZE))
-                
-                sprites[f'black_{piece}'] = black_scaled
-                sprites[f'white_{piece}'] = white_scaled
-                
-        except FileNotFoundError as e:
-            print(f"Error loading sprites: {e}")
-            raise
-        
-        return sprites
+        # Pre-scaled atlas baked by build_atlas.py, sliced on first use
+        return sprite_atlas.load_sprites(SQUARE_SIZE)
 
     def draw(self):
-        # Draw board
-        for row in range(8):
-            for col in range(8):
-                # Draw board squares
-                color = WHITE if (row + col) % 2 == 0 else GRAY
-                if self.selected_piece and (col, row) == self.selected_piece:
-                    color = YELLOW
-                elif self.selected_piece and (col, row) in self.get_valid_moves(self.selected_piece):
-                    color = YELLOW
-                    
-                pygame.draw.rect(screen, color, 
-                               (col * SQUARE_SIZE, row * SQUARE_SIZE, 
-                                SQUARE_SIZE, SQUARE_SIZE))
-                
-                # Draw pieces
-                pos = (col, row)
-                if pos in self.board:
-                    piece = self.board[pos]
-                    sprite_key = f"{piece['color']}_{piece['piece']}"
-                    sprite = self.pieces_sprites[sprite_key]
-                    screen.blit(sprite, (col * SQUARE_SIZE, row * SQUARE_SIZE))
-        
-        # Draw checkmate message if game is over
+        if self.renderer is None:
+            # Board background is rendered once; frames repaint changed squares only
+            self.renderer = BoardRenderer(screen, SQUARE_SIZE, WHITE, GRAY)
+        looks = {}
+        for pos, piece in self.board.items():
+            sprite = self.pieces_sprites[f"{piece['color']}_{piece['piece']}"]
+            looks[pos] = (None, sprite, None)
+        highlighted = set(self.selected_targets)
+        if self.selected_piece:
+            highlighted.add(self.selected_piece)
+        for pos in highlighted:
+            sprite = looks[pos][1] if pos in looks else None
+            looks[pos] = (YELLOW, sprite, None)
+
+        overlays = []
+        if self.status:
+            overlays.append((banner(render_text(self.status, 20, WHITE), DARK_GRAY, 4), (0, 0)))
+        # Draw the result if the game is over
         if self.game_over:
-            winner = "Black" if self.turn == "white" else "White"
-            font = pygame.font.SysFont('Arial', 32)
-            text = font.render(f"{winner} wins by checkmate!", True, BLACK)
-            text_rect = text.get_rect(center=(WINDOW_SIZE//2, WINDOW_SIZE//2))
-            pygame.draw.rect(screen, WHITE, text_rect.inflate(20, 20))
-            screen.blit(text, text_rect)
-            
-        pygame.display.flip()
+            if self.result == '1/2-1/2':
+                message = "Draw!"
+            else:
+                message = f"{'White' if self.result == '1-0' else 'Black'} wins by checkmate!"
+            text = banner(render_text(message, 32, BLACK), WHITE)
+            overlays.append((text, text.get_rect(center=(WINDOW_SIZE//2, WINDOW_SIZE//2)).topleft))
+        if PROFILER.enabled:
+            overlays.append(profile_overlay(PROFILER, WINDOW_SIZE, WHITE, DARK_GRAY))
+
+        self.renderer.render(looks, overlays)
+
+
+def search_status(searcher):
+    info = searcher.progress
+    label = "Pondering" if searcher.pondering else "Thinking"
+    if info is None:
+        return f"{label}..."
+    best = move_to_uci(info.best_move) if info.best_move else '-'
+    return f"{label}: depth {info.depth}  best {best}  {info.nps:,.0f} nps"
+
 
 def main():
-    game = ChessGame()
-    running = True
-    
-    while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            elif event.type == pygame.MOUSEBUTTONDOWN and not game.game_over:
-                x, y = pygame.mouse.get_pos()
-                col, row = x // SQUARE_SIZE, y // SQUARE_SIZE
-                
-                if game.selected_piece is None:
-                    if (col, row) in game.board and game.board[(col, row)]['color'] == game.turn:
-                        game.selected_piece = (col, row)
-                else:
-                    # Handle piece movement with valid move checking
-                    start = game.selected_piece
-                    valid_moves = game.get_valid_moves(start)
-                    
-                    if (col, row) in valid_moves:
-                        # Handle capturing by replacing the piece
-                        game.board[(col, row)] = game.board[start]
-                        del game.board[start]
-                        
-                        # Check for pawn promotion
-                        game.promote_pawn((col, row))
-                        
-                        # Switch turns
-                        game.turn = 'black' if game.turn == 'white' else 'white'
-                        
-                        # Check for checkmate
-                        if game.is_checkmate(game.turn):
-                            game.game_over = True
-                            
-                    game.selected_piece = None
-        
+    start_from_env()
+    init_display()
+    game = ChessGame(book=OpeningBook(OPENING_BOOK) if OPENING_BOOK else None)
+    searcher = BackgroundSearch() if ENGINE_COLOR else None
+    loop = None
+
+    def engine_to_move():
+        return searcher is not None and game.turn == ENGINE_COLOR and not game.game_over
+
+    def poll_search():
+        with PROFILER.section('engine'):
+            updated, result = searcher.poll()
+        if result is not None:
+            game.play_move(result.best_move)
+            if ENGINE_PONDER and len(result.pv) > 1 and not game.game_over:
+                searcher.ponder(game.position, result.pv[1])
+        if not searcher.busy:
+            loop.set_timer(None)
+        status = search_status(searcher) if searcher.busy else None
+        changed = status != game.status
+        game.status = status
+        return changed or result is not None or updated
+
+    def think():
+        move = game.book_move()
+        if move:
+            searcher.cancel()
+            game.play_move(move)
+            return
+        # Engine searches run in another process; the loop keeps drawing meanwhile
+        searcher.opponent_moved(game.position, ENGINE_MOVETIME)
+        game.status = search_status(searcher)
+        loop.set_timer(SEARCH_POLL, poll_search)
+
+    def handle_event(event):
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+            PROFILER.toggle()
+            return True
+        if event.type != pygame.MOUSEBUTTONDOWN or game.game_over or engine_to_move():
+            return False
+        x, y = event.pos
+        col, row = x // SQUARE_SIZE, y // SQUARE_SIZE
+
+        if game.selected_piece is None:
+            if (col, row) in game.board and game.board[(col, row)]['color'] == game.turn:
+                game.selected_piece = (col, row)
+        else:
+            # Handle piece movement with valid move checking
+            moved = game.make_move(game.selected_piece, (col, row))
+            game.selected_piece = None
+            if moved and engine_to_move():
+                think()
+        return True
+
+    def draw():
         game.draw()
+        startup_timer.first_frame_presented("Chess")
+
+    # Blocks on input between moves instead of redrawing every iteration
+    loop = RenderLoop(draw, handle_event)
+    if engine_to_move():
+        think()
+    loop.run()
 
+    if searcher is not None:
+        searcher.close()
+    if game.book is not None:
+        game.book.close()
+    PROFILER.close()
     pygame.quit()
     sys.exit()
 
 if __name__ == "__main__":
+    # The engine worker is a spawned process; frozen builds need this to start it
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,168 @@
+"""Chess rules and game state, with no pygame dependency.
+
+chess.py layers sprites, drawing and the event loop on top of this module;
+tools and worker processes can import it without opening a window.
+"""
+import random
+
+from bitboard import (BLACK, COLOR_NAMES, PAWN, QUEEN, START_FEN, WHITE, BoardView, Position,
+                      move_promotion, move_to, to_pos, to_square)
+import pgn
+import tablebase
+from pieces import color_of, type_of
+from profiling import PROFILER
+
+
+class ChessGame:
+    def __init__(self, fen=None, book=None):
+        self.start_fen = fen or START_FEN
+        # Opening book (book.OpeningBook) consulted before any search, or None
+        self.book = book
+        self.position = self.init_board()
+        # Encoded moves per (position key, square, check_check); cleared whenever a move is played
+        self._move_cache = {}
+        self.selected_piece = None
+        # result is '1-0', '0-1' or '1/2-1/2' once the game has ended
+        self._update_result()
+
+    @property
+    def selected_piece(self):
+        return self._selected_piece
+
+    @selected_piece.setter
+    def selected_piece(self, pos):
+        # Work out the highlight squares once per selection instead of once per drawn square
+        self._selected_piece = pos
+        self.selected_targets = frozenset(self.get_valid_moves(pos)) if pos is not None else frozenset()
+
+    @property
+    def board(self):
+        # Compatibility view: {(x, y): {'piece', 'color', 'symbol'}} over the bitboards
+        return BoardView(self.position)
+
+    @property
+    def turn(self):
+        return COLOR_NAMES[self.position.side]
+
+    @turn.setter
+    def turn(self, color):
+        self.position.side = COLOR_NAMES.index(color)
+        self.position.key = self.position.compute_key()
+
+    def init_board(self):
+        # Initialize standard chess board layout, or the one given as FEN
+        if self.start_fen != START_FEN:
+            return Position.from_fen(self.start_fen)
+        return Position.initial()
+
+    def book_move(self, rng=random):
+        """A weighted random book move for the current position, or None when out of book."""
+        if self.book is None or self.game_over:
+            return None
+        return self.book.choose(self.position, rng)
+
+    def fen(self):
+        return self.position.to_fen()
+
+    def load_fen(self, fen):
+        """Start over from the position described by fen."""
+        self.start_fen = fen
+        self.position = self.init_board()
+        self._move_cache.clear()
+        self.selected_piece = None
+        self._update_result()
+
+    def pgn(self, headers=None, result=None):
+        """The moves played so far as PGN text."""
+        moves = [entry[0] for entry in self.position.history]
+        return pgn.export_game(moves, self.start_fen, headers, result or self.result or '*')
+
+    def is_in_check(self, color):
+        return self.position.in_check(COLOR_NAMES.index(color))
+
+    def is_checkmate(self, color):
+        position = self._position_for(COLOR_NAMES.index(color))
+        # Endings covered by a tablebase need no move generation
+        found = tablebase.probe(position)
+        if found is not None:
+            return found == (tablebase.LOSS, 0)
+        return position.is_checkmate()
+
+    def _update_result(self):
+        with PROFILER.section('check'):
+            self._evaluate_result()
+
+    def _evaluate_result(self):
+        position = self.position
+        found = tablebase.probe(position)
+        if found == (tablebase.LOSS, 0):
+            self.result = ('0-1', '1-0')[position.side]
+        elif tablebase.is_dead_draw(position):
+            self.result = '1/2-1/2'
+        elif found is not None and found[0] != tablebase.DRAW:
+            self.result = None  # won or lost but not over, so there are moves
+        elif position.legal_moves():
+            self.result = None
+        else:
+            self.result = ('0-1', '1-0')[position.side] if position.in_check() else '1/2-1/2'
+        self.game_over = self.result is not None
+
+    def _position_for(self, color):
+        # Move generation works for the side to move; look at the other side on a copy
+        if self.position.side == color:
+            return self.position
+        position = self.position.copy()
+        position.side = color
+        position.ep_square = -1
+        position.key = position.compute_key()
+        return position
+
+    def _moves_from(self, sq, check_check=True):
+        cache_key = (self.position.key, sq, check_check)
+        moves = self._move_cache.get(cache_key)
+        if moves is None:
+            PROFILER.count('movegen')
+            with PROFILER.section('movegen'):
+                piece = self.position.piece_at(sq)
+                if not piece:
+                    moves = ()
+                else:
+                    position = self._position_for(color_of(piece))
+                    if check_check:
+                        moves = tuple(position.legal_moves(1 << sq))
+                    else:
+                        moves = tuple(position.pseudo_legal_moves(1 << sq))
+            self._move_cache[cache_key] = moves
+        return moves
+
+    def get_valid_moves(self, pos, check_check=True):
+        # Promotions show up once per target square; the UI always promotes to a queen
+        return [to_pos(move_to(move)) for move in self._moves_from(to_square(pos), check_check)
+                if move_promotion(move) in (0, QUEEN)]
+
+    def make_move(self, start, end, promotion=QUEEN):
+        """Play start -> end if it is legal for the side to move. Returns True on success."""
+        from_sq, to_sq = to_square(start), to_square(end)
+        piece = self.position.piece_at(from_sq)
+        if not piece or color_of(piece) != self.position.side:
+            return False
+        for move in self._moves_from(from_sq):
+            if move_to(move) == to_sq and move_promotion(move) in (0, promotion):
+                self.play_move(move)
+                return True
+        return False
+
+    def play_move(self, move):
+        """Apply an already legal encoded move, e.g. one returned by search.Engine."""
+        self.position.make_move(move)
+        self._move_cache.clear()
+        self.selected_piece = None
+        self._update_result()
+
+    def promote_pawn(self, pos):
+        # Promotion now happens in make_move; kept for callers that edit the board directly
+        piece = self.position.piece_at(to_square(pos))
+        if piece and type_of(piece) == PAWN:
+            color = color_of(piece)
+            if (color == WHITE and pos[1] == 0) or (color == BLACK and pos[1] == 7):
+                self.position.put(to_square(pos), color, QUEEN)
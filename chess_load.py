@@ -0,0 +1,150 @@
+"""Load generator for chess_server.py: many simulated games, with move latency percentiles.
+
+    python chess_load.py --sessions 2000 --connections 50 --plies 40
+    python chess_load.py --sessions 200 --engine-depth 2
+
+Each session plays one game of random legal moves, waiting for the
+server's answer before its next move. --engine-depth makes the server play
+black at that depth. Sessions are spread over --connections connections
+and all run at once. The report gives the time from sending a move to its
+ok (move latency) and to the engine's reply (engine latency).
+
+Run it on another machine than the server, or the two share the CPU and
+the numbers include the client's own work.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+
+from bitboard import Position, move_to_uci
+from chess_server import DEFAULT_PORT
+
+
+class _Connection:
+    """One TCP connection; replies are routed to a queue per game name."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.queues = {}
+        self._reading = asyncio.create_task(self._read())
+
+    async def _read(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            words = line.decode().split()
+            if len(words) > 1 and words[1] in self.queues:
+                self.queues[words[1]].put_nowait(words)
+        for queue in self.queues.values():
+            queue.put_nowait(None)
+
+    def send(self, text):
+        self.writer.write(text.encode() + b'\n')
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        self._reading.cancel()
+
+
+async def play_session(connection, name, plies, engine_depth, rng, stats):
+    """Play one game; latencies (seconds) go into stats['move'] and stats['engine']."""
+    queue = connection.queues[name] = asyncio.Queue()
+    engine = f" black {engine_depth}" if engine_depth else " -"
+    connection.send(f"new {name}{engine}")
+    reply = await queue.get()
+    if reply is None or reply[0] != 'game':
+        stats['errors'] += 1
+        return
+    position = Position.initial()
+    for _ in range(plies):
+        moves = position.legal_moves()
+        if not moves:
+            break
+        move = rng.choice(moves)
+        text = move_to_uci(move)
+        start = time.perf_counter()
+        connection.send(f"move {name} {text}")
+        reply = await queue.get()
+        if reply is None or reply[0] != 'ok':
+            stats['errors'] += 1
+            break
+        stats['move'].append(time.perf_counter() - start)
+        position.make_move(move)
+        if reply[3] != '*':
+            break
+        if engine_depth:
+            reply = await queue.get()
+            if reply is None or reply[0] != 'move':
+                stats['errors'] += 1
+                break
+            stats['engine'].append(time.perf_counter() - start)
+            legal = {move_to_uci(move): move for move in position.legal_moves()}
+            position.make_move(legal[reply[2]])
+            if reply[3] != '*':
+                break
+    connection.send(f"end {name}")
+    stats['games'] += 1
+    del connection.queues[name]
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def describe(label, samples):
+    if not samples:
+        return f"{label}: no samples"
+    ordered = sorted(samples)
+    return (f"{label}: n={len(ordered)}  p50 {percentile(ordered, 0.50) * 1000:.2f} ms  "
+            f"p99 {percentile(ordered, 0.99) * 1000:.2f} ms  max {ordered[-1] * 1000:.2f} ms  "
+            f"mean {statistics.fmean(ordered) * 1000:.2f} ms")
+
+
+async def run(host, port, sessions, connections, plies, engine_depth, seed):
+    stats = {'move': [], 'engine': [], 'errors': 0, 'games': 0}
+    links = []
+    for _ in range(min(connections, sessions)):
+        reader, writer = await asyncio.open_connection(host, port)
+        links.append(_Connection(reader, writer))
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    await asyncio.gather(*(play_session(links[i % len(links)], f"g{i}", plies, engine_depth,
+                                        random.Random(rng.random()), stats)
+                           for i in range(sessions)))
+    elapsed = time.perf_counter() - start
+    for link in links:
+        await link.close()
+    return stats, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--sessions', type=int, default=1000, help="games played at once")
+    parser.add_argument('--connections', type=int, default=50)
+    parser.add_argument('--plies', type=int, default=40, help="client moves per game at most")
+    parser.add_argument('--engine-depth', type=int, default=0,
+                        help="have the server reply as black at this depth (default: no engine)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    stats, elapsed = asyncio.run(run(args.host, args.port, args.sessions, args.connections,
+                                     args.plies, args.engine_depth, args.seed))
+    moves = len(stats['move'])
+    print(f"{stats['games']} games, {moves} moves in {elapsed:.2f}s "
+          f"({moves / elapsed:,.0f} moves/s), {stats['errors']} errors")
+    print(describe("move latency", stats['move']))
+    if args.engine_depth:
+        print(describe("engine latency", stats['engine']))
+    return 1 if stats['errors'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,382 @@
+"""Asyncio server hosting many chess games at once, over TCP or WebSocket.
+
+    python chess_server.py --port 8765 --workers 2 --depth 3
+    python chess_load.py --sessions 2000 --connections 50
+
+Clients send one command per line (one per text frame over WebSocket), and
+may play any number of games on one connection, each named by a token of
+their choosing:
+
+    new <game> [<engine colour> [<depth>]]   start from the initial position; the
+                                             server plays white or black, or - for neither
+    move <game> <uci>                        play e2e4, e7e8q, ...
+    fen <game>
+    end <game>
+    stats
+
+Replies:
+
+    game <game> <fen>
+    ok <game> <uci> <result>      the move was played; result is * while the game goes on
+    move <game> <uci> <result>    the engine's reply
+    illegal <game> <uci>          not legal here, or not your turn
+    fen <game> <fen>
+    ended <game>
+    stats connections=<n> games=<n> pending=<n> moves=<n> engine_moves=<n>
+    error <message>
+
+Moves are checked with chess_core.ChessGame on the event loop, which takes
+well under a millisecond. Engine searches run in a shared process pool. At
+most --max-pending of them are handed to the pool at a time; the rest wait
+on the event loop without blocking it.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import multiprocessing
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from bitboard import COLOR_NAMES, move_to_uci
+from chess_core import ChessGame
+from search import Engine
+
+DEFAULT_PORT = 8765
+DEFAULT_DEPTH = 3
+# Cap on the seconds one engine move may take, whatever depth was asked for
+DEFAULT_MOVETIME = 1.0
+DEFAULT_HASH_MB = 16
+# Longest command accepted; anything longer closes the connection
+MAX_LINE = 4096
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+_engine = None
+
+
+def _init_worker(hash_mb):
+    global _engine
+    _engine = Engine(hash_mb)
+
+
+def _engine_move(position, depth, movetime):
+    """Best move for position from this worker's engine, or None if there is none."""
+    return _engine.search(position, depth=depth, movetime=movetime).best_move
+
+
+class _LineStream:
+    """Newline-separated commands over a plain TCP stream."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def readline(self):
+        try:
+            line = await self.reader.readuntil(b'\n')
+        except asyncio.IncompleteReadError as e:
+            line = e.partial
+        except asyncio.LimitOverrunError:
+            return None
+        return line.decode('utf-8', 'replace') if line else None
+
+    def send(self, text):
+        self.writer.write(text.encode() + b'\n')
+
+
+class _WebSocketStream:
+    """Commands as WebSocket text frames (RFC 6455), without extensions."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self._lines = []
+
+    async def readline(self):
+        while not self._lines:
+            message = await self._read_message()
+            if message is None:
+                return None
+            self._lines = message.splitlines() or ['']
+        return self._lines.pop(0)
+
+    async def _read_message(self):
+        parts = []
+        try:
+            while True:
+                head, length = await self.reader.readexactly(2)
+                opcode = head & 0x0F
+                length &= 0x7F
+                if length == 126:
+                    length, = struct.unpack('>H', await self.reader.readexactly(2))
+                elif length == 127:
+                    length, = struct.unpack('>Q', await self.reader.readexactly(8))
+                if length > MAX_LINE:
+                    return None
+                mask = await self.reader.readexactly(4)
+                payload = await self.reader.readexactly(length)
+                data = bytes(b ^ mask[i & 3] for i, b in enumerate(payload))
+                if opcode == 0x8:  # close
+                    self._frame(0x8, data[:2])
+                    return None
+                if opcode == 0x9:  # ping
+                    self._frame(0xA, data)
+                elif opcode in (0x0, 0x1):
+                    parts.append(data)
+                    if head & 0x80:
+                        return b''.join(parts).decode('utf-8', 'replace')
+        except asyncio.IncompleteReadError:
+            return None
+
+    def _frame(self, opcode, data):
+        if len(data) < 126:
+            header = struct.pack('>BB', 0x80 | opcode, len(data))
+        elif len(data) < 1 << 16:
+            header = struct.pack('>BBH', 0x80 | opcode, 126, len(data))
+        else:
+            header = struct.pack('>BBQ', 0x80 | opcode, 127, len(data))
+        self.writer.write(header + data)
+
+    def send(self, text):
+        self._frame(0x1, text.encode())
+
+
+async def _accept_websocket(reader, writer):
+    """Finish the HTTP upgrade after the request line. Returns False for anything else."""
+    key = None
+    while True:
+        line = await reader.readline()
+        if not line or line in (b'\r\n', b'\n'):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'sec-websocket-key':
+            key = value.strip()
+    if key is None:
+        writer.write(b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n')
+        return False
+    accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+    writer.write(b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n'
+                 b'Connection: Upgrade\r\nSec-WebSocket-Accept: ' + accept.encode() + b'\r\n\r\n')
+    return True
+
+
+class Session:
+    """One game on a connection: the rules state and the colour the engine plays, if any."""
+
+    def __init__(self, engine_color=None, depth=DEFAULT_DEPTH):
+        self.game = ChessGame()
+        self.engine_color = engine_color
+        self.depth = depth
+        # True while the engine is computing a move
+        self.thinking = False
+
+    def engine_to_move(self):
+        return self.engine_color == self.game.turn and not self.game.game_over
+
+
+class ChessServer:
+    """Games per connection plus the engine pool they share."""
+
+    def __init__(self, workers=None, max_pending=None, depth=DEFAULT_DEPTH,
+                 movetime=DEFAULT_MOVETIME, hash_mb=DEFAULT_HASH_MB):
+        workers = workers or os.cpu_count() or 1
+        # spawn: forked workers would inherit the event loop and the listening socket
+        self.pool = ProcessPoolExecutor(max_workers=workers,
+                                        mp_context=multiprocessing.get_context('spawn'),
+                                        initializer=_init_worker, initargs=(hash_mb,))
+        self.depth = depth
+        self.movetime = movetime
+        self._slots = asyncio.Semaphore(max_pending or 4 * workers)
+        self.connections = 0
+        self.games = 0
+        self.pending = 0
+        self.moves = 0
+        self.engine_moves = 0
+        # The event loop keeps only weak references to tasks
+        self._replies = set()
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    async def handle_connection(self, reader, writer):
+        self.connections += 1
+        sessions = {}
+        try:
+            first = await reader.readline()
+            if first.startswith(b'GET '):
+                if not await _accept_websocket(reader, writer):
+                    return
+                stream = _WebSocketStream(reader, writer)
+                line = await stream.readline()
+            else:
+                stream = _LineStream(reader, writer)
+                line = first.decode('utf-8', 'replace') if first else None
+            while line is not None:
+                if len(line) > MAX_LINE:
+                    break
+                self.handle(stream, sessions, line)
+                await writer.drain()
+                line = await stream.readline()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self.connections -= 1
+            for session in sessions.values():
+                self._drop(session)
+            sessions.clear()
+            writer.close()
+
+    def handle(self, stream, sessions, line):
+        """Run one command line for the connection owning sessions."""
+        args = line.split()
+        if not args:
+            return
+        method = getattr(self, 'cmd_' + args[0].lower(), None)
+        if method is None:
+            stream.send(f"error unknown command {args[0]}")
+            return
+        method(stream, sessions, args[1:])
+
+    def cmd_new(self, stream, sessions, args):
+        if not args:
+            stream.send("error new needs a game name")
+            return
+        name = args[0]
+        engine_color = args[1].lower() if len(args) > 1 else '-'
+        if engine_color not in COLOR_NAMES + ('-',):
+            stream.send("error engine colour must be white, black or -")
+            return
+        try:
+            depth = int(args[2]) if len(args) > 2 else self.depth
+        except ValueError:
+            stream.send(f"error bad depth {args[2]}")
+            return
+        if name in sessions:
+            self._drop(sessions[name])
+        session = sessions[name] = Session(engine_color if engine_color != '-' else None,
+                                           max(1, depth))
+        self.games += 1
+        stream.send(f"game {name} {session.game.fen()}")
+        if session.engine_to_move():
+            self._think(stream, sessions, name, session)
+
+    def cmd_move(self, stream, sessions, args):
+        session = self._session(stream, sessions, args)
+        if session is None:
+            return
+        if len(args) < 2:
+            stream.send("error move needs a move")
+            return
+        name, text = args[0], args[1].lower()
+        game = session.game
+        if session.thinking or game.game_over or session.engine_to_move():
+            stream.send(f"illegal {name} {text}")
+            return
+        legal = {move_to_uci(move): move for move in game.position.legal_moves()}
+        if text not in legal:
+            stream.send(f"illegal {name} {text}")
+            return
+        game.play_move(legal[text])
+        self.moves += 1
+        stream.send(f"ok {name} {text} {game.result or '*'}")
+        if session.engine_to_move():
+            self._think(stream, sessions, name, session)
+
+    def cmd_fen(self, stream, sessions, args):
+        session = self._session(stream, sessions, args)
+        if session is not None:
+            stream.send(f"fen {args[0]} {session.game.fen()}")
+
+    def cmd_end(self, stream, sessions, args):
+        session = self._session(stream, sessions, args)
+        if session is not None:
+            self._drop(sessions.pop(args[0]))
+            stream.send(f"ended {args[0]}")
+
+    def cmd_stats(self, stream, sessions, args):
+        stream.send(f"stats connections={self.connections} games={self.games} "
+                    f"pending={self.pending} moves={self.moves} "
+                    f"engine_moves={self.engine_moves}")
+
+    def _session(self, stream, sessions, args):
+        session = sessions.get(args[0]) if args else None
+        if session is None:
+            stream.send(f"error no game {args[0] if args else ''}".rstrip())
+        return session
+
+    def _drop(self, session):
+        # A search already in the pool runs to the end and its move is thrown away;
+        # cancelling here would free its pending slot while the pool is still busy
+        self.games -= 1
+
+    def _think(self, stream, sessions, name, session):
+        session.thinking = True
+        task = asyncio.create_task(self._engine_reply(stream, sessions, name, session))
+        self._replies.add(task)
+        task.add_done_callback(self._replies.discard)
+
+    async def _engine_reply(self, stream, sessions, name, session):
+        self.pending += 1
+        try:
+            async with self._slots:
+                loop = asyncio.get_running_loop()
+                move = await loop.run_in_executor(self.pool, _engine_move,
+                                                  session.game.position.copy(), session.depth,
+                                                  self.movetime)
+        except Exception:
+            # A crashed worker (BrokenProcessPool) or an error raised in the search
+            session.thinking = False
+            if sessions.get(name) is session:
+                stream.send(f"error {name} engine failed")
+            return
+        finally:
+            self.pending -= 1
+        session.thinking = False
+        if sessions.get(name) is not session or move is None:
+            return
+        session.game.play_move(move)
+        self.engine_moves += 1
+        stream.send(f"move {name} {move_to_uci(move)} {session.game.result or '*'}")
+
+
+async def serve(host, port, **options):
+    server = ChessServer(**options)
+    listener = await asyncio.start_server(server.handle_connection, host, port, limit=MAX_LINE)
+    print(f"listening on {', '.join(str(s.getsockname()[:2]) for s in listener.sockets)}",
+          flush=True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=None,
+                        help="engine processes (default: CPU count)")
+    parser.add_argument('--max-pending', type=int, default=None,
+                        help="engine moves handed to the pool at once (default: 4 per worker)")
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH,
+                        help="engine depth when new does not give one")
+    parser.add_argument('--movetime', type=float, default=DEFAULT_MOVETIME,
+                        help="seconds an engine move may take at most")
+    parser.add_argument('--hash', type=int, default=DEFAULT_HASH_MB,
+                        help="transposition table MB per engine process")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, workers=args.workers,
+                          max_pending=args.max_pending, depth=args.depth,
+                          movetime=args.movetime, hash_mb=args.hash))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
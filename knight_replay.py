@@ -0,0 +1,205 @@
+"""Record Knight Survival sessions and replay them headlessly to check they end the same way.
+
+A game is deterministic given its RNG seed and the times at which its clock
+is read. The window records the seed, and each input with the session time
+it happened at, to a small binary log. The replayer runs a log against the
+pygame-free core as fast as it can and compares the final state with the
+digest stored at the end of the log.
+
+    KNIGHT_RECORD=session.ksr python knight_survival.py
+    python knight_replay.py session.ksr sessions/*.ksr --repeat 100
+
+A log is a header (magic, seed, spawn rate, max enemies, move time limit,
+board size), then one 9-byte record per input (action, session seconds),
+then an END record followed by the final turn count, score and state
+digest. Actions are move indexes 0-7, START, RESET and TICK. Only timer
+ticks that ended the game are recorded, since the others change nothing
+but the timer bar.
+"""
+import argparse
+import hashlib
+import struct
+import sys
+import time
+from collections import namedtuple
+
+from knight_survival_core import BOARD_SIZE, KnightSurvivalGame, SplitMix64
+
+MAGIC = b'KSR3'
+HEADER = struct.Struct('<4sQBHdH')
+RECORD = struct.Struct('<Bd')
+FOOTER = struct.Struct('<II16s')
+
+START = 0xF0
+RESET = 0xF1
+TICK = 0xF2
+END = 0xFF
+
+
+class SessionClock:
+    """Clock for KnightSurvivalGame that reads whatever time it was last set to."""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def apply(game, action):
+    """Play one recorded action on game. Returns True if it changed the game.
+
+    Actions the window would not send in the current state are ignored, so
+    a damaged log shows up as a mismatch rather than a broken game.
+    """
+    if action == START:
+        if game.game_started:
+            return False
+        game.start()
+        return True
+    if action == RESET:
+        game.reset()
+        return True
+    if action == TICK:
+        return game.update_timer()
+    if not game.game_started or game.game_over:
+        return False
+    return game.move_player(action)
+
+
+def state_digest(game):
+    """16-byte hash of everything that decides how the game goes on from here."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(struct.pack('<IIBBQ', game.turn_count, game.score, game.game_over,
+                         game.game_started, game.rng.state))
+    h.update(bytes(game.squares))
+    # uint16, since boards can be wider than 255 squares
+    coordinates = [coordinate for pos in game.enemies for coordinate in pos]
+    h.update(struct.pack(f'<{len(coordinates)}H', *coordinates))
+    return h.digest()
+
+
+def new_game(seed, spawn_rate, max_enemies, move_time_limit, board_size=BOARD_SIZE, **kwargs):
+    """A game whose RNG and clock can be replayed: SplitMix64(seed) and a SessionClock."""
+    return KnightSurvivalGame(rng=SplitMix64(seed), spawn_rate=spawn_rate,
+                              max_enemies=max_enemies, move_time_limit=move_time_limit,
+                              clock=SessionClock(), board_size=board_size, **kwargs)
+
+
+class SessionRecorder:
+    """Drives a game built by new_game() with live time and logs its inputs to path.
+
+    Call apply() for every input instead of calling the game directly. With
+    no path nothing is written, so the window uses it either way.
+    """
+
+    def __init__(self, game, seed, path=None):
+        self.game = game
+        self.path = path
+        self._start = time.monotonic()
+        self._file = None
+        if path is not None:
+            self._file = open(path, 'wb')
+            self._file.write(HEADER.pack(MAGIC, seed, game.spawn_rate, game.max_enemies,
+                                         game.move_time_limit, game.board_size))
+
+    def apply(self, action):
+        now = time.monotonic() - self._start
+        self.game.clock.now = now
+        changed = apply(self.game, action)
+        if changed and self._file is not None:
+            self._file.write(RECORD.pack(action, now))
+        return changed
+
+    def close(self):
+        if self._file is None:
+            return
+        game = self.game
+        self._file.write(RECORD.pack(END, time.monotonic() - self._start))
+        self._file.write(FOOTER.pack(game.turn_count, game.score, state_digest(game)))
+        self._file.close()
+        self._file = None
+
+
+# records holds (action, session seconds) per input; final is (turn count, score,
+# digest) from the END record, or None if the log was cut short
+Session = namedtuple('Session',
+                     'seed spawn_rate max_enemies move_time_limit board_size records final')
+
+
+def read_session(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < HEADER.size:
+        raise ValueError(f"{path}: not a session log")
+    magic, seed, spawn_rate, max_enemies, move_time_limit, board_size = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path}: not a session log")
+    records = []
+    final = None
+    offset = HEADER.size
+    while offset + RECORD.size <= len(data):
+        action, now = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        if action == END:
+            if offset + FOOTER.size <= len(data):
+                final = FOOTER.unpack_from(data, offset)
+            break
+        records.append((action, now))
+    return Session(seed, spawn_rate, max_enemies, move_time_limit, board_size, records, final)
+
+
+def replay(session):
+    """Play session's records on a fresh game. Returns (game, matched), matched None without a footer."""
+    game = new_game(session.seed, session.spawn_rate, session.max_enemies,
+                    session.move_time_limit, session.board_size)
+    clock = game.clock
+    for action, now in session.records:
+        clock.now = now
+        apply(game, action)
+    if session.final is None:
+        return game, None
+    turns, score, digest = session.final
+    return game, (game.turn_count, game.score, state_digest(game)) == (turns, score, digest)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='+', help="session logs written with KNIGHT_RECORD")
+    parser.add_argument('--repeat', type=int, default=1,
+                        help="replay each log this many times, for benchmarking")
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    failed = 0
+    total_actions = 0
+    total_elapsed = 0.0
+    for path in args.paths:
+        try:
+            session = read_session(path)
+        except (OSError, ValueError) as e:
+            print(e, file=sys.stderr)
+            failed += 1
+            continue
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            game, matched = replay(session)
+        elapsed = time.perf_counter() - start
+        actions = len(session.records) * args.repeat
+        total_actions += actions
+        total_elapsed += elapsed
+        verdict = {True: 'ok', False: 'MISMATCH', None: 'unverified (no END record)'}[matched]
+        print(f"{path}: {len(session.records)} actions, turn {game.turn_count}, "
+              f"score {game.score}, {verdict}; "
+              f"{actions / elapsed if elapsed else 0:,.0f} actions/s")
+        if matched is False:
+            failed += 1
+    if len(args.paths) > 1 and total_elapsed:
+        print(f"total: {total_actions} actions in {total_elapsed:.3f}s "
+              f"({total_actions / total_elapsed:,.0f} actions/s)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
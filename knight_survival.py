@@ -1,291 +1,159 @@
+import startup_timer
 import pygame
 import sys
 import os
 import random
-import time
-
-def get_resource_path(relative_path):
-    """Get absolute path to resource, works for dev and for PyInstaller"""
-    if hasattr(sys, '_MEIPASS'):
-        return os.path.join(sys._MEIPASS, relative_path)
-    return os.path.join(os.path.dirname(os.path.abspath(__file__)), relative_path)
-# Initialize Pygame
-pygame.init()
+from functools import lru_cache
+
+import knight_survival_core
+import knight_replay
+import sprite_atlas
+import telemetry
+from board_renderer import BoardRenderer, banner, profile_overlay
+from profiling import PROFILER, start_from_env
+from render_loop import RenderLoop
+from text_cache import render_text
+
+# Arena: KNIGHT_BOARD_SIZE squares a side, up to KNIGHT_MAX_ENEMIES enemies, KNIGHT_SPAWN_RATE a turn
+BOARD_SIZE = int(os.environ.get('KNIGHT_BOARD_SIZE', knight_survival_core.BOARD_SIZE))
+MAX_ENEMIES = int(os.environ.get('KNIGHT_MAX_ENEMIES', knight_survival_core.MAX_ENEMIES))
+SPAWN_RATE = int(os.environ.get('KNIGHT_SPAWN_RATE', knight_survival_core.SPAWN_RATE))
 
 # Constants (adding timer-related constants)
 WINDOW_SIZE = 800
-SQUARE_SIZE = WINDOW_SIZE // 8
+# Squares never get smaller than this; larger boards scroll to follow the player
+MIN_SQUARE_SIZE = 40
+VIEW_SIZE = min(BOARD_SIZE, WINDOW_SIZE // MIN_SQUARE_SIZE)
+# The view moves two squares at a time so the checkerboard keeps its colours;
+# an even gap to the board edge lets it reach the last row and column
+if (BOARD_SIZE - VIEW_SIZE) % 2:
+    VIEW_SIZE -= 1
+SQUARE_SIZE = WINDOW_SIZE // VIEW_SIZE
+# Trim the window to whole squares, or a strip along the right and bottom is never drawn
+WINDOW_SIZE = VIEW_SIZE * SQUARE_SIZE
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 GRAY = (128, 128, 128)
 YELLOW = (255, 255, 0)
 DARK_GRAY = (64, 64, 64)
-SPAWN_RATE = 1
-MAX_ENEMIES = 5
 RED = (255, 0, 0)
 BLUE = (0, 0, 255)
-MOVE_TIME_LIMIT = 5  # 5 seconds per move
 TIMER_HEIGHT = 40
 TIMER_WARNING = 2  # Time in seconds when timer turns red
+TIMER_REFRESH = 0.1  # Seconds between timer bar redraws while a game runs
 
-# Initialize display (adjusted for timer bar)
-screen = pygame.display.set_mode((WINDOW_SIZE, WINDOW_SIZE + TIMER_HEIGHT))
-pygame.display.set_caption("Knight Survival")
+# KNIGHT_RECORD=path saves the session for knight_replay.py; KNIGHT_SEED fixes the enemy spawns
+RECORD_PATH = os.environ.get('KNIGHT_RECORD')
+SEED = int(os.environ['KNIGHT_SEED']) if os.environ.get('KNIGHT_SEED') else None
 
-class KnightSurvivalGame:
-    def __init__(self):
-        self.board = {}
-        self.player_pos = (4, 4)
-        self.board[self.player_pos] = {'piece': 'knight', 'color': 'white', 'symbol': 'N'}
-        self.game_over = False
-        self.pieces_sprites = self.load_sprites()
-        self.turn_count = 0
-        self.score = 0
-        self.valid_moves = []
-        self.move_timer = MOVE_TIME_LIMIT
-        self.last_move_time = time.time()
-        self.update_valid_moves()
-        print("Game initialized")
+# Display surface, created by init_display() so importing this module stays headless
+screen = None
 
 
+def init_display():
+    global screen
+    pygame.init()
+    # Adjusted for timer bar
+    screen = pygame.display.set_mode((WINDOW_SIZE, WINDOW_SIZE + TIMER_HEIGHT))
+    pygame.display.set_caption("Knight Survival")
+    return screen
 
-    # Then replace your current load_sprites method in the KnightSurvivalGame class with this:
-    def load_sprites(self):
-        sprites = {}
-        pieces = ['king', 'queen', 'rook', 'knight', 'bishop', 'pawn']
-        
-        try:
-            for piece in pieces:
-                black_path = get_resource_path(os.path.join('sprites', f'b_{piece}_png_shadow_1024px.png'))
-                white_path = get_resource_path(os.path.join('sprites', f'w_{piece}_png_shadow_1024px.png'))
-                
-                # Debug print
-                print(f"Loading sprites from: {black_path} and {white_path}")
-                
-                black_image = pygame.image.load(black_path)
-                white_image = pygame.image.load(white_path)
-                
-                black_scaled = pygame.transform.scale(black_image, (SQUARE_SIZE, SQUARE_SIZE))
-                white_scaled = pygame.transform.scale(white_image, (SQUARE_SIZE, SQUARE_SIZE))
-                
-                sprites[f'black_{piece}'] = black_scaled
-                sprites[f'white_{piece}'] = white_scaled
-                
-        except Exception as e:
-            print(f"Error loading sprites: {e}")
-            print(f"Current working directory: {os.getcwd()}")
-            print(f"MEIPASS path (if exists): {getattr(sys, '_MEIPASS', 'Not found')}")
-            raise
-        
-        return sprites
 
-    def update_valid_moves(self):
-        x, y = self.player_pos
-        possible_moves = [
-            (x+2, y+1), (x+2, y-1), (x-2, y+1), (x-2, y-1),
-            (x+1, y+2), (x+1, y-2), (x-1, y+2), (x-1, y-2)
-        ]
-        self.valid_moves = [
-            move for move in possible_moves 
-            if 0 <= move[0] < 8 and 0 <= move[1] < 8 and 
-            (move not in self.board or self.board[move]['color'] == 'black')
-        ]
-        print(f"Valid moves updated: {self.valid_moves}")
+class KnightSurvivalGame(knight_survival_core.KnightSurvivalGame):
+    def __init__(self, log=None, **kwargs):
+        super().__init__(log=log, **kwargs)
+        self.pieces_sprites = self.load_sprites()
+        self.renderer = None
+
+    def load_sprites(self):
+        # Pre-scaled atlas baked by build_atlas.py, sliced on first use
+        return sprite_atlas.load_sprites(SQUARE_SIZE)
+
+    def timer_bar(self):
+        # Timer bar, red once time is short; quantized to whole pixels so it is cacheable
+        width = int((self.move_timer / self.move_time_limit) * WINDOW_SIZE)
+        color = RED if self.move_timer <= TIMER_WARNING else BLUE
+        return _timer_bar(width, color, f"Time: {self.move_timer:.1f}s")
+
+    def view_origin(self):
+        """Board square at the top left of the view, which keeps the player near the middle."""
+        limit = self.board_size - VIEW_SIZE
+        if limit <= 0:
+            return 0, 0
+        return tuple(min(max(c - VIEW_SIZE // 2, 0), limit) & ~1 for c in self.player_pos)
 
-    def spawn_enemy(self):
-        if len([p for p in self.board.values() if p['color'] == 'black']) >= MAX_ENEMIES:
-            return
-            
-        side = random.randint(0, 3)
-        if side == 0:
-            pos = (random.randint(0, 7), 0)
-        elif side == 1:
-            pos = (7, random.randint(0, 7))
-        elif side == 2:
-            pos = (random.randint(0, 7), 7)
+    def draw(self):
+        if self.renderer is None:
+            # Board background is rendered once; frames repaint changed squares only
+            self.renderer = BoardRenderer(screen, SQUARE_SIZE, WHITE, GRAY, VIEW_SIZE)
+        # Looks are keyed by view square; only pieces inside the view are looked at
+        ox, oy = self.view_origin()
+        board = self.board
+        looks = {}
+        for pos in self.enemies + [self.player_pos]:
+            view_pos = (pos[0] - ox, pos[1] - oy)
+            if 0 <= view_pos[0] < VIEW_SIZE and 0 <= view_pos[1] < VIEW_SIZE:
+                piece = board[pos]
+                sprite = self.pieces_sprites[f"{piece['color']}_{piece['piece']}"]
+                looks[view_pos] = (BLUE if pos == self.player_pos else None, sprite, None)
+        # Valid moves are red with their key number on top of everything
+        for index, pos in enumerate(self.valid_moves):
+            view_pos = (pos[0] - ox, pos[1] - oy)
+            if 0 <= view_pos[0] < VIEW_SIZE and 0 <= view_pos[1] < VIEW_SIZE:
+                sprite = looks[view_pos][1] if view_pos in looks else None
+                looks[view_pos] = (RED, sprite, _move_marker(index + 1))
+
+        if not self.game_started:
+            help_text = render_text("Press SPACE to start! Use number keys (1-8) to move", 24, BLACK)
         else:
-            pos = (0, random.randint(0, 7))
-            
-        if pos in self.board:
-            return
-            
-        piece_type = random.choice(['bishop', 'rook', 'knight']) 
-        self.board[pos] = {
-            'piece': piece_type,
-            'color': 'black',
-            'symbol': 'B' if piece_type == 'bishop' else 'N'
-        }
-        print(f"Enemy spawned at {pos}")
+            help_text = render_text("Move quickly! Use number keys (1-8) to move", 24, BLACK)
+        overlays = [
+            (render_text(f"Score: {self.score}", 24, BLACK), (10, 10)),
+            (help_text, (10, 40)),
+            (self.timer_bar(), (0, WINDOW_SIZE)),
+        ]
+        if self.game_over:
+            text = banner(render_text(f"Game Over! Final Score: {self.score}", 24, BLACK), WHITE)
+            overlays.append((text, text.get_rect(center=(WINDOW_SIZE//2, WINDOW_SIZE//2)).topleft))
+        if PROFILER.enabled:
+            overlays.append(profile_overlay(PROFILER, WINDOW_SIZE, WHITE, DARK_GRAY))
 
-    def move_enemies(self):
-        enemies = [(pos, piece) for pos, piece in self.board.items() 
-                  if piece['color'] == 'black']
-        print(f"Moving enemies: {len(enemies)} found")
-        
-        for pos, piece in enemies:
-            if pos not in self.board:
-                continue
-                
-            valid_moves = self.get_valid_moves(pos)
-            if valid_moves:
-                best_move = min(valid_moves, 
-                    key=lambda m: abs(m[0] - self.player_pos[0]) + abs(m[1] - self.player_pos[1]))
-                
-                del self.board[pos]
-                self.board[best_move] = piece
-                print(f"Enemy moved from {pos} to {best_move}")
-                
-                if best_move == self.player_pos:
-                    self.game_over = True
-                    print("Game Over - Player captured!")
-                    return
+        self.renderer.render(looks, overlays)
 
-    def get_valid_moves(self, pos):
-        piece = self.board.get(pos)
-        if not piece:
-            return []
-            
-        valid_moves = []
-        x, y = pos
-        
-        if piece['piece'] == 'knight':
-            moves = [
-                (x+2, y+1), (x+2, y-1), (x-2, y+1), (x-2, y-1),
-                (x+1, y+2), (x+1, y-2), (x-1, y+2), (x-1, y-2)
-            ]
-            for move in moves:
-                if (0 <= move[0] < 8 and 0 <= move[1] < 8 and 
-                    (move not in self.board or 
-                     (self.board[move]['color'] != piece['color']))):
-                    valid_moves.append(move)
-                    
-        elif piece['piece'] == 'bishop':
-            moves = [(x+1, y+1), (x+1, y-1), (x-1, y+1), (x-1, y-1)]
-            for move in moves:
-                if (0 <= move[0] < 8 and 0 <= move[1] < 8 and 
-                    (move not in self.board or 
-                     (self.board[move]['color'] != piece['color']))):
-                    valid_moves.append(move)
-                    
-        return valid_moves
 
-    def update_timer(self):
-        if not self.game_over and hasattr(self, 'game_started') and self.game_started:
-            current_time = time.time()
-            self.move_timer = max(0, MOVE_TIME_LIMIT - (current_time - self.last_move_time))
-            
-            if self.move_timer <= 0:
-                self.game_over = True
-                print("Game Over - Time's up!")
-                return True
-        return False
+@lru_cache(maxsize=8)
+def _move_marker(number):
+    size = SQUARE_SIZE * 2 // 5
+    radius = size // 2
+    surface = pygame.Surface((size, size), pygame.SRCALPHA)
+    pygame.draw.circle(surface, WHITE, (radius, radius), radius)
+    pygame.draw.circle(surface, BLACK, (radius, radius), radius, 2)
+    number_text = render_text(str(number), size * 4 // 5, BLACK)
+    surface.blit(number_text, number_text.get_rect(center=(radius, radius)))
+    return surface
 
-    def draw_timer(self):
-        # Draw timer bar background
-        pygame.draw.rect(screen, DARK_GRAY, (0, WINDOW_SIZE, WINDOW_SIZE, TIMER_HEIGHT))
-        
-        # Calculate timer bar width
-        timer_width = (self.move_timer / MOVE_TIME_LIMIT) * WINDOW_SIZE
-        
-        # Choose color based on remaining time
-        if self.move_timer <= TIMER_WARNING:
-            timer_color = RED
-        else:
-            timer_color = BLUE
-        
-        # Draw timer bar
-        pygame.draw.rect(screen, timer_color, (0, WINDOW_SIZE, timer_width, TIMER_HEIGHT))
-        
-        # Draw timer text
-        font = pygame.font.SysFont('Arial', 24)
-        timer_text = font.render(f"Time: {self.move_timer:.1f}s", True, WHITE)
-        screen.blit(timer_text, (10, WINDOW_SIZE + 8))
 
-    def draw(self):
-        # Draw board squares
-        for row in range(8):
-            for col in range(8):
-                color = WHITE if (row + col) % 2 == 0 else GRAY
-                
-                if (col, row) == self.player_pos:
-                    color = BLUE
-                elif (col, row) in self.valid_moves:
-                    color = RED
-                
-                pygame.draw.rect(screen, color, 
-                               (col * SQUARE_SIZE, row * SQUARE_SIZE, 
-                                SQUARE_SIZE, SQUARE_SIZE))
-                
-                # Draw pieces first
-                pos = (col, row)
-                if pos in self.board:
-                    piece = self.board[pos]
-                    sprite_key = f"{piece['color']}_{piece['piece']}"
-                    sprite = self.pieces_sprites[sprite_key]
-                    screen.blit(sprite, (col * SQUARE_SIZE, row * SQUARE_SIZE))
-                
-                # Draw move numbers on top of everything
-                if (col, row) in self.valid_moves:
-                    move_index = self.valid_moves.index((col, row)) + 1
-                    font = pygame.font.SysFont('Arial', 32)
-                    
-                    circle_center = (
-                        col * SQUARE_SIZE + SQUARE_SIZE//2,
-                        row * SQUARE_SIZE + SQUARE_SIZE//2
-                    )
-                    pygame.draw.circle(screen, WHITE, circle_center, 20)
-                    pygame.draw.circle(screen, BLACK, circle_center, 20, 2)
-                    
-                    number_text = font.render(str(move_index), True, BLACK)
-                    text_rect = number_text.get_rect(center=(
-                        col * SQUARE_SIZE + SQUARE_SIZE//2,
-                        row * SQUARE_SIZE + SQUARE_SIZE//2
-                    ))
-                    screen.blit(number_text, text_rect)
-        
-        # Draw UI elements
-        font = pygame.font.SysFont('Arial', 24)
-        score_text = font.render(f"Score: {self.score}", True, BLACK)
-        
-        if not hasattr(self, 'game_started') or not self.game_started:
-            help_text = font.render("Press SPACE to start! Use number keys (1-8) to move", True, BLACK)
-        else:
-            help_text = font.render("Move quickly! Use number keys (1-8) to move", True, BLACK)
-        
-        screen.blit(score_text, (10, 10))
-        screen.blit(help_text, (10, 40))
-        
-        # Draw timer
-        self.draw_timer()
-        
-        if self.game_over:
-            game_over_text = font.render(f"Game Over! Final Score: {self.score}", True, BLACK)
-            text_rect = game_over_text.get_rect(center=(WINDOW_SIZE//2, WINDOW_SIZE//2))
-            pygame.draw.rect(screen, WHITE, text_rect.inflate(20, 20))
-            screen.blit(game_over_text, text_rect)
-            
-        pygame.display.flip()
+@lru_cache(maxsize=4)
+def _timer_bar(width, color, label):
+    surface = pygame.Surface((WINDOW_SIZE, TIMER_HEIGHT))
+    surface.fill(DARK_GRAY)
+    surface.fill(color, (0, 0, width, TIMER_HEIGHT))
+    surface.blit(render_text(label, 24, WHITE), (10, 8))
+    return surface
 
-    def reset(self):
-        """Reset the game to initial state"""
-        self.board = {}
-        self.player_pos = (4, 4)
-        self.board[self.player_pos] = {'piece': 'knight', 'color': 'white', 'symbol': 'N'}
-        self.game_over = False
-        self.turn_count = 0
-        self.score = 0
-        self.valid_moves = []
-        self.move_timer = MOVE_TIME_LIMIT
-        self.last_move_time = time.time()
-        self.game_started = False
-        self.update_valid_moves()
-        print("Game reset")
 
 def main():
-    game = KnightSurvivalGame()
-    clock = pygame.time.Clock()
-    running = True
-    
+    start_from_env()
+    init_display()
+    # Off unless TELEMETRY is set, so the loop never blocks on stdout
+    log = telemetry.from_env()
+    # Seeded RNG and a clock set per input, so the session can be replayed exactly
+    seed = SEED if SEED is not None else random.getrandbits(64)
+    game = KnightSurvivalGame(log=log, rng=knight_survival_core.SplitMix64(seed),
+                              clock=knight_replay.SessionClock(), board_size=BOARD_SIZE,
+                              max_enemies=MAX_ENEMIES, spawn_rate=SPAWN_RATE)
+    session = knight_replay.SessionRecorder(game, seed, RECORD_PATH)
+
     KEY_MAPPING = {
         pygame.K_1: 0, pygame.K_2: 1, pygame.K_3: 2, pygame.K_4: 3,
         pygame.K_5: 4, pygame.K_6: 5, pygame.K_7: 6, pygame.K_8: 7,
@@ -293,54 +161,46 @@ def main():
         pygame.K_KP5: 4, pygame.K_KP6: 5, pygame.K_KP7: 6, pygame.K_KP8: 7,
         49: 0, 50: 1, 51: 2, 52: 3, 53: 4, 54: 5, 55: 6, 56: 7
     }
-    
-    while running:
-        # Update timer
-        if hasattr(game, 'game_started') and game.game_started and not game.game_over:
-            game.update_timer()
-        
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            elif event.type == pygame.KEYDOWN:
-                print(f"Key pressed: {event.key}")
-                
-                if event.key == pygame.K_SPACE:
-                    if game.game_over:
-                        game.reset()
-                    if not hasattr(game, 'game_started') or not game.game_started:
-                        game.game_started = True
-                        game.last_move_time = time.time()
-                        print("Game started!")
-                        for _ in range(3):
-                            game.spawn_enemy()
-                elif hasattr(game, 'game_started') and game.game_started and not game.game_over:
-                    if event.key in KEY_MAPPING:
-                        move_index = KEY_MAPPING[event.key]
-                        print(f"Move index: {move_index}")
-                        
-                        if move_index < len(game.valid_moves):
-                            new_pos = game.valid_moves[move_index]
-                            print(f"Moving to: {new_pos}")
-                            
-                            if new_pos in game.board:
-                                del game.board[new_pos]
-                                game.score += 1
-                            del game.board[game.player_pos]
-                            game.player_pos = new_pos
-                            game.board[new_pos] = {'piece': 'knight', 'color': 'white', 'symbol': 'N'}
-                            
-                            # Reset timer for next move
-                            game.last_move_time = time.time()
-                            game.move_timer = MOVE_TIME_LIMIT
-                            
-                            game.spawn_enemy()
-                            game.move_enemies()
-                            game.update_valid_moves()
-        
+
+    def tick():
+        # The countdown is the only thing that changes without input
+        session.apply(knight_replay.TICK)
+        if game.game_over:
+            loop.set_timer(None)
+        return True
+
+    def handle_event(event):
+        if event.type != pygame.KEYDOWN:
+            return False
+        log.debug(telemetry.KEY, event.key)
+
+        if event.key == pygame.K_F3:
+            PROFILER.toggle()
+        elif event.key == pygame.K_SPACE:
+            if game.game_over:
+                session.apply(knight_replay.RESET)
+            if not game.game_started:
+                session.apply(knight_replay.START)
+                loop.set_timer(TIMER_REFRESH, tick)
+        elif game.game_started and not game.game_over:
+            if event.key in KEY_MAPPING:
+                session.apply(KEY_MAPPING[event.key])
+                if game.game_over:
+                    loop.set_timer(None)
+        else:
+            return False
+        return True
+
+    def draw():
         game.draw()
-        clock.tick(60)
+        startup_timer.first_frame_presented("Knight Survival")
+
+    loop = RenderLoop(draw, handle_event)
+    loop.run()
 
+    session.close()
+    log.close()
+    PROFILER.close()
     pygame.quit()
     sys.exit()
 
@@ -0,0 +1,394 @@
+"""Knight Survival rules and game state, with no pygame dependency.
+
+knight_survival.py layers sprites, drawing and the event loop on top of
+this module; simulations can import it without opening a window.
+"""
+import copy
+import functools
+import math
+import random
+import time
+
+import telemetry
+from profiling import PROFILER
+from pieces import (BLACK, BLACK_BIT, EMPTY, KNIGHT, PIECE_NAMES, WHITE, SquareView, encode,
+                    type_of)
+
+SPAWN_RATE = 1
+MAX_ENEMIES = 5
+MOVE_TIME_LIMIT = 5  # 5 seconds per move
+
+ENEMY_TYPES = ['bishop', 'rook', 'knight']
+
+BOARD_SIZE = 8
+
+# One-step moves per piece, in the order moves are listed and tie-broken.
+# Rooks stand still.
+MOVE_OFFSETS = {
+    'knight': ((2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2)),
+    'bishop': ((1, 1), (1, -1), (-1, 1), (-1, -1)),
+    'rook': (),
+}
+
+# Enough for every (piece, target) on the default board; large boards keep the recent ones
+FIELD_CACHE_SIZE = 256
+
+
+def on_board(pos, board_size=BOARD_SIZE):
+    return 0 <= pos[0] < board_size and 0 <= pos[1] < board_size
+
+
+@functools.lru_cache(maxsize=None)
+def _neighbours(piece, board_size):
+    """Squares one move away from each square, as flat indexes y * board_size + x."""
+    return [tuple((y + dy) * board_size + x + dx for dx, dy in MOVE_OFFSETS[piece]
+                  if on_board((x + dx, y + dy), board_size))
+            for y in range(board_size) for x in range(board_size)]
+
+
+@functools.lru_cache(maxsize=FIELD_CACHE_SIZE)
+def distance_table(piece, target, board_size=BOARD_SIZE):
+    """BFS move counts for piece to reach target from every square of an empty board.
+
+    Returns a list indexed y * board_size + x, holding board_size ** 2 for
+    squares the piece can never reach. The moves are symmetric, so
+    searching outwards from target gives distances towards it. Cached per
+    (piece, target, board size); the enemies rebuild it once per player move.
+    """
+    neighbours = _neighbours(piece, board_size)
+    unreachable = board_size * board_size
+    table = [unreachable] * unreachable
+    start = target[1] * board_size + target[0]
+    table[start] = 0
+    frontier = [start]
+    distance = 0
+    while frontier:
+        distance += 1
+        next_frontier = []
+        for sq in frontier:
+            for neighbour in neighbours[sq]:
+                if table[neighbour] == unreachable:
+                    table[neighbour] = distance
+                    next_frontier.append(neighbour)
+        frontier = next_frontier
+    return table
+
+
+def distance_field(piece, target, board_size=BOARD_SIZE):
+    """distance_table as {pos: moves}, leaving out unreachable squares."""
+    unreachable = board_size * board_size
+    return {(sq % board_size, sq // board_size): distance
+            for sq, distance in enumerate(distance_table(piece, target, board_size))
+            if distance != unreachable}
+
+
+def rank_scale(board_size):
+    """Multiplier for distances in move ranks; larger than any Manhattan distance on the board."""
+    return 2 * board_size
+
+
+@functools.lru_cache(maxsize=FIELD_CACHE_SIZE)
+def move_ranks(piece, target, board_size=BOARD_SIZE):
+    """Rank of every on-board square as a move towards target; lower is better.
+
+    Orders by distance_field, then by Manhattan distance, packed in one int
+    so ranking a move is a single dict lookup. Squares the piece can never
+    reach (bishops on the other colour) rank after all others; off-board
+    squares are missing.
+    """
+    field = distance_field(piece, target, board_size)
+    tx, ty = target
+    scale = rank_scale(board_size)
+    unreachable = board_size * board_size
+    return {(x, y): field.get((x, y), unreachable) * scale + abs(x - tx) + abs(y - ty)
+            for x in range(board_size) for y in range(board_size)}
+
+
+_MASK64 = (1 << 64) - 1
+
+
+class SplitMix64:
+    """Small counter-based RNG with the randint/choice API the game uses.
+
+    Unlike random.Random it is trivial to run in lockstep for many games with
+    NumPy (see knight_survival_batch.py), which replays the same draws.
+    """
+
+    GAMMA = 0x9E3779B97F4A7C15
+
+    def __init__(self, seed=0):
+        self.state = seed & _MASK64
+
+    def next64(self):
+        self.state = z = (self.state + self.GAMMA) & _MASK64
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+        return z ^ (z >> 31)
+
+    def randint(self, a, b):
+        return a + self.next64() % (b - a + 1)
+
+    def randrange(self, stop):
+        return self.next64() % stop
+
+    def choice(self, seq):
+        return seq[self.next64() % len(seq)]
+
+    def random(self):
+        return (self.next64() >> 11) * (1.0 / (1 << 53))
+
+    def expovariate(self, lambd):
+        return -math.log(1.0 - self.random()) / lambd
+
+
+PLAYER = encode(WHITE, KNIGHT)
+ENEMY_CODES = {name: encode(BLACK, PIECE_NAMES.index(name)) for name in ENEMY_TYPES}
+
+
+def square_index(pos, board_size=BOARD_SIZE):
+    return pos[1] * board_size + pos[0]
+
+
+# (enemy code, moves) for the enemy types that move, for looking back from a target square
+_ENEMY_MOVES = [(ENEMY_CODES[name], MOVE_OFFSETS[name]) for name in ENEMY_TYPES
+                if MOVE_OFFSETS[name]]
+
+
+class KnightSurvivalGame:
+    """Game state on a flat board of pieces.py codes, indexed y * board_size + x.
+
+    Enemies also sit in self.enemies, in the order they move: spawn order,
+    with an enemy going to the back each time it moves. With player_pos it
+    is the piece index, kept up to date move by move, so nothing scans the
+    board. The board itself is the spatial index: which enemies can reach
+    a square is a few lookups around it (see attacked()). board is a
+    read-only {(x, y): piece dict} view for drawing.
+    """
+
+    def __init__(self, rng=None, spawn_rate=SPAWN_RATE, max_enemies=MAX_ENEMIES,
+                 move_time_limit=MOVE_TIME_LIMIT, log=None, clock=time.time,
+                 board_size=BOARD_SIZE):
+        # rng only needs randint/choice, so the random module itself is the default;
+        # simulations pass a seeded random.Random
+        self.rng = rng if rng is not None else random
+        # Seconds for the move timer; knight_replay.SessionClock makes it replayable
+        self.clock = clock
+        self.spawn_rate = spawn_rate
+        self.max_enemies = max_enemies
+        self.move_time_limit = move_time_limit
+        self.board_size = board_size
+        # Build the move tables now rather than during the first turn, where large boards would stall
+        for name in ENEMY_TYPES:
+            _neighbours(name, board_size)
+        # Off unless a telemetry.EventLog with a level is passed in
+        self.log = log if log is not None else telemetry.EventLog()
+        self.game_started = False
+        self.reset_board()
+        self.move_timer = self.move_time_limit
+        self.last_move_time = self.clock()
+        self.update_valid_moves()
+
+    def reset_board(self):
+        size = self.board_size
+        self.squares = bytearray(size * size)
+        self.enemies = []
+        self.player_pos = (size // 2, size // 2)
+        self.squares[square_index(self.player_pos, size)] = PLAYER
+        self.game_over = False
+        self.turn_count = 0
+        self.score = 0
+        self.valid_moves = []
+
+    @property
+    def board(self):
+        return SquareView(self.squares, self.board_size)
+
+    def copy(self):
+        """Independent copy of the game state (the rng and log are shared)."""
+        clone = copy.copy(self)
+        clone.squares = bytearray(self.squares)
+        clone.enemies = self.enemies[:]
+        return clone
+
+    def update_valid_moves(self):
+        PROFILER.count('movegen')
+        x, y = self.player_pos
+        squares = self.squares
+        size = self.board_size
+        # Empty squares and enemies (captures); the player is the only white piece
+        self.valid_moves = [
+            (x + dx, y + dy) for dx, dy in MOVE_OFFSETS['knight']
+            if 0 <= x + dx < size and 0 <= y + dy < size and
+            squares[(y + dy) * size + x + dx] != PLAYER
+        ]
+        self.log.debug(telemetry.VALID_MOVES, self.valid_moves)
+
+    def spawn_enemy(self):
+        if len(self.enemies) >= self.max_enemies:
+            return
+
+        rng = self.rng
+        last = self.board_size - 1
+        side = rng.randint(0, 3)
+        if side == 0:
+            pos = (rng.randint(0, last), 0)
+        elif side == 1:
+            pos = (last, rng.randint(0, last))
+        elif side == 2:
+            pos = (rng.randint(0, last), last)
+        else:
+            pos = (0, rng.randint(0, last))
+
+        index = square_index(pos, self.board_size)
+        if self.squares[index]:
+            return
+
+        piece_type = rng.choice(ENEMY_TYPES)
+        self.squares[index] = ENEMY_CODES[piece_type]
+        self.enemies.append(pos)
+        self.log.info(telemetry.SPAWN, pos, piece_type)
+
+    def move_enemies(self):
+        """Step each enemy, in self.enemies order, one move closer to the player.
+
+        Moves are ranked like move_ranks: the piece's distance_table to the
+        player, then Manhattan distance. Enemies move one after another on
+        the shared board, so an enemy never targets a square another enemy
+        holds or has just moved onto.
+        """
+        squares = self.squares
+        size = self.board_size
+        scale = rank_scale(size)
+        px, py = self.player_pos
+        tables = {}
+        # Enemies that moved go to the back of the list, in the order they moved
+        moved_from = set()
+        moved_to = []
+        for pos in self.enemies:
+            code = squares[pos[1] * size + pos[0]]
+            name = PIECE_NAMES[type_of(code)]
+            offsets = MOVE_OFFSETS[name]
+            if not offsets:
+                continue
+            table = tables.get(name)
+            if table is None:
+                table = tables[name] = distance_table(name, self.player_pos, size)
+            x, y = pos
+            best_move = best_rank = None
+            for dx, dy in offsets:
+                mx, my = x + dx, y + dy
+                if not (0 <= mx < size and 0 <= my < size):
+                    continue
+                target = my * size + mx
+                if squares[target] & BLACK_BIT:
+                    continue
+                rank = table[target] * scale + abs(mx - px) + abs(my - py)
+                if best_rank is None or rank < best_rank:
+                    best_move, best_rank = (mx, my), rank
+            if best_move is None:
+                continue
+
+            moved_from.add(pos)
+            moved_to.append(best_move)
+            squares[y * size + x] = EMPTY
+            target = best_move[1] * size + best_move[0]
+            captured = squares[target] == PLAYER
+            squares[target] = code
+            self.log.debug(telemetry.ENEMY_MOVE, pos, best_move, name)
+
+            if captured:
+                self.game_over = True
+                self.log.info(telemetry.CAPTURE, 'enemy', best_move, self.score)
+                break
+        if moved_to:
+            self.enemies = [pos for pos in self.enemies if pos not in moved_from] + moved_to
+
+    def attacked(self, pos):
+        """True if an enemy could move onto pos next turn, were the player standing there.
+
+        Looks back along each enemy type's moves from pos, so the cost does
+        not grow with the number of enemies.
+        """
+        x, y = pos
+        squares = self.squares
+        size = self.board_size
+        for code, offsets in _ENEMY_MOVES:
+            for dx, dy in offsets:
+                ex, ey = x - dx, y - dy
+                if 0 <= ex < size and 0 <= ey < size and squares[ey * size + ex] == code:
+                    return True
+        return False
+
+    def get_valid_moves(self, pos):
+        PROFILER.count('movegen')
+        size = self.board_size
+        if not on_board(pos, size) or not self.squares[square_index(pos, size)]:
+            return []
+        code = self.squares[square_index(pos, size)]
+
+        x, y = pos
+        valid_moves = []
+        for dx, dy in MOVE_OFFSETS.get(PIECE_NAMES[type_of(code)], ()):
+            move = (x + dx, y + dy)
+            if on_board(move, size):
+                target = self.squares[square_index(move, size)]
+                if not target or (target ^ code) & BLACK_BIT:
+                    valid_moves.append(move)
+        return valid_moves
+
+    def update_timer(self):
+        if not self.game_over and self.game_started:
+            current_time = self.clock()
+            self.move_timer = max(0, self.move_time_limit - (current_time - self.last_move_time))
+
+            if self.move_timer <= 0:
+                self.game_over = True
+                self.log.info(telemetry.TIMEOUT, self.turn_count, self.score)
+                return True
+        return False
+
+    def start(self):
+        """Start the clock and drop in the opening enemies"""
+        self.game_started = True
+        self.last_move_time = self.clock()
+        self.log.info(telemetry.START)
+        for _ in range(3):
+            self.spawn_enemy()
+
+    def move_player(self, move_index):
+        """Jump to valid_moves[move_index] and play the enemy turn. Returns False if there is no such move."""
+        if move_index >= len(self.valid_moves):
+            return False
+        new_pos = self.valid_moves[move_index]
+
+        size = self.board_size
+        if self.squares[square_index(new_pos, size)]:
+            self.enemies.remove(new_pos)
+            self.score += 1
+            self.log.info(telemetry.CAPTURE, 'player', new_pos, self.score)
+        self.squares[square_index(self.player_pos, size)] = EMPTY
+        self.log.info(telemetry.MOVE, self.player_pos, new_pos, self.turn_count + 1)
+        self.player_pos = new_pos
+        self.squares[square_index(new_pos, size)] = PLAYER
+        self.turn_count += 1
+
+        # Reset timer for next move
+        self.last_move_time = self.clock()
+        self.move_timer = self.move_time_limit
+
+        with PROFILER.section('ai'):
+            for _ in range(self.spawn_rate):
+                self.spawn_enemy()
+            self.move_enemies()
+        with PROFILER.section('movegen'):
+            self.update_valid_moves()
+        return True
+
+    def reset(self):
+        """Reset the game to initial state"""
+        self.reset_board()
+        self.move_timer = self.move_time_limit
+        self.last_move_time = self.clock()
+        self.game_started = False
+        self.update_valid_moves()
+        self.log.info(telemetry.RESET)
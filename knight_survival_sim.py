@@ -0,0 +1,201 @@
+"""Headless Knight Survival self-play for balancing SPAWN_RATE, MAX_ENEMIES and MOVE_TIME_LIMIT.
+
+Plays many episodes with a scripted player policy across a process pool and
+prints score and survival-length distributions. Episodes use the pygame-free
+core with telemetry off, so throughput is bound by game logic only.
+
+    python knight_survival_sim.py --episodes 10000 --policy greedy --policy lookahead
+    python knight_survival_sim.py --max-enemies 8 --spawn-rate 2 --think-time 1.5 --json out.json
+
+Every episode gets its own random.Random seeded from --seed and the episode
+number, so results don't depend on the worker count. Moves are instant
+unless --think-time is given. In that case each decision takes an
+exponentially distributed time with that mean, and the episode ends with a
+timeout once a decision exceeds the move time limit.
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from knight_survival_core import (BOARD_SIZE, MAX_ENEMIES, MOVE_TIME_LIMIT, SPAWN_RATE,
+                                  KnightSurvivalGame, square_index)
+
+
+def random_policy(game, rng):
+    return rng.randrange(len(game.valid_moves))
+
+
+def greedy_policy(game, rng):
+    """Take a capture when there is one, otherwise jump to a square no enemy can reach."""
+    moves = game.valid_moves
+    captures = [i for i, move in enumerate(moves)
+                if game.squares[square_index(move, game.board_size)]]
+    if captures:
+        return rng.choice(captures)
+    safe = [i for i, move in enumerate(moves) if not game.attacked(move)]
+    return rng.choice(safe) if safe else rng.randrange(len(moves))
+
+
+def lookahead_policy(game, rng, samples=4):
+    """Play each move on copies of the game and prefer ones that survive with options left."""
+    best_index, best_value = 0, None
+    for i, move in enumerate(game.valid_moves):
+        value = 0.0
+        for _ in range(samples):
+            clone = game.copy()
+            clone.rng = random.Random(rng.random())
+            clone.move_player(i)
+            if clone.game_over:
+                value -= 100
+            else:
+                value += 10 * (clone.score - game.score) + len(clone.valid_moves)
+        if best_value is None or value > best_value:
+            best_index, best_value = i, value
+    return best_index
+
+
+POLICIES = {
+    'random': random_policy,
+    'greedy': greedy_policy,
+    'lookahead': lookahead_policy,
+}
+
+
+# The player's decisions draw from their own stream so the spawn sequence
+# doesn't depend on how many numbers a policy consumes
+POLICY_SEED_XOR = 0x5DEECE66D
+
+
+def play_episode(policy, seed, spawn_rate=SPAWN_RATE, max_enemies=MAX_ENEMIES,
+                 move_time_limit=MOVE_TIME_LIMIT, think_time=0.0, max_turns=1000,
+                 rng_class=random.Random, board_size=BOARD_SIZE):
+    """Play one game; returns (score, turns, end_reason)."""
+    rng = rng_class(seed)
+    policy_rng = rng_class(seed ^ POLICY_SEED_XOR)
+    game = KnightSurvivalGame(rng=rng, spawn_rate=spawn_rate, max_enemies=max_enemies,
+                              move_time_limit=move_time_limit, board_size=board_size)
+    game.start()
+    while not game.game_over:
+        if game.turn_count >= max_turns:
+            return game.score, game.turn_count, 'max_turns'
+        if not game.valid_moves:
+            # Boxed in: nothing to do but wait for the clock
+            return game.score, game.turn_count, 'stuck'
+        if think_time and policy_rng.expovariate(1.0 / think_time) > move_time_limit:
+            return game.score, game.turn_count, 'timeout'
+        game.move_player(policy(game, policy_rng))
+    return game.score, game.turn_count, 'captured'
+
+
+def _run_batch(args):
+    policy_name, seeds, params = args
+    policy = POLICIES[policy_name]
+    return [play_episode(policy, seed, **params) for seed in seeds]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def summarize(results):
+    scores = sorted(score for score, _, _ in results)
+    turns = sorted(turn for _, turn, _ in results)
+
+    def distribution(values):
+        return {
+            'mean': statistics.fmean(values),
+            'stdev': statistics.pstdev(values),
+            'min': values[0],
+            'p10': percentile(values, 0.10),
+            'p50': percentile(values, 0.50),
+            'p90': percentile(values, 0.90),
+            'max': values[-1],
+            'histogram': dict(sorted(Counter(values).items())),
+        }
+
+    return {
+        'episodes': len(results),
+        'score': distribution(scores),
+        'turns': distribution(turns),
+        'end_reasons': dict(Counter(reason for _, _, reason in results)),
+    }
+
+
+def simulate(policy_name, episodes, seed=0, workers=None, chunk_size=250, **params):
+    seeds = [seed * 1_000_003 + i for i in range(episodes)]
+    batches = [(policy_name, seeds[i:i + chunk_size], params)
+               for i in range(0, episodes, chunk_size)]
+    results = []
+    if workers == 1:
+        for batch in batches:
+            results.extend(_run_batch(batch))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for batch_results in pool.map(_run_batch, batches):
+                results.extend(batch_results)
+    return results
+
+
+def print_summary(policy_name, summary, elapsed):
+    score, turns = summary['score'], summary['turns']
+    print(f"{policy_name}: {summary['episodes']} episodes in {elapsed:.2f}s "
+          f"({summary['episodes'] / elapsed:.0f} episodes/s)")
+    for label, dist in (('score', score), ('turns', turns)):
+        print(f"  {label:<6} mean {dist['mean']:7.2f}  stdev {dist['stdev']:7.2f}  "
+              f"min {dist['min']}  p10 {dist['p10']}  p50 {dist['p50']}  "
+              f"p90 {dist['p90']}  max {dist['max']}")
+    reasons = ', '.join(f"{reason} {count}" for reason, count in sorted(summary['end_reasons'].items()))
+    print(f"  ended: {reasons}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--episodes', type=int, default=1000)
+    parser.add_argument('--policy', action='append', choices=sorted(POLICIES),
+                        help="player policy to evaluate (repeatable, default: greedy)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes (default: CPU count, 1 runs in-process)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--board-size', type=int, default=BOARD_SIZE)
+    parser.add_argument('--spawn-rate', type=int, default=SPAWN_RATE)
+    parser.add_argument('--max-enemies', type=int, default=MAX_ENEMIES)
+    parser.add_argument('--move-time-limit', type=float, default=MOVE_TIME_LIMIT)
+    parser.add_argument('--think-time', type=float, default=0.0,
+                        help="mean seconds per player decision (default: instant)")
+    parser.add_argument('--max-turns', type=int, default=1000)
+    parser.add_argument('--json', metavar='PATH', help="also write the summaries as JSON")
+    args = parser.parse_args(argv)
+    if args.episodes < 1:
+        parser.error("--episodes must be at least 1")
+
+    params = {
+        'board_size': args.board_size,
+        'spawn_rate': args.spawn_rate,
+        'max_enemies': args.max_enemies,
+        'move_time_limit': args.move_time_limit,
+        'think_time': args.think_time,
+        'max_turns': args.max_turns,
+    }
+    summaries = {}
+    for policy_name in args.policy or ['greedy']:
+        start = time.perf_counter()
+        results = simulate(policy_name, args.episodes, seed=args.seed, workers=args.workers, **params)
+        summaries[policy_name] = summary = summarize(results)
+        print_summary(policy_name, summary, time.perf_counter() - start)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'params': params, 'policies': summaries}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
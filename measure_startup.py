@@ -0,0 +1,53 @@
+# measure_startup.py
+"""Time cold and warm launches of a game, packaged or from source.
+
+    python measure_startup.py dist/KnightSurvival
+    python measure_startup.py --runs 10 python knight_survival.py
+
+Each run is started with STARTUP_TIMING=exit, so the app quits as soon as its
+first frame is on screen. The first run is reported as the cold launch; for
+--onefile builds it includes unpacking the bundle.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+def measure(command, runs):
+    env = dict(os.environ, STARTUP_TIMING='exit')
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        timings.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            print(result.stdout)
+            raise SystemExit(f"{' '.join(command)} exited with {result.returncode}")
+        for line in result.stdout.splitlines():
+            if 'startup:' in line:
+                print(f"  {line.strip()}")
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure launch-to-first-frame time")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('command', nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+    if not args.command:
+        parser.error("missing command to launch")
+
+    timings = measure(args.command, args.runs)
+    print(f"cold launch: {timings[0] * 1000:.0f} ms")
+    if len(timings) > 1:
+        warm = timings[1:]
+        print(f"warm launch: median {statistics.median(warm) * 1000:.0f} ms, "
+              f"min {min(warm) * 1000:.0f} ms over {len(warm)} runs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""Perft benchmark and correctness check for the chess move generator.
+
+Counts leaf nodes of the legal move tree to a fixed depth and compares them
+with published reference counts. Runs headless (no pygame).
+
+    python perft.py                   # standard suite, exits 1 on any mismatch
+    python perft.py --quick           # shallower depths for a fast smoke check
+    python perft.py --mates           # also count checkmates at the leaves
+    python perft.py --divide 3        # per-move node counts for the start position
+    python perft.py --fen "<fen>" --divide 2
+"""
+import argparse
+import sys
+import time
+
+from bitboard import START_FEN, Position, move_to_uci
+
+# name -> (fen, {depth: nodes}, {depth: checkmates})
+# Reference counts from https://www.chessprogramming.org/Perft_Results
+POSITIONS = {
+    'startpos': (
+        START_FEN,
+        {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609},
+        {3: 0, 4: 8, 5: 347},
+    ),
+    'kiwipete': (
+        'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+        {1: 48, 2: 2039, 3: 97862, 4: 4085603},
+        {3: 1, 4: 43},
+    ),
+    'position3': (
+        '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+        {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624},
+        {4: 17, 5: 0},
+    ),
+    'position4': (
+        'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+        {1: 6, 2: 264, 3: 9467, 4: 422333},
+        {3: 22, 4: 5},
+    ),
+    'position5': (
+        'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+        {1: 44, 2: 1486, 3: 62379, 4: 2103487},
+        {},
+    ),
+    'position6': (
+        'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+        {1: 46, 2: 2079, 3: 89890, 4: 3894594},
+        {},
+    ),
+}
+
+QUICK_DEPTH = 3
+FULL_DEPTH = 4
+
+
+def perft(position, depth):
+    moves = position.legal_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        position.make_move(move)
+        nodes += perft(position, depth - 1)
+        position.unmake_move()
+    return nodes
+
+
+def perft_mates(position, depth):
+    """Return (nodes, checkmates) at the given depth."""
+    if depth == 0:
+        return 1, int(position.is_checkmate())
+    nodes = mates = 0
+    for move in position.legal_moves():
+        position.make_move(move)
+        n, m = perft_mates(position, depth - 1)
+        position.unmake_move()
+        nodes += n
+        mates += m
+    return nodes, mates
+
+
+def divide(position, depth):
+    results = []
+    for move in position.legal_moves():
+        position.make_move(move)
+        nodes = perft(position, depth - 1) if depth > 1 else 1
+        position.unmake_move()
+        results.append((move_to_uci(move), nodes))
+    return results
+
+
+def run_suite(max_depth, count_mates=False, names=None):
+    failures = 0
+    total_nodes = 0
+    total_time = 0.0
+    for name, (fen, expected_nodes, expected_mates) in POSITIONS.items():
+        if names and name not in names:
+            continue
+        for depth in sorted(expected_nodes):
+            if depth > max_depth:
+                break
+            position = Position.from_fen(fen)
+            start = time.perf_counter()
+            if count_mates:
+                nodes, mates = perft_mates(position, depth)
+            else:
+                nodes, mates = perft(position, depth), None
+            elapsed = time.perf_counter() - start
+
+            ok = nodes == expected_nodes[depth]
+            line = f"{name:<10} depth {depth}  nodes {nodes:>10}"
+            if mates is not None and depth in expected_mates:
+                ok = ok and mates == expected_mates[depth]
+                line += f"  mates {mates:>5}"
+            nps = nodes / elapsed if elapsed > 0 else 0.0
+            line += f"  {elapsed:8.3f}s  {nps:>10.0f} nps"
+            if not ok:
+                failures += 1
+                line += f"  MISMATCH (expected {expected_nodes[depth]}"
+                if depth in expected_mates:
+                    line += f" nodes, {expected_mates[depth]} mates"
+                line += ")"
+            print(line)
+            total_nodes += nodes
+            total_time += elapsed
+
+    if total_time > 0:
+        print(f"total      {total_nodes} nodes in {total_time:.3f}s "
+              f"({total_nodes / total_time:.0f} nps)")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fen', help="position for --divide (default: start position)")
+    parser.add_argument('--divide', type=int, metavar='DEPTH',
+                        help="print node counts per root move")
+    parser.add_argument('--depth', type=int, default=FULL_DEPTH,
+                        help=f"maximum suite depth (default: {FULL_DEPTH})")
+    parser.add_argument('--quick', action='store_true',
+                        help=f"limit the suite to depth {QUICK_DEPTH}")
+    parser.add_argument('--mates', action='store_true',
+                        help="also count and check checkmates at the leaves")
+    parser.add_argument('--position', action='append', choices=sorted(POSITIONS),
+                        help="only run the named suite position (repeatable)")
+    args = parser.parse_args(argv)
+
+    if args.divide is not None:
+        position = Position.from_fen(args.fen or START_FEN)
+        start = time.perf_counter()
+        results = divide(position, args.divide)
+        elapsed = time.perf_counter() - start
+        for uci, nodes in sorted(results):
+            print(f"{uci}: {nodes}")
+        total = sum(nodes for _, nodes in results)
+        print(f"\nmoves {len(results)}  nodes {total}  {elapsed:.3f}s")
+        return 0
+
+    depth = QUICK_DEPTH if args.quick else args.depth
+    failures = run_suite(depth, count_mates=args.mates, names=args.position)
+    if failures:
+        print(f"{failures} perft mismatch(es)")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+"""PGN reading and writing and standard algebraic notation (SAN).
+
+read_games() streams games from a file one at a time. Only the current
+game's text is held in memory, so multi-gigabyte collections can be
+processed in constant memory. .gz, .bz2 and .xz files are decompressed on
+the fly.
+
+    with open_pgn('games.pgn.gz') as f:
+        for game in read_games(f):
+            position = start_position(game.headers)
+            for san in game.moves:
+                position.make_move(parse_san(position, san))
+"""
+import bz2
+import gzip
+import lzma
+import re
+import sys
+from collections import namedtuple
+
+from bitboard import (KING, PAWN, PIECE_SYMBOLS, START_FEN, Position, encode_move, move_from,
+                      move_promotion, move_to, parse_square, square_name)
+from pieces import type_of
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+# Seven Tag Roster, written first and in this order
+ROSTER = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+
+PGNGame = namedtuple('PGNGame', 'headers moves result')
+PGNGame.__doc__ = "One game: headers dict, SAN move strings of the main line, result."
+
+
+class PGNError(ValueError):
+    pass
+
+
+_HEADER = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_TOKEN = re.compile(r'''
+    \{[^}]*\}?                 # comment (may be cut off by the end of the text)
+  | ;[^\n]*                    # comment to end of line
+  | (?P<open>\() | (?P<close>\))
+  | \$\d+                      # numeric annotation glyph
+  | (?P<result>1-0|0-1|1/2-1/2|\*)
+  | \d+\.+                     # move number
+  | (?P<san>[^\s{}();$.]+)
+''', re.VERBOSE)
+_SAN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+
+
+def open_pgn(path):
+    """Open a PGN file for reading as text; '-' is stdin.
+
+    Closing the file returned for '-' leaves the process's stdin open.
+    """
+    if path == '-':
+        return open(sys.stdin.fileno(), 'r', encoding='utf-8', errors='replace', closefd=False)
+    opener = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}.get(
+        path[path.rfind('.'):], open)
+    return opener(path, 'rt', encoding='utf-8', errors='replace')
+
+
+def iter_game_texts(lines):
+    """Split a stream of PGN lines into one text block per game.
+
+    A game ends where the next one's tag section starts. Brace comments
+    may span lines and contain '['.
+    """
+    buffer = []
+    in_moves = False
+    in_comment = False
+    for line in lines:
+        if line.startswith('%'):
+            continue  # escape mechanism: ignore the line
+        stripped = line.strip()
+        if stripped.startswith('[') and in_moves and not in_comment:
+            yield ''.join(buffer)
+            buffer = []
+            in_moves = False
+        buffer.append(line)
+        if stripped and not in_comment and not stripped.startswith('['):
+            in_moves = True
+        if '{' in line or '}' in line:
+            in_comment = line.rfind('{') > line.rfind('}')
+    if any(line.strip() for line in buffer):
+        yield ''.join(buffer)
+
+
+def parse_game(text):
+    """PGNGame for one game's text. Variations, comments and NAGs are dropped."""
+    headers = {}
+    pos = 0
+    for match in _HEADER.finditer(text):
+        # Tags come before the movetext; stop at the first gap with other text
+        if text[pos:match.start()].strip():
+            break
+        headers[match.group(1)] = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+        pos = match.end()
+
+    moves = []
+    result = None
+    depth = 0
+    for match in _TOKEN.finditer(text, pos):
+        if match.group('open'):
+            depth += 1
+        elif match.group('close'):
+            depth = max(depth - 1, 0)
+        elif depth:
+            continue
+        elif match.group('result'):
+            result = match.group('result')
+        elif match.group('san'):
+            moves.append(match.group('san'))
+    return PGNGame(headers, moves, result or headers.get('Result', '*'))
+
+
+def read_games(f):
+    """Yield a PGNGame for each game in a text stream, one at a time."""
+    for text in iter_game_texts(f):
+        yield parse_game(text)
+
+
+def start_position(headers):
+    fen = headers.get('FEN')
+    return Position.from_fen(fen) if fen else Position.initial()
+
+
+def parse_san(position, san, legal=None):
+    """Encoded move for san in position; raises PGNError if it is illegal or ambiguous."""
+    if legal is None:
+        legal = position.legal_moves()
+    text = san.rstrip('+#!?')
+    if text in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        king = position.king_square(position.side)
+        to = king + (2 if len(text) == 3 else -2)
+        move = encode_move(king, to)
+        if move in legal:
+            return move
+        raise PGNError(f"illegal castling {san!r}")
+
+    match = _SAN.match(text)
+    if not match:
+        raise PGNError(f"unreadable move {san!r}")
+    piece, from_file, from_rank, to_name, promotion = match.groups()
+    ptype = PIECE_SYMBOLS.index(piece) if piece else PAWN
+    to = parse_square(to_name)
+    promotion = PIECE_SYMBOLS.index(promotion) if promotion else 0
+    candidates = [
+        move for move in legal
+        if move_to(move) == to and move_promotion(move) == promotion
+        and type_of(position.mailbox[move_from(move)]) == ptype
+        and (from_file is None or 'abcdefgh'[move_from(move) & 7] == from_file)
+        and (from_rank is None or str((move_from(move) >> 3) + 1) == from_rank)
+    ]
+    if len(candidates) == 1:
+        return candidates[0]
+    raise PGNError(f"{'ambiguous' if candidates else 'illegal'} move {san!r}")
+
+
+def move_to_san(position, move, legal=None):
+    """SAN for a legal move, with + or # when it gives check or mate."""
+    if legal is None:
+        legal = position.legal_moves()
+    frm, to, promotion = move_from(move), move_to(move), move_promotion(move)
+    ptype = type_of(position.mailbox[frm])
+    if ptype == KING and abs(to - frm) == 2:
+        san = 'O-O' if to > frm else 'O-O-O'
+    else:
+        capture = bool(position.mailbox[to]) or (ptype == PAWN and to == position.ep_square)
+        if ptype == PAWN:
+            san = square_name(frm)[0] + 'x' if capture else ''
+        else:
+            san = PIECE_SYMBOLS[ptype]
+            rivals = [move_from(other) for other in legal
+                      if move_to(other) == to and move_from(other) != frm
+                      and type_of(position.mailbox[move_from(other)]) == ptype]
+            if rivals:
+                if all((sq & 7) != (frm & 7) for sq in rivals):
+                    san += square_name(frm)[0]
+                elif all((sq >> 3) != (frm >> 3) for sq in rivals):
+                    san += square_name(frm)[1]
+                else:
+                    san += square_name(frm)
+            if capture:
+                san += 'x'
+        san += square_name(to)
+        if promotion:
+            san += '=' + PIECE_SYMBOLS[promotion]
+    position.make_move(move)
+    if position.in_check():
+        san += '#' if not position.legal_moves() else '+'
+    position.unmake_move()
+    return san
+
+
+def format_game(headers, moves, result='*', width=79):
+    """PGN text for a game given its headers and SAN moves."""
+    headers = dict(headers, Result=result)
+    lines = []
+    for tag in ROSTER + tuple(tag for tag in headers if tag not in ROSTER):
+        value = headers.get(tag, '????.??.??' if tag == 'Date' else '?')
+        value = value.replace('\\', '\\\\').replace('"', '\\"')
+        lines.append(f'[{tag} "{value}"]')
+    lines.append('')
+
+    # Move numbers follow the start position's side to move and move number
+    position = start_position(headers)
+    number, black = position.fullmove_number, position.side
+    tokens = []
+    for i, san in enumerate(moves):
+        if not black:
+            tokens.append(f"{number}.")
+        elif i == 0:
+            tokens.append(f"{number}...")
+        tokens.append(san)
+        if black:
+            number += 1
+        black ^= 1
+    tokens.append(result)
+
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > width:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+    return '\n'.join(lines) + '\n\n'
+
+
+def export_game(moves, start_fen=None, headers=None, result='*'):
+    """PGN text for encoded moves played from start_fen (default: the initial position)."""
+    headers = dict(headers or {})
+    if start_fen and start_fen != START_FEN:
+        headers.update(SetUp='1', FEN=start_fen)
+    position = start_position(headers)
+    sans = []
+    for move in moves:
+        sans.append(move_to_san(position, move))
+        position.make_move(move)
+    return format_game(headers, sans, result)
+
@@ -0,0 +1,96 @@
+"""Small-integer piece codes shared by the chess and Knight Survival boards.
+
+A piece is one byte: the type plus one in the low three bits and the colour
+in bit 3, so 0 is an empty square and a board is a flat 64-entry bytearray.
+Copying a board is one bytearray copy, and bytes(board) can be hashed.
+
+Code that still wants the old ``{'piece', 'color', 'symbol'}`` dicts gets
+one interned, read-only dict per code from piece_dict().
+"""
+from collections.abc import Mapping
+from types import MappingProxyType
+
+WHITE, BLACK = 0, 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+
+COLOR_NAMES = ('white', 'black')
+PIECE_NAMES = ('pawn', 'knight', 'bishop', 'rook', 'queen', 'king')
+PIECE_SYMBOLS = 'PNBRQK'
+
+EMPTY = 0
+TYPE_MASK = 7
+BLACK_BIT = 8  # set in every black piece's code; empty squares have no colour bits
+
+
+def encode(color, ptype):
+    return (color << 3) | (ptype + 1)
+
+
+def color_of(code):
+    return code >> 3
+
+
+def type_of(code):
+    return (code & TYPE_MASK) - 1
+
+
+# (color, type) per code, for hot paths where a table lookup beats shifting
+DECODE = [None] * 16
+for _color in (WHITE, BLACK):
+    for _ptype in range(6):
+        DECODE[encode(_color, _ptype)] = (_color, _ptype)
+
+
+def _legacy_dict(code):
+    color, ptype = color_of(code), type_of(code)
+    symbol = PIECE_SYMBOLS[ptype]
+    return MappingProxyType({
+        'piece': PIECE_NAMES[ptype],
+        'color': COLOR_NAMES[color],
+        'symbol': symbol if color == WHITE else symbol.lower(),
+    })
+
+
+_PIECE_DICTS = {encode(color, ptype): _legacy_dict(encode(color, ptype))
+                for color in (WHITE, BLACK) for ptype in range(6)}
+
+
+def piece_dict(code):
+    """Interned read-only ``{'piece', 'color', 'symbol'}`` description of a code."""
+    return _PIECE_DICTS[code]
+
+
+def parse_piece(piece):
+    """Code for a ``{'piece', 'color', ...}`` description."""
+    return encode(COLOR_NAMES.index(piece['color']), PIECE_NAMES.index(piece['piece']))
+
+
+class SquareView(Mapping):
+    """Read-only ``{(x, y): piece dict}`` view of a flat board indexed ``y * width + x``."""
+
+    def __init__(self, squares, width=8):
+        self.squares = squares
+        self.width = width
+
+    def _index(self, pos):
+        x, y = pos
+        if 0 <= x < self.width and 0 <= y < len(self.squares) // self.width:
+            return y * self.width + x
+        return None
+
+    def __getitem__(self, pos):
+        index = self._index(pos)
+        if index is None or not self.squares[index]:
+            raise KeyError(pos)
+        return _PIECE_DICTS[self.squares[index]]
+
+    def __contains__(self, pos):
+        index = self._index(pos)
+        return index is not None and self.squares[index] != EMPTY
+
+    def __iter__(self):
+        width = self.width
+        return ((i % width, i // width) for i, code in enumerate(self.squares) if code)
+
+    def __len__(self):
+        return len(self.squares) - self.squares.count(EMPTY)
@@ -0,0 +1,187 @@
+"""Named timing sections and per-frame counters for finding where frame time goes.
+
+    with PROFILER.section('movegen'):
+        moves = position.legal_moves()
+    PROFILER.count('movegen')
+
+RenderLoop closes a frame after each draw. The front-ends show the last
+few hundred frames in an overlay: frame time percentiles, then the mean time
+per frame of each section and each counter. F3 toggles profiling and the
+overlay. When profiling is off, section() returns a shared do-nothing
+context manager and count() returns at once, so instrumented code costs
+one attribute check.
+
+    PROFILE=1 python chess.py
+    PROFILE_CSV=frames.csv PROFILE_CPROFILE=session.prof python knight_survival.py
+
+PROFILE_CSV writes one row per frame on exit, and PROFILE_CPROFILE runs the
+whole session under cProfile and saves the stats (read them with pstats).
+Either one turns profiling on. The front-ends read these in main() with
+start_from_env(); importing the module does nothing, so worker processes
+that import the game modules are never profiled.
+
+Section times include the sections nested inside them.
+"""
+import collections
+import contextlib
+import cProfile
+import csv
+import os
+import time
+
+# Frames kept for the overlay statistics and the CSV dump
+HISTORY = 600
+
+_NULL_SECTION = contextlib.nullcontext()
+
+
+class _Section:
+    __slots__ = ('totals', 'name', 'start')
+
+    def __init__(self, totals, name):
+        self.totals = totals
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.totals[self.name] += time.perf_counter() - self.start
+
+
+class Profiler:
+    """Section times and counters gathered per frame, for the last history frames.
+
+    A frame's time is its 'frame' section, which RenderLoop wraps around
+    event handling and drawing, so time spent idle between frames is not
+    counted.
+    """
+
+    def __init__(self, enabled=False, history=HISTORY):
+        self.enabled = enabled
+        self.frames = collections.deque(maxlen=history)
+        self.csv_path = None
+        self.cprofile_path = None
+        self._all_frames = None
+        self._sections = collections.defaultdict(float)
+        self._counters = collections.Counter()
+        self._cprofile = None
+
+    def start(self, enabled=True, csv_path=None, cprofile_path=None):
+        """Turn profiling on or off, set the dumps close() writes and start cProfile."""
+        self.enabled = enabled
+        self.csv_path = csv_path
+        self.cprofile_path = cprofile_path
+        self._all_frames = [] if csv_path else None
+        if cprofile_path and self._cprofile is None:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.frames.clear()
+        self._sections.clear()
+        self._counters.clear()
+        return self.enabled
+
+    def section(self, name):
+        """Context manager adding its run time to the current frame's section name."""
+        if not self.enabled:
+            return _NULL_SECTION
+        return _Section(self._sections, name)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self._counters[name] += n
+
+    def end_frame(self):
+        """Close the current frame and start counting the next one."""
+        if not self.enabled:
+            return
+        # A frame that began before profiling was switched on has no 'frame' time; drop it
+        if 'frame' in self._sections:
+            frame = (dict(self._sections), dict(self._counters))
+            self.frames.append(frame)
+            if self._all_frames is not None:
+                self._all_frames.append(frame)
+        self._sections.clear()
+        self._counters.clear()
+
+    def stats(self):
+        """{'frames', 'p50', 'p95', 'p99', 'max', 'sections', 'counters'} over the kept frames.
+
+        Times are in seconds; sections and counters are means per frame.
+        """
+        frames = self.frames
+        if not frames:
+            return None
+        times = sorted(sections.get('frame', 0.0) for sections, _ in frames)
+        sections = collections.defaultdict(float)
+        counters = collections.Counter()
+        for frame_sections, frame_counters in frames:
+            for name, seconds in frame_sections.items():
+                sections[name] += seconds
+            counters.update(frame_counters)
+        n = len(frames)
+        return {
+            'frames': n,
+            'p50': _percentile(times, 50),
+            'p95': _percentile(times, 95),
+            'p99': _percentile(times, 99),
+            'max': times[-1],
+            'sections': {name: seconds / n for name, seconds in sections.items() if name != 'frame'},
+            'counters': {name: count / n for name, count in counters.items()},
+        }
+
+    def overlay_lines(self):
+        """Short text lines summarizing stats(), for an on-screen overlay."""
+        stats = self.stats()
+        if stats is None:
+            return ["profiling: no frames yet"]
+        lines = [f"frame ms  p50 {stats['p50'] * 1000:.2f}  p95 {stats['p95'] * 1000:.2f}  "
+                 f"p99 {stats['p99'] * 1000:.2f}  max {stats['max'] * 1000:.2f}  "
+                 f"({stats['frames']} frames)"]
+        for name, seconds in sorted(stats['sections'].items(), key=lambda item: -item[1]):
+            lines.append(f"{name:<10} {seconds * 1000:7.3f} ms/frame")
+        for name, count in sorted(stats['counters'].items()):
+            lines.append(f"{name:<10} {count:7.2f} /frame")
+        return lines
+
+    def write_csv(self, path):
+        """One row per recorded frame, with a column per section (ms) and counter."""
+        frames = self._all_frames if self._all_frames is not None else list(self.frames)
+        sections = sorted({name for frame_sections, _ in frames for name in frame_sections})
+        counters = sorted({name for _, frame_counters in frames for name in frame_counters})
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['frame'] + [f"{name}_ms" for name in sections] + counters)
+            for i, (frame_sections, frame_counters) in enumerate(frames):
+                writer.writerow([i] + [round(frame_sections.get(name, 0.0) * 1000, 4)
+                                       for name in sections]
+                                + [frame_counters.get(name, 0) for name in counters])
+
+    def close(self):
+        """Write the CSV and cProfile dumps, if configured."""
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.cprofile_path)
+            self._cprofile = None
+        if self.csv_path:
+            self.write_csv(self.csv_path)
+
+
+def _percentile(ordered, pct):
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def start_from_env():
+    """Start PROFILER as PROFILE=1, PROFILE_CSV and PROFILE_CPROFILE ask; call it from main()."""
+    csv_path = os.environ.get('PROFILE_CSV')
+    cprofile_path = os.environ.get('PROFILE_CPROFILE')
+    enabled = os.environ.get('PROFILE', '0') == '1' or bool(csv_path or cprofile_path)
+    PROFILER.start(enabled, csv_path=csv_path, cprofile_path=cprofile_path)
+
+
+# Shared by the game modules, the renderers and the front-ends; off until start_from_env()
+PROFILER = Profiler()
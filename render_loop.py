@@ -0,0 +1,117 @@
+"""Event-driven, frame-capped main loop shared by the pygame front-ends.
+
+Redrawing all 64 squares on every iteration keeps a core busy even when
+nothing changes. RenderLoop instead blocks in pygame.event.wait() until
+there is input, a timer callback is due, or a pending redraw is allowed by
+the frame cap. It only calls draw() after something marked the frame dirty.
+An idle window uses no CPU.
+
+The cap defaults to 60 fps; set MAX_FPS in the environment to change it.
+"""
+import math
+import os
+import time
+
+import pygame
+
+from profiling import PROFILER
+
+DEFAULT_MAX_FPS = int(os.environ.get('MAX_FPS', 60))
+
+# Window events after which the window has to be presented again. The
+# display surface keeps the last frame, so this needs no redraw.
+_EXPOSE_EVENTS = {pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED,
+                  pygame.WINDOWSIZECHANGED}
+
+
+class RenderLoop:
+    """Run handle_event for each event and draw() whenever the frame is dirty.
+
+    handle_event(event) returns True if the event changed what is on screen.
+    Call invalidate() to request a redraw from elsewhere, set_timer() for
+    periodic work such as a countdown, and stop() to leave run().
+    """
+
+    def __init__(self, draw, handle_event, max_fps=DEFAULT_MAX_FPS):
+        self.draw = draw
+        self.handle_event = handle_event
+        self.frame_time = 1.0 / max_fps if max_fps else 0.0
+        self.running = False
+        self.dirty = True
+        self.frames = 0
+        self._last_frame = -math.inf
+        self._timer_interval = None
+        self._timer_callback = None
+        self._next_tick = math.inf
+
+    def invalidate(self):
+        self.dirty = True
+
+    def stop(self):
+        self.running = False
+
+    def set_timer(self, interval, callback=None):
+        """Call callback() every interval seconds until set_timer(None).
+
+        The callback returns True when the frame needs redrawing.
+        """
+        self._timer_interval = interval
+        self._timer_callback = callback
+        self._next_tick = time.monotonic() + interval if interval else math.inf
+
+    def run(self):
+        self.running = True
+        while self.running:
+            events = self._wait()
+            # Everything between waking up and drawing counts towards the frame
+            with PROFILER.section('frame'):
+                drawn = self._step(events)
+            if drawn:
+                PROFILER.end_frame()
+
+    def _step(self, events):
+        """Handle events and the timer, then draw if due. Returns True if a frame was drawn."""
+        for event in events:
+            if event.type == pygame.QUIT:
+                self.stop()
+            elif event.type in _EXPOSE_EVENTS:
+                pygame.display.flip()
+            elif self.handle_event(event):
+                self.dirty = True
+        if not self.running:
+            return False
+
+        now = time.monotonic()
+        if now >= self._next_tick:
+            self._next_tick = max(self._next_tick + self._timer_interval, now)
+            if self._timer_callback():
+                self.dirty = True
+        if self.dirty and now >= self._last_frame + self.frame_time:
+            self.dirty = False
+            self._last_frame = now
+            with PROFILER.section('render'):
+                self.draw()
+            self.frames += 1
+            return True
+        return False
+
+    def _timeout(self):
+        """Seconds until a frame or timer is due, or None if only events can wake us."""
+        due = self._next_tick
+        if self.dirty:
+            due = min(due, self._last_frame + self.frame_time)
+        if due == math.inf:
+            return None
+        return max(0.0, due - time.monotonic())
+
+    def _wait(self):
+        timeout = self._timeout()
+        if timeout is None:
+            events = [pygame.event.wait()]
+        elif timeout > 0:
+            # wait() rounds down to whole milliseconds; round up so we don't spin
+            events = [pygame.event.wait(max(1, math.ceil(timeout * 1000)))]
+        else:
+            events = []
+        events.extend(pygame.event.get())
+        return [event for event in events if event.type != pygame.NOEVENT]
@@ -0,0 +1,460 @@
+"""Alpha-beta search for ChessGame positions.
+
+Negamax with principal variation search and iterative deepening, a
+fixed-size Zobrist-keyed transposition table, quiescence search on captures
+and MVV-LVA / killer / history move ordering.
+
+    engine = Engine(hash_mb=16)
+    info = engine.search(game.position, movetime=1.0)
+    game.play_move(info.best_move)
+"""
+import time
+from array import array
+from collections import namedtuple
+
+import tablebase
+from bitboard import (BISHOP, BLACK, KING, KNIGHT, PAWN, QUEEN, ROOK, WHITE,
+                      move_to_uci)
+from pieces import TYPE_MASK
+
+MATE = 30000
+INFINITY = 31000
+MAX_PLY = 64
+
+EXACT, LOWER, UPPER = 1, 2, 3
+
+# Positions with at most this many pieces, kings included, are looked up in the tablebases
+TABLEBASE_PIECES = 4
+
+# Check the clock and stop flag every this many nodes (power of two minus one);
+# small enough that a UCI stop lands within a few tens of milliseconds
+CHECK_EVERY = 511
+
+PIECE_VALUES = (100, 320, 330, 500, 900, 0)
+
+# Piece-square tables from white's point of view, rank 8 first (as seen on the board)
+_PST = {
+    PAWN: (
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ),
+    KNIGHT: (
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50,
+    ),
+    BISHOP: (
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20,
+    ),
+    ROOK: (
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0,
+    ),
+    QUEEN: (
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20,
+    ),
+    KING: (
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20,
+    ),
+}
+
+# SQUARE_VALUES[color][ptype][sq]: material plus placement for a piece on sq (a1 = 0)
+SQUARE_VALUES = (
+    [[PIECE_VALUES[ptype] + _PST[ptype][sq ^ 56] for sq in range(64)] for ptype in range(6)],
+    [[PIECE_VALUES[ptype] + _PST[ptype][sq] for sq in range(64)] for ptype in range(6)],
+)
+
+
+def evaluate(position):
+    """Static evaluation in centipawns from the side to move's point of view."""
+    score = 0
+    for color, sign in ((WHITE, 1), (BLACK, -1)):
+        tables = SQUARE_VALUES[color]
+        bbs = position.pieces[color]
+        for ptype in range(6):
+            table = tables[ptype]
+            bb = bbs[ptype]
+            while bb:
+                low = bb & -bb
+                bb ^= low
+                score += sign * table[low.bit_length() - 1]
+    return score if position.side == WHITE else -score
+
+
+def tablebase_score(result, ply):
+    """Search score for a tablebase (WIN/DRAW/LOSS, plies to mate) at ply."""
+    wdl, plies = result
+    if wdl == tablebase.WIN:
+        return MATE - ply - plies
+    if wdl == tablebase.LOSS:
+        return -MATE + ply + plies
+    return 0
+
+
+class SearchInfo(namedtuple('SearchInfo', 'depth score nodes time nps pv')):
+    """Progress report for one completed iteration; the last one is the result."""
+    __slots__ = ()
+
+    @property
+    def best_move(self):
+        return self.pv[0] if self.pv else 0
+
+    def __str__(self):
+        pv = ' '.join(move_to_uci(move) for move in self.pv)
+        return (f"depth {self.depth} score {self.score} nodes {self.nodes} "
+                f"time {self.time:.3f}s nps {self.nps:.0f} pv {pv}")
+
+
+class TranspositionTable:
+    """Fixed-size hash table keyed by Zobrist hash.
+
+    Entries live in two flat arrays of 64-bit ints (key, packed data), so the
+    table never grows past the size it was created with. Slots come in pairs:
+    the first keeps the deepest result (unless it is from an older search),
+    the second is always replaced.
+    """
+
+    ENTRY_BYTES = 16
+
+    def __init__(self, size_mb=16):
+        self.resize(size_mb)
+
+    def resize(self, size_mb):
+        entries = max(2, int(size_mb * 1024 * 1024) // self.ENTRY_BYTES)
+        entries = 1 << (entries.bit_length() - 1)
+        self.keys = array('Q', [0]) * entries
+        self.data = array('Q', [0]) * entries
+        self.bucket_mask = (entries >> 1) - 1
+        self.generation = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def size_bytes(self):
+        return len(self.keys) * self.ENTRY_BYTES
+
+    def clear(self):
+        entries = len(self.keys)
+        self.keys = array('Q', [0]) * entries
+        self.data = array('Q', [0]) * entries
+        self.generation = 0
+
+    def new_search(self):
+        self.generation = (self.generation + 1) & 63
+
+    def probe(self, key):
+        """Return (move, score, depth, flag) or None."""
+        i = (key & self.bucket_mask) << 1
+        keys = self.keys
+        if keys[i] != key:
+            i += 1
+            if keys[i] != key:
+                return None
+        data = self.data[i]
+        return (data & 0xFFFF, ((data >> 16) & 0xFFFF) - 32768,
+                (data >> 32) & 0xFF, (data >> 40) & 3)
+
+    def store(self, key, move, score, depth, flag):
+        i = (key & self.bucket_mask) << 1
+        keys = self.keys
+        data = self.data
+        old = data[i]
+        if not (keys[i] == key or keys[i] == 0 or depth >= (old >> 32) & 0xFF
+                or (old >> 42) != self.generation):
+            i += 1
+            old = data[i]
+        if keys[i] == key and not move:
+            move = old & 0xFFFF  # keep the best move from an earlier, shallower search
+        keys[i] = key
+        data[i] = (move | ((score + 32768) << 16) | (min(depth, 255) << 32)
+                   | (flag << 40) | (self.generation << 42))
+
+    def hashfull(self):
+        """Per-mille of the first 1000 slots used by the current search."""
+        sample = min(1000, len(self.keys))
+        used = sum(1 for i in range(sample)
+                   if self.keys[i] and (self.data[i] >> 42) == self.generation)
+        return used * 1000 // sample
+
+
+class SearchAborted(Exception):
+    pass
+
+
+class Engine:
+    def __init__(self, hash_mb=16):
+        self.tt = TranspositionTable(hash_mb)
+        self.killers = [[0, 0] for _ in range(MAX_PLY + 1)]
+        # History heuristic indexed by [color][from * 64 + to]
+        self.history = [[0] * 4096, [0] * 4096]
+        self.nodes = 0
+        self.stop_requested = False
+        self.deadline = None
+        self.node_limit = None
+
+    def set_hash_size(self, size_mb):
+        self.tt.resize(size_mb)
+
+    def stop(self):
+        """Ask a running search to return as soon as possible (thread-safe)."""
+        self.stop_requested = True
+
+    def search(self, position, depth=None, movetime=None, nodes=None, info=None):
+        """Search position and return the SearchInfo of the last completed depth.
+
+        depth, movetime (seconds) and nodes limit the search; with none of them
+        set it runs until stop() is called or MAX_PLY is reached. info, if
+        given, is called with a SearchInfo after every completed iteration.
+        """
+        position = position.copy()
+        max_depth = min(depth or MAX_PLY, MAX_PLY)
+        start = time.perf_counter()
+        self.deadline = start + movetime if movetime is not None else None
+        self.node_limit = nodes
+        self.nodes = 0
+        self.stop_requested = False
+        self.tt.new_search()
+        for killers in self.killers:
+            killers[0] = killers[1] = 0
+        for table in self.history:
+            for i in range(4096):
+                table[i] >>= 1
+
+        root_moves = position.legal_moves()
+        result = SearchInfo(0, 0, 0, 0.0, 0.0, root_moves[:1])
+        if len(root_moves) <= 1:
+            return result
+
+        # Perfect play from the tablebases, when one covers the position
+        if (position.occupied[WHITE] | position.occupied[BLACK]).bit_count() <= TABLEBASE_PIECES:
+            found = tablebase.best_move(position)
+            if found is not None:
+                move, outcome = found
+                pv = tablebase.principal_variation(position) or [move]
+                result = SearchInfo(len(pv), tablebase_score(outcome, 0), len(root_moves),
+                                    time.perf_counter() - start, 0.0, pv)
+                if info is not None:
+                    info(result)
+                return result
+
+        for current_depth in range(1, max_depth + 1):
+            try:
+                score = self._negamax(position, current_depth, -INFINITY, INFINITY, 0)
+            except SearchAborted:
+                break
+            elapsed = time.perf_counter() - start
+            pv = self._principal_variation(position, current_depth)
+            result = SearchInfo(current_depth, score, self.nodes, elapsed,
+                                self.nodes / elapsed if elapsed > 0 else 0.0, pv)
+            if info is not None:
+                info(result)
+            if abs(score) >= MATE - MAX_PLY:
+                break
+            # Another iteration will not finish if half the time is already gone
+            if self.deadline is not None and time.perf_counter() - start > (self.deadline - start) / 2:
+                break
+        return result
+
+    def _check_limits(self):
+        if self.stop_requested:
+            raise SearchAborted
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchAborted
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            raise SearchAborted
+
+    def _principal_variation(self, position, depth):
+        pv = []
+        seen = set()
+        for _ in range(depth):
+            entry = self.tt.probe(position.key)
+            if entry is None or not entry[0] or position.key in seen:
+                break
+            move = entry[0]
+            if move not in position.legal_moves(1 << (move & 63)):
+                break
+            seen.add(position.key)
+            pv.append(move)
+            position.make_move(move)
+        for _ in pv:
+            position.unmake_move()
+        return pv
+
+    def _order_moves(self, position, moves, tt_move, ply):
+        mailbox = position.mailbox
+        ep_square = position.ep_square
+        killer1, killer2 = self.killers[ply]
+        history = self.history[position.side]
+        scored = []
+        for move in moves:
+            if move == tt_move:
+                scored.append((1000000, move))
+                continue
+            to = (move >> 6) & 63
+            victim = mailbox[to]
+            attacker = (mailbox[move & 63] & TYPE_MASK) - 1
+            if victim:
+                scored.append((100000 + PIECE_VALUES[(victim & TYPE_MASK) - 1] * 8 - attacker, move))
+            elif move >> 12:
+                scored.append((100000 + PIECE_VALUES[move >> 12], move))
+            elif attacker == PAWN and to == ep_square:
+                scored.append((100000 + PIECE_VALUES[PAWN] * 8, move))
+            elif move == killer1:
+                scored.append((90000, move))
+            elif move == killer2:
+                scored.append((80000, move))
+            else:
+                scored.append((min(history[move & 4095], 70000), move))
+        scored.sort(reverse=True)
+        return [move for _, move in scored]
+
+    def _negamax(self, position, depth, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes & CHECK_EVERY:
+            self._check_limits()
+
+        if ply:
+            if position.halfmove_clock >= 100 or position.is_repetition():
+                return 0
+            if (position.occupied[WHITE] | position.occupied[BLACK]).bit_count() <= TABLEBASE_PIECES:
+                found = tablebase.probe(position)
+                if found is not None:
+                    return tablebase_score(found, ply)
+            # Mate distance pruning
+            alpha = max(alpha, -MATE + ply)
+            beta = min(beta, MATE - ply - 1)
+            if alpha >= beta:
+                return alpha
+
+        in_check = position.in_check()
+        if in_check:
+            depth += 1
+        if depth <= 0 or ply >= MAX_PLY:
+            return self._quiesce(position, alpha, beta, ply)
+
+        tt_move = 0
+        entry = self.tt.probe(position.key)
+        if entry is not None:
+            tt_move, tt_score, tt_depth, flag = entry
+            if ply and tt_depth >= depth:
+                # Mate scores are stored relative to the node, not the root
+                if tt_score >= MATE - MAX_PLY:
+                    tt_score -= ply
+                elif tt_score <= -MATE + MAX_PLY:
+                    tt_score += ply
+                if flag == EXACT:
+                    return tt_score
+                if flag == LOWER and tt_score >= beta:
+                    return tt_score
+                if flag == UPPER and tt_score <= alpha:
+                    return tt_score
+
+        moves = position.legal_moves()
+        if not moves:
+            return -MATE + ply if in_check else 0
+
+        alpha_orig = alpha
+        best_score = -INFINITY
+        best_move = 0
+        mailbox = position.mailbox
+        for i, move in enumerate(self._order_moves(position, moves, tt_move, ply)):
+            quiet = not mailbox[(move >> 6) & 63] and not move >> 12
+            position.make_move(move)
+            if i == 0:
+                score = -self._negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                score = -self._negamax(position, depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < score < beta:
+                    score = -self._negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            position.unmake_move()
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if quiet:
+                            killers = self.killers[ply]
+                            if killers[0] != move:
+                                killers[1] = killers[0]
+                                killers[0] = move
+                            self.history[position.side][move & 4095] += depth * depth
+                        break
+
+        if best_score <= alpha_orig:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        stored = best_score
+        if stored >= MATE - MAX_PLY:
+            stored += ply
+        elif stored <= -MATE + MAX_PLY:
+            stored -= ply
+        self.tt.store(position.key, best_move, stored, depth, flag)
+        return best_score
+
+    def _quiesce(self, position, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes & CHECK_EVERY:
+            self._check_limits()
+
+        stand_pat = evaluate(position)
+        if stand_pat >= beta or ply >= MAX_PLY:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        mailbox = position.mailbox
+        captures = [move for move in position.legal_moves()
+                    if mailbox[(move >> 6) & 63] or (move >> 12) == QUEEN]
+        for move in self._order_moves(position, captures, 0, ply):
+            position.make_move(move)
+            score = -self._quiesce(position, -beta, -alpha, ply + 1)
+            position.unmake_move()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
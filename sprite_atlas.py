@@ -0,0 +1,107 @@
+"""Piece sprites sliced lazily from a pre-scaled atlas.
+
+build_atlas.py bakes one atlas per square size at build time: a grid with a
+row per color and a column per piece. At runtime the atlas for the requested
+square size is loaded once and converted for the display. Each sprite is a
+subsurface of that atlas, created on first use. If no atlas matches the size,
+the nearest baked one is rescaled, and failing that the atlas is assembled
+from the source PNGs. Atlases are cached per square size.
+"""
+import glob
+import os
+import re
+import sys
+from collections.abc import Mapping
+
+import pygame
+
+PIECES = ('king', 'queen', 'rook', 'knight', 'bishop', 'pawn')
+COLORS = ('white', 'black')
+ATLAS_DIR = os.path.join('sprites', 'atlas')
+
+_atlases = {}
+
+
+def get_resource_path(relative_path):
+    """Get absolute path to resource, works for dev and for PyInstaller"""
+    if hasattr(sys, '_MEIPASS'):
+        return os.path.join(sys._MEIPASS, relative_path)
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), relative_path)
+
+
+def atlas_filename(size):
+    return f'pieces_{size}px.png'
+
+
+def source_filename(color, piece):
+    return f'{color[0]}_{piece}_png_shadow_1024px.png'
+
+
+def baked_sizes():
+    sizes = []
+    for path in glob.glob(os.path.join(get_resource_path(ATLAS_DIR), 'pieces_*px.png')):
+        match = re.search(r'pieces_(\d+)px\.png$', path)
+        if match:
+            sizes.append(int(match.group(1)))
+    return sorted(sizes)
+
+
+class SpriteAtlas(Mapping):
+    """Maps 'white_king'-style keys to sprites cut from one atlas surface."""
+
+    def __init__(self, surface, size):
+        self.surface = surface
+        self.size = size
+        self._sprites = {}
+
+    def __getitem__(self, key):
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            color, piece = key.split('_', 1)
+            if color not in COLORS or piece not in PIECES:
+                raise KeyError(key)
+            rect = (PIECES.index(piece) * self.size, COLORS.index(color) * self.size,
+                    self.size, self.size)
+            sprite = self._sprites[key] = self.surface.subsurface(rect)
+        return sprite
+
+    def __iter__(self):
+        return (f'{color}_{piece}' for color in COLORS for piece in PIECES)
+
+    def __len__(self):
+        return len(COLORS) * len(PIECES)
+
+
+def _load_baked(size):
+    sizes = baked_sizes()
+    if not sizes:
+        return None
+    # Prefer an exact match, then the smallest atlas that is not smaller than needed
+    best = size if size in sizes else next((s for s in sizes if s > size), sizes[-1])
+    surface = pygame.image.load(os.path.join(get_resource_path(ATLAS_DIR), atlas_filename(best)))
+    if best != size:
+        surface = pygame.transform.smoothscale(surface, (size * len(PIECES), size * len(COLORS)))
+    return surface
+
+
+def _assemble_from_sources(size):
+    surface = pygame.Surface((size * len(PIECES), size * len(COLORS)), pygame.SRCALPHA)
+    for row, color in enumerate(COLORS):
+        for col, piece in enumerate(PIECES):
+            path = get_resource_path(os.path.join('sprites', source_filename(color, piece)))
+            image = pygame.image.load(path)
+            surface.blit(pygame.transform.scale(image, (size, size)), (col * size, row * size))
+    return surface
+
+
+def load_sprites(size):
+    """SpriteAtlas for square size in pixels, loaded once per size."""
+    atlas = _atlases.get(size)
+    if atlas is None:
+        surface = _load_baked(size)
+        if surface is None:
+            surface = _assemble_from_sources(size)
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert_alpha()
+        atlas = _atlases[size] = SpriteAtlas(surface, size)
+    return atlas
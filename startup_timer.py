@@ -0,0 +1,27 @@
+"""Launch-to-first-frame timing for the pygame front-ends.
+
+Import this module first thing in an entry point so START is taken as early
+as possible. Set STARTUP_TIMING=1 to print the time to the first presented
+frame, or STARTUP_TIMING=exit to also quit right after it (used by
+measure_startup.py to time cold launches of the packaged app).
+"""
+import os
+import sys
+import time
+
+START = time.perf_counter()
+_reported = False
+
+
+def first_frame_presented(app_name):
+    global _reported
+    if _reported:
+        return
+    _reported = True
+    mode = os.environ.get('STARTUP_TIMING')
+    if not mode:
+        return
+    elapsed_ms = (time.perf_counter() - START) * 1000
+    print(f"{app_name} startup: {elapsed_ms:.1f} ms to first frame", flush=True)
+    if mode == 'exit':
+        sys.exit(0)
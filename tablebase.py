@@ -0,0 +1,194 @@
+"""Endgame tablebases for KQK, KRK, KBNK and KPK, probed through mmap.
+
+Tables are built once by tablebase_gen.py into TABLEBASE_DIR (default:
+tablebases/ next to this module). Each file holds one byte per position,
+for white to move and then for black to move, with white as the side that
+has the extra pieces. Positions where black has them are probed with the
+board flipped. A byte is 0 for a draw (or an illegal position), else the
+number of plies to mate plus one. The side to move wins when that number
+is odd, and is mated when it is even.
+
+Positions are indexed by the squares of the white king, the black king and
+the white pieces in table order, six bits each, with the white king in the
+high bits.
+
+Probing needs no NumPy and reads only the pages it touches. Missing
+tables make probe() return None, so everything works without them.
+"""
+import mmap
+import os
+
+from bitboard import BISHOP, BLACK, KING, KNIGHT, PAWN, QUEEN, ROOK, WHITE
+from pieces import DECODE
+
+TABLEBASE_DIR = os.environ.get(
+    'TABLEBASE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tablebases'))
+
+# White's pieces besides the king, in index order
+TABLES = {
+    'KQK': (QUEEN,),
+    'KRK': (ROOK,),
+    'KBNK': (BISHOP, KNIGHT),
+    'KPK': (PAWN,),
+}
+
+# Material (besides kings) with which nobody can mate
+DEAD_DRAWS = {(), (BISHOP,), (KNIGHT,)}
+
+WIN, DRAW, LOSS = 1, 0, -1
+
+_MATERIAL = {tuple(sorted(pieces)): name for name, pieces in TABLES.items()}
+_tables = {}
+
+
+def table_size(name):
+    return 64 ** (2 + len(TABLES[name]))
+
+
+def table_path(name, directory=None):
+    return os.path.join(directory or TABLEBASE_DIR, name + '.bin')
+
+
+def _open(name):
+    if name not in _tables:
+        path = table_path(name)
+        table = None
+        if os.path.exists(path) and os.path.getsize(path) == 2 * table_size(name):
+            with open(path, 'rb') as f:
+                table = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _tables[name] = table
+    return _tables[name]
+
+
+def available():
+    """Names of the tables found on disk."""
+    return [name for name in TABLES if _open(name) is not None]
+
+
+def material(position):
+    """(strong color, sorted piece types) when only one side has pieces besides its king.
+
+    Returns None when both sides have pieces or there are more than two
+    besides the kings.
+    """
+    found = ([], [])
+    for code in position.mailbox:
+        if code:
+            color, ptype = DECODE[code]
+            if ptype != KING:
+                found[color].append(ptype)
+                if len(found[0]) + len(found[1]) > 2:
+                    return None
+    if found[WHITE] and found[BLACK]:
+        return None
+    strong = BLACK if found[BLACK] else WHITE
+    return strong, tuple(sorted(found[strong]))
+
+
+def index(squares):
+    """Table index for the white king, black king and white piece squares."""
+    result = 0
+    for sq in squares:
+        result = (result << 6) | sq
+    return result
+
+
+def _lookup(position, found):
+    strong, pieces = found
+    name = _MATERIAL.get(pieces)
+    if name is None:
+        return None
+    table = _open(name)
+    if table is None:
+        return None
+    # Flip the board so the strong side is white
+    flip = 56 if strong == BLACK else 0
+    kings = position.kings
+    squares = [kings[strong] ^ flip, kings[strong ^ 1] ^ flip]
+    mailbox = position.mailbox
+    for ptype in TABLES[name]:
+        for sq in range(64):
+            code = mailbox[sq]
+            if code and DECODE[code] == (strong, ptype):
+                squares.append(sq ^ flip)
+                break
+    side = position.side ^ strong
+    return table[side * table_size(name) + index(squares)]
+
+
+def probe(position):
+    """(WIN/DRAW/LOSS for the side to move, plies to mate) or None if no table applies.
+
+    Plies is 0 for a draw and for a side that is already checkmated.
+    """
+    found = material(position)
+    if found is None:
+        return None
+    if found[1] in DEAD_DRAWS:
+        return DRAW, 0
+    value = _lookup(position, found)
+    if value is None:
+        return None
+    if not value:
+        return DRAW, 0
+    plies = value - 1
+    return (WIN if plies & 1 else LOSS), plies
+
+
+def is_dead_draw(position):
+    """True when neither side has mating material (K v K, K+B v K, K+N v K)."""
+    found = material(position)
+    return found is not None and found[1] in DEAD_DRAWS
+
+
+def _child_rank(position, move):
+    """Sort key for a move from the mover's point of view; higher is better."""
+    position.make_move(move)
+    try:
+        result = probe(position)
+    finally:
+        position.unmake_move()
+    if result is None:
+        return None
+    wdl, plies = result
+    if wdl == LOSS:
+        return (2, -plies)  # we win: mate as fast as possible
+    if wdl == DRAW:
+        return (1, 0)
+    return (0, plies)  # we lose: last as long as possible
+
+
+def best_move(position):
+    """(move, (WIN/DRAW/LOSS, plies)) for perfect play from position, or None if no table applies.
+
+    Moves that leave the table (promotions, captures) are judged by the
+    table or dead draw they lead to.
+    """
+    result = probe(position)
+    if result is None:
+        return None
+    best = None
+    best_rank = None
+    for move in position.legal_moves():
+        rank = _child_rank(position, move)
+        if rank is None:
+            continue
+        if best_rank is None or rank > best_rank:
+            best, best_rank = move, rank
+    if best is None:
+        return None
+    return best, result
+
+
+def principal_variation(position, limit=64):
+    """Moves of perfect play from position until mate, a draw or limit plies."""
+    pv = []
+    position = position.copy()
+    while len(pv) < limit:
+        found = best_move(position)
+        if found is None or found[1][0] == DRAW:
+            break
+        pv.append(found[0])
+        position.make_move(found[0])
+    return pv
+
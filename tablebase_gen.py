@@ -0,0 +1,307 @@
+"""Build the endgame tables read by tablebase.py, by retrograde analysis.
+
+    python tablebase_gen.py              # all tables into tablebases/
+    python tablebase_gen.py KQK KRK --dir /tmp/tb
+
+Starts from the checkmates and works backwards one ply at a time, with
+NumPy over whole batches of positions: a white move into a lost black
+position is a win, and a black position is lost once every move from it
+leads to a white win. Only the newest positions are expanded at each ply.
+KPK also needs KQK and KRK, for the positions after a promotion, so those
+are built first.
+
+KBNK has 2 * 64^4 positions and takes a few minutes; the others take
+seconds.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from bitboard import BISHOP, KING, KNIGHT, PAWN, QUEEN, ROOK
+from tablebase import TABLEBASE_DIR, TABLES, table_path, table_size
+
+# Positions handled at once when scanning a whole table
+CHUNK = 1 << 20
+
+DIRECTIONS = ((0, 1), (1, 0), (0, -1), (-1, 0), (1, 1), (1, -1), (-1, -1), (-1, 1))
+KNIGHT_STEPS = ((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2))
+SLIDER_DIRECTIONS = {ROOK: range(4), BISHOP: range(4, 8), QUEEN: range(8)}
+
+
+def _offset(sq, df, dr):
+    file, rank = (sq & 7) + df, (sq >> 3) + dr
+    return rank * 8 + file if 0 <= file < 8 and 0 <= rank < 8 else -1
+
+
+def _tables():
+    squares = range(64)
+    king = np.array([[_offset(sq, df, dr) for df, dr in DIRECTIONS] for sq in squares])
+    knight = np.array([[_offset(sq, df, dr) for df, dr in KNIGHT_STEPS] for sq in squares])
+    rays = np.full((64, 8, 7), -1)
+    for sq in squares:
+        for d, (df, dr) in enumerate(DIRECTIONS):
+            for step in range(7):
+                rays[sq, d, step] = _offset(sq, df * (step + 1), dr * (step + 1))
+
+    # Empty-board attacks [piece, from, to] and the squares between two squares
+    attacks = np.zeros((6, 64, 64), dtype=bool)
+    between = np.zeros((64, 64), dtype=np.uint64)
+    for sq in squares:
+        for target in king[sq][king[sq] >= 0]:
+            attacks[KING, sq, target] = True
+        for target in knight[sq][knight[sq] >= 0]:
+            attacks[KNIGHT, sq, target] = True
+        for df in (-1, 1):
+            target = _offset(sq, df, 1)
+            if target >= 0:
+                attacks[PAWN, sq, target] = True
+        for ptype, directions in SLIDER_DIRECTIONS.items():
+            for d in directions:
+                passed = 0
+                for target in rays[sq, d]:
+                    if target < 0:
+                        break
+                    attacks[ptype, sq, target] = True
+                    between[sq, target] = passed
+                    passed |= 1 << int(target)
+    return king, knight, rays, attacks, between
+
+
+KING_STEPS, KNIGHT_JUMPS, RAYS, ATTACKS, BETWEEN = _tables()
+BIT = np.left_shift(np.uint64(1), np.arange(64, dtype=np.uint64))
+
+
+def attacks(ptype, frm, to, occ):
+    """Whether a piece of ptype on frm attacks to, given occupancy bitmasks (arrays)."""
+    hit = ATTACKS[ptype, frm, to]
+    if ptype in SLIDER_DIRECTIONS:
+        hit &= (BETWEEN[frm, to] & occ) == 0
+    return hit
+
+
+class Table:
+    """Squares, legality and retrograde moves for one material set, over index arrays.
+
+    squares(idx) gives one array per piece: white king, black king, then the
+    white pieces in table order.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.pieces = (KING, KING) + TABLES[name]
+        self.count = len(self.pieces)
+        self.size = table_size(name)
+        self.shifts = [6 * (self.count - 1 - i) for i in range(self.count)]
+
+    def squares(self, idx):
+        return [((idx >> shift) & 63).astype(np.intp) for shift in self.shifts]
+
+    def occupancy(self, squares):
+        occ = BIT[squares[0]]
+        for sq in squares[1:]:
+            occ = occ | BIT[sq]
+        return occ
+
+    def black_in_check(self, squares, occ):
+        check = np.zeros(len(squares[0]), dtype=bool)
+        for ptype, sq in zip(self.pieces[2:], squares[2:]):
+            check |= attacks(ptype, sq, squares[1], occ)
+        return check
+
+    def legal(self, squares):
+        """(legal with white to move, legal with black to move) masks."""
+        ok = ~ATTACKS[KING, squares[0], squares[1]]
+        for i in range(self.count):
+            for j in range(i):
+                ok &= squares[i] != squares[j]
+        for ptype, sq in zip(self.pieces[2:], squares[2:]):
+            if ptype == PAWN:
+                ok &= (sq >= 8) & (sq < 56)
+        occ = self.occupancy(squares)
+        return ok & ~self.black_in_check(squares, occ), ok
+
+    def black_moves(self, squares):
+        """Legal black king moves per position, captures included."""
+        occ = self.occupancy(squares)
+        wk, bk = squares[0], squares[1]
+        moves = np.zeros(len(wk), dtype=np.uint8)
+        for d in range(8):
+            to = KING_STEPS[bk, d]
+            ok = (to >= 0) & ~ATTACKS[KING, wk, to]
+            to = np.where(ok, to, 0)
+            after = (occ & ~BIT[bk]) | BIT[to]
+            for ptype, sq in zip(self.pieces[2:], squares[2:]):
+                # A captured piece attacks nothing
+                ok &= (sq == to) | ~attacks(ptype, sq, to, after)
+            moves += ok
+        return moves
+
+    def white_predecessors(self, idx):
+        """Legal white-to-move positions with a white move to the black-to-move positions idx."""
+        squares = self.squares(idx)
+        occ = self.occupancy(squares)
+        found = []
+        for i, ptype in enumerate(self.pieces):
+            if i == 1:
+                continue  # the black king
+            to = squares[i]
+            for frm, ok in self._unmoves(ptype, to, occ):
+                pred = squares[:i] + [np.where(ok, frm, 0)] + squares[i + 1:]
+                legal, _ = self.legal(pred)
+                ok &= legal
+                found.append(idx[ok] + ((frm[ok] - to[ok]) << self.shifts[i]))
+        return np.unique(np.concatenate(found)) if found else idx[:0]
+
+    def black_predecessors(self, idx):
+        """Black-to-move positions (with repeats, one per move) that have a king move to idx."""
+        squares = self.squares(idx)
+        occ = self.occupancy(squares)
+        wk, bk = squares[0], squares[1]
+        found = []
+        for d in range(8):
+            frm = KING_STEPS[bk, d]
+            ok = frm >= 0
+            frm = np.where(ok, frm, 0)
+            ok &= (occ & BIT[frm]) == 0
+            ok &= ~ATTACKS[KING, wk, frm]
+            found.append(idx[ok] + ((frm[ok] - bk[ok]) << self.shifts[1]))
+        return np.concatenate(found)
+
+    def _unmoves(self, ptype, to, occ):
+        """(from squares, valid mask) pairs for the moves of ptype that end on to."""
+        if ptype == PAWN:
+            frm = to - 8
+            ok = frm >= 8
+            yield np.where(ok, frm, 0), ok & ((occ & BIT[np.where(ok, frm, 0)]) == 0)
+            frm = to - 16
+            ok = (to >= 24) & (to < 32)
+            frm = np.where(ok, frm, 0)
+            ok &= ((occ & BIT[frm]) == 0) & ((occ & BIT[np.where(ok, to - 8, 0)]) == 0)
+            yield frm, ok
+        elif ptype in (KING, KNIGHT):
+            steps = KING_STEPS if ptype == KING else KNIGHT_JUMPS
+            for d in range(8):
+                frm = steps[to, d]
+                ok = frm >= 0
+                frm = np.where(ok, frm, 0)
+                yield frm, ok & ((occ & BIT[frm]) == 0)
+        else:
+            for d in SLIDER_DIRECTIONS[ptype]:
+                ok = np.ones(len(to), dtype=bool)
+                for step in range(7):
+                    frm = RAYS[to, d, step]
+                    ok &= frm >= 0
+                    frm = np.where(ok, frm, 0)
+                    ok &= (occ & BIT[frm]) == 0
+                    if not ok.any():
+                        break
+                    yield frm, ok.copy()
+
+
+def _promotion_wins(table, directory):
+    """{white ply: indices} for KPK positions where promoting mates in that many plies."""
+    targets = {QUEEN: 'KQK', ROOK: 'KRK'}
+    loaded = {}
+    for ptype, name in targets.items():
+        path = table_path(name, directory)
+        loaded[ptype] = np.fromfile(path, dtype=np.uint8)[table_size(name):]  # black to move
+    idx = np.arange(table_size('KPK'), dtype=np.int64)
+    wk, bk, pawn = table.squares(idx)
+    ok = (pawn >= 48) & (pawn < 56)
+    to = np.where(ok, pawn + 8, 0)
+    ok &= (to != wk) & (to != bk)
+    best = np.zeros(len(idx), dtype=np.int64)
+    for ptype, values in loaded.items():
+        value = values[(wk << 12) | (bk << 6) | to].astype(np.int64)
+        plies = value - 1
+        wins = ok & (value > 0) & (plies % 2 == 0)
+        better = wins & ((best == 0) | (plies + 1 < best))
+        best[better] = plies[better] + 1
+    legal, _ = table.legal([wk, bk, pawn])
+    best[~legal] = 0
+    return {int(ply): np.flatnonzero(best == ply) for ply in np.unique(best[best > 0])}
+
+
+def generate(name, directory=None, progress=print):
+    """Build one table and write it to table_path(name, directory)."""
+    table = Table(name)
+    size = table.size
+    start = time.perf_counter()
+
+    white_legal = np.zeros(size, dtype=bool)
+    black_legal = np.zeros(size, dtype=bool)
+    moves = np.zeros(size, dtype=np.uint8)
+    mated = []
+    for lo in range(0, size, CHUNK):
+        idx = np.arange(lo, min(lo + CHUNK, size), dtype=np.int64)
+        squares = table.squares(idx)
+        white_ok, black_ok = table.legal(squares)
+        white_legal[lo:lo + len(idx)] = white_ok
+        black_legal[lo:lo + len(idx)] = black_ok
+        counts = table.black_moves(squares)
+        moves[lo:lo + len(idx)] = counts
+        check = table.black_in_check(squares, table.occupancy(squares))
+        mated.append(idx[black_ok & check & (counts == 0)])
+
+    promotions = _promotion_wins(table, directory) if PAWN in TABLES[name] else {}
+
+    # Value per position: 0 while unknown (a draw at the end), else plies to mate + 1
+    white = np.zeros(size, dtype=np.uint8)
+    black = np.zeros(size, dtype=np.uint8)
+    lost = np.concatenate(mated)
+    black[lost] = 1
+    ply = 0
+    while len(lost) or any(p > ply for p in promotions):
+        won = table.white_predecessors(lost) if len(lost) else lost
+        if ply + 1 in promotions:
+            won = np.union1d(won, promotions.pop(ply + 1))
+        won = won[white_legal[won] & (white[won] == 0)]
+        white[won] = ply + 2
+
+        preds, hits = np.unique(table.black_predecessors(won), return_counts=True)
+        keep = black_legal[preds] & (black[preds] == 0)
+        preds, hits = preds[keep], hits[keep]
+        moves[preds] -= hits.astype(np.uint8)
+        lost = preds[moves[preds] == 0]
+        black[lost] = ply + 3
+        ply += 2
+        progress(f"{name}: ply {ply:3}  {len(won):9} won  {len(lost):9} lost")
+
+    path = table_path(name, directory)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        white.tofile(f)
+        black.tofile(f)
+    progress(f"{name}: {np.count_nonzero(white) + np.count_nonzero(black)} decided positions, "
+             f"longest mate {max(int(white.max()), int(black.max())) - 1} plies, "
+             f"{time.perf_counter() - start:.1f}s -> {path}")
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('tables', nargs='*', metavar='TABLE',
+                        help=f"tables to build ({', '.join(TABLES)}; default all)")
+    parser.add_argument('--dir', default=TABLEBASE_DIR, help="output directory")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.tables if name not in TABLES]
+    if unknown:
+        parser.error(f"unknown table {unknown[0]}")
+
+    names = list(args.tables or TABLES)
+    if 'KPK' in names:
+        # KPK looks up the positions after promotion
+        for name in ('KQK', 'KRK'):
+            if name not in names and not os.path.exists(table_path(name, args.dir)):
+                names.insert(0, name)
+        names.sort(key=lambda name: name == 'KPK')
+    for name in names:
+        generate(name, args.dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""Leveled, typed event log for the games, replacing print() in the game loop.
+
+Events go into an in-memory ring buffer. Optionally they are also written
+to a file as JSON lines, in batches, so the frame loop never waits on
+stdout or the disk for a single event. The log is off by default, and a
+disabled call is one attribute compare. Pass raw values, never
+pre-formatted strings, so nothing is formatted unless the event is kept.
+
+    TELEMETRY=debug TELEMETRY_FILE=session.jsonl python knight_survival.py
+
+Read a session back with load_events(path).
+"""
+import collections
+import json
+import os
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+OFF = 100
+
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'off': OFF}
+LEVEL_NAMES = {value: name for name, value in LEVELS.items()}
+
+# Event types and the names of their positional values
+SPAWN = 'spawn'
+MOVE = 'move'
+CAPTURE = 'capture'
+TIMEOUT = 'timeout'
+ENEMY_MOVE = 'enemy_move'
+VALID_MOVES = 'valid_moves'
+KEY = 'key'
+START = 'start'
+RESET = 'reset'
+
+FIELDS = {
+    SPAWN: ('pos', 'piece'),
+    MOVE: ('frm', 'to', 'turn'),
+    CAPTURE: ('by', 'pos', 'score'),
+    TIMEOUT: ('turn', 'score'),
+    ENEMY_MOVE: ('frm', 'to', 'piece'),
+    VALID_MOVES: ('moves',),
+    KEY: ('key',),
+    START: (),
+    RESET: (),
+}
+
+
+class EventLog:
+    """Ring buffer of (time, level, type, values) tuples with optional batched file output.
+
+    level is the lowest level kept; OFF (the default) drops everything.
+    With a path, events are also appended to it as JSON lines once
+    flush_every of them are pending, and on flush() or close().
+    """
+
+    def __init__(self, level=OFF, capacity=4096, path=None, flush_every=256):
+        self.level = level
+        self.buffer = collections.deque(maxlen=capacity)
+        self.path = path
+        self.flush_every = flush_every
+        self._pending = []
+        self._file = None
+
+    def debug(self, kind, *values):
+        if self.level <= DEBUG:
+            self._record(DEBUG, kind, values)
+
+    def info(self, kind, *values):
+        if self.level <= INFO:
+            self._record(INFO, kind, values)
+
+    def warning(self, kind, *values):
+        if self.level <= WARNING:
+            self._record(WARNING, kind, values)
+
+    def _record(self, level, kind, values):
+        event = (time.monotonic(), level, kind, values)
+        self.buffer.append(event)
+        if self.path is not None:
+            self._pending.append(event)
+            if len(self._pending) >= self.flush_every:
+                self.flush()
+
+    def events(self, kind=None):
+        """Buffered events, oldest first, optionally only one type."""
+        return [event for event in self.buffer if kind is None or event[2] == kind]
+
+    def flush(self):
+        if not self._pending:
+            return
+        if self._file is None:
+            self._file = open(self.path, 'a')
+        self._file.write(''.join(json.dumps(as_dict(event)) + '\n' for event in self._pending))
+        self._file.flush()
+        self._pending.clear()
+
+    def close(self):
+        if self.path is not None:
+            self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def as_dict(event):
+    timestamp, level, kind, values = event
+    record = {'t': round(timestamp, 6), 'level': LEVEL_NAMES[level], 'event': kind}
+    record.update(zip(FIELDS.get(kind, ()), values))
+    return record
+
+
+def load_events(path):
+    """Events written by an EventLog, as dicts."""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def from_env():
+    """EventLog configured by TELEMETRY (debug/info/warning/off) and TELEMETRY_FILE."""
+    name = os.environ.get('TELEMETRY', 'off').lower()
+    if name not in LEVELS:
+        raise ValueError(f"TELEMETRY must be one of {', '.join(LEVELS)}, not {name!r}")
+    return EventLog(LEVELS[name], path=os.environ.get('TELEMETRY_FILE'))
@@ -0,0 +1,28 @@
+import pytest
+
+from bitboard import Position
+from perft import POSITIONS
+
+
+@pytest.mark.parametrize('name', sorted(POSITIONS))
+def test_unmake_restores_every_move(name):
+    position = Position.from_fen(POSITIONS[name][0])
+    fen, key = position.to_fen(), position.key
+    for move in position.legal_moves():
+        position.make_move(move)
+        assert position.key == position.compute_key()
+        for reply in position.legal_moves():
+            position.make_move(reply)
+            assert position.key == position.compute_key()
+            position.unmake_move()
+        position.unmake_move()
+        assert position.to_fen() == fen
+        assert position.key == key
+
+
+def test_legal_moves_leave_no_king_in_check():
+    position = Position.from_fen(POSITIONS['kiwipete'][0])
+    for move in position.legal_moves():
+        position.make_move(move)
+        assert not position.in_check(position.side ^ 1)
+        position.unmake_move()
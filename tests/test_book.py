@@ -0,0 +1,33 @@
+import pytest
+
+from book import (EN_PASSANT_PAIR, TRANSPOSITIONS, OpeningBook, _play, book_key, build_book,
+                  write_book)
+from pgn import PGNGame, move_to_san
+
+
+@pytest.fixture(scope='module')
+def book(tmp_path_factory):
+    games = [PGNGame({}, orders[0].split() + [next_san], '1-0')
+             for orders, _, next_san in TRANSPOSITIONS]
+    path = str(tmp_path_factory.mktemp('book') / 'book.bin')
+    write_book(path, build_book(games))
+    with OpeningBook(path) as opened:
+        yield opened
+
+
+@pytest.mark.parametrize('orders, fens, next_san', TRANSPOSITIONS)
+def test_transpositions_find_the_book_move(book, orders, fens, next_san):
+    positions = [_play(order.split()) for order in orders] + [_play([], fen) for fen in fens]
+    for position in positions:
+        assert next_san in [move_to_san(position, move) for move, _ in book.moves(position)]
+
+
+def test_unknown_position_has_no_moves(book):
+    assert book.moves(_play('a3 h6'.split())) == []
+
+
+def test_en_passant_file_is_kept_when_a_capture_is_possible():
+    sans, fen = EN_PASSANT_PAIR
+    played, without = _play(sans.split()), _play([], fen)
+    assert played.to_fen().split()[:3] == without.to_fen().split()[:3]
+    assert book_key(played) != book_key(without)
@@ -0,0 +1,20 @@
+from bitboard import START_FEN
+from chess_core import ChessGame
+
+
+def test_make_move_plays_for_the_side_to_move():
+    game = ChessGame()
+    assert game.make_move((4, 6), (4, 4))
+    assert game.fen() == "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1"
+
+
+def test_make_move_rejects_the_wrong_side():
+    game = ChessGame()
+    assert not game.make_move((4, 1), (4, 3))
+    assert game.fen() == START_FEN
+
+
+def test_make_move_rejects_an_empty_square():
+    game = ChessGame()
+    assert not game.make_move((4, 4), (4, 3))
+    assert game.fen() == START_FEN
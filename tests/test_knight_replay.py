@@ -0,0 +1,58 @@
+import pytest
+
+import knight_replay
+from knight_replay import START, SessionRecorder, new_game, read_session, replay
+
+
+def _record(path, seed=3, board_size=8, max_enemies=5, moves=60):
+    game = new_game(seed, 1, max_enemies, 5, board_size)
+    recorder = SessionRecorder(game, seed, str(path))
+    recorder.apply(START)
+    for i in range(moves):
+        if game.game_over:
+            break
+        recorder.apply(i % len(game.valid_moves))
+    recorder.close()
+    return game
+
+
+@pytest.mark.parametrize('board_size, max_enemies', [(8, 5), (300, 400)])
+def test_replay_matches_the_recording(tmp_path, board_size, max_enemies):
+    path = tmp_path / 'session.ksr'
+    recorded = _record(path, board_size=board_size, max_enemies=max_enemies)
+    game, matched = replay(read_session(str(path)))
+    assert matched is True
+    assert (game.turn_count, game.score) == (recorded.turn_count, recorded.score)
+
+
+def test_changed_footer_is_a_mismatch(tmp_path):
+    path = tmp_path / 'session.ksr'
+    _record(path)
+    session = read_session(str(path))
+    turns, score, digest = session.final
+    _, matched = replay(session._replace(final=(turns, score + 1, digest)))
+    assert matched is False
+
+
+def test_cut_log_is_unverified(tmp_path):
+    path = tmp_path / 'session.ksr'
+    _record(path)
+    data = path.read_bytes()
+    path.write_bytes(data[:-knight_replay.FOOTER.size - knight_replay.RECORD.size])
+    _, matched = replay(read_session(str(path)))
+    assert matched is None
+
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / 'session.ksr'
+    path.write_bytes(b'KSR2' + bytes(64))
+    with pytest.raises(ValueError):
+        read_session(str(path))
+
+
+def test_repeat_must_be_positive(tmp_path):
+    path = tmp_path / 'session.ksr'
+    _record(path)
+    with pytest.raises(SystemExit):
+        knight_replay.main([str(path), '--repeat', '0'])
+    assert knight_replay.main([str(path), '--repeat', '2']) == 0
@@ -0,0 +1,15 @@
+import pytest
+
+from knight_survival_batch import episode_seeds, verify
+
+
+@pytest.mark.parametrize('policy', ['greedy', 'random'])
+@pytest.mark.parametrize('params', [
+    {},
+    {'max_enemies': 40, 'spawn_rate': 3, 'width': 37},
+    {'max_enemies': 200, 'width': 64},
+    {'max_turns': 0},
+])
+def test_batch_matches_the_scalar_game(policy, params):
+    params = dict(params, max_turns=params.get('max_turns', 200))
+    assert verify(episode_seeds(300, seed=7), policy, **params) == []
@@ -0,0 +1,69 @@
+import pytest
+
+from knight_survival_core import (ENEMY_CODES, ENEMY_TYPES, MOVE_OFFSETS, PLAYER,
+                                  KnightSurvivalGame, SplitMix64, distance_table, move_ranks,
+                                  on_board, square_index)
+
+
+def _bfs(piece, target, board_size):
+    distances = {target: 0}
+    frontier = [target]
+    while frontier:
+        next_frontier = []
+        for x, y in frontier:
+            for dx, dy in MOVE_OFFSETS[piece]:
+                pos = (x + dx, y + dy)
+                if on_board(pos, board_size) and pos not in distances:
+                    distances[pos] = distances[(x, y)] + 1
+                    next_frontier.append(pos)
+        frontier = next_frontier
+    return distances
+
+
+@pytest.mark.parametrize('piece', ENEMY_TYPES)
+@pytest.mark.parametrize('board_size, target', [(8, (4, 4)), (8, (0, 7)), (11, (3, 9))])
+def test_distance_table_matches_breadth_first_search(piece, board_size, target):
+    expected = _bfs(piece, target, board_size)
+    table = distance_table(piece, target, board_size)
+    unreachable = board_size * board_size
+    for y in range(board_size):
+        for x in range(board_size):
+            assert table[y * board_size + x] == expected.get((x, y), unreachable)
+
+
+def test_knight_distances():
+    table = distance_table('knight', (0, 0))
+    assert table[square_index((1, 1))] == 4
+    assert table[square_index((7, 7))] == 6
+
+
+def _game_with(enemies, player=(4, 4)):
+    game = KnightSurvivalGame(rng=SplitMix64(1))
+    game.squares[square_index(game.player_pos)] = 0
+    game.player_pos = player
+    game.squares[square_index(player)] = PLAYER
+    for pos, name in enemies:
+        game.squares[square_index(pos)] = ENEMY_CODES[name]
+        game.enemies.append(pos)
+    return game
+
+
+def test_enemy_skips_occupied_squares():
+    game = _game_with([((3, 3), 'rook'), ((2, 2), 'bishop')])
+    game.move_enemies()
+    ranks = move_ranks('bishop', (4, 4))
+    # Ties go to the first move in MOVE_OFFSETS order
+    free = [(2 + dx, 2 + dy) for dx, dy in MOVE_OFFSETS['bishop'] if (2 + dx, 2 + dy) != (3, 3)]
+    best = min(free, key=ranks.__getitem__)
+    assert game.enemies == [(3, 3), best]
+    assert game.squares[square_index(best)] == ENEMY_CODES['bishop']
+    assert not game.squares[square_index((2, 2))]
+
+
+def test_enemy_captures_the_player():
+    game = _game_with([((2, 3), 'knight'), ((0, 0), 'bishop')])
+    game.move_enemies()
+    assert game.game_over
+    assert game.squares[square_index((4, 4))] == ENEMY_CODES['knight']
+    # The turn stops at the capture
+    assert game.squares[square_index((0, 0))] == ENEMY_CODES['bishop']
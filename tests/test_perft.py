@@ -0,0 +1,16 @@
+import pytest
+
+from perft import POSITIONS, QUICK_DEPTH, perft, perft_mates
+from bitboard import Position
+
+
+@pytest.mark.parametrize('name', sorted(POSITIONS))
+def test_perft_matches_reference_counts(name):
+    fen, expected_nodes, _ = POSITIONS[name]
+    for depth in range(1, QUICK_DEPTH + 1):
+        assert perft(Position.from_fen(fen), depth) == expected_nodes[depth], depth
+
+
+def test_perft_counts_checkmates():
+    fen, expected_nodes, expected_mates = POSITIONS['position4']
+    assert perft_mates(Position.from_fen(fen), 3) == (expected_nodes[3], expected_mates[3])
@@ -0,0 +1,18 @@
+import io
+import os
+import sys
+
+import pgn
+
+
+def test_open_pgn_leaves_stdin_open(monkeypatch):
+    read_fd, write_fd = os.pipe()
+    os.write(write_fd, b'[Event "x"]\n\n1. e4 e5 2. Nf3 1-0\n')
+    os.close(write_fd)
+    stdin = io.TextIOWrapper(io.FileIO(read_fd, 'r'))
+    monkeypatch.setattr(sys, 'stdin', stdin)
+    with pgn.open_pgn('-') as f:
+        games = list(pgn.read_games(f))
+    assert [game.moves for game in games] == [['e4', 'e5', 'Nf3']]
+    assert not stdin.closed
+    stdin.close()
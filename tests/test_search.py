@@ -0,0 +1,23 @@
+from bitboard import Position, move_to_uci
+from perft import POSITIONS
+from search import MATE, Engine
+
+
+def test_finds_mate_in_one():
+    info = Engine(hash_mb=1).search(Position.from_fen("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1"),
+                                    depth=3)
+    assert move_to_uci(info.best_move) == 'a1a8'
+    assert info.score == MATE - 1
+
+
+def test_takes_a_hanging_queen():
+    info = Engine(hash_mb=1).search(Position.from_fen("4k3/8/8/3q4/8/8/3R4/4K3 w - - 0 1"),
+                                    depth=2)
+    assert move_to_uci(info.best_move) == 'd2d5'
+
+
+def test_search_leaves_the_position_unchanged():
+    position = Position.from_fen(POSITIONS['kiwipete'][0])
+    fen = position.to_fen()
+    Engine(hash_mb=1).search(position, depth=2)
+    assert position.to_fen() == fen
@@ -0,0 +1,45 @@
+import pytest
+
+import tablebase
+import tablebase_gen
+from bitboard import Position
+from tablebase import DRAW, LOSS, WIN
+
+
+@pytest.fixture(scope='module', autouse=True)
+def tables(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('tablebases'))
+    for name in ('KQK', 'KRK'):
+        tablebase_gen.generate(name, directory, progress=lambda line: None)
+    saved = tablebase.TABLEBASE_DIR
+    tablebase.TABLEBASE_DIR = directory
+    tablebase._tables.clear()
+    yield
+    tablebase.TABLEBASE_DIR = saved
+    tablebase._tables.clear()
+
+
+@pytest.mark.parametrize('fen, expected', [
+    ("7k/Q7/6K1/8/8/8/8/8 w - - 0 1", (WIN, 1)),
+    ("7k/6Q1/6K1/8/8/8/8/8 b - - 0 1", (LOSS, 0)),
+    ("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1", (DRAW, 0)),
+    ("8/8/8/8/8/8/8/K1k5 w - - 0 1", (DRAW, 0)),
+])
+def test_probe(fen, expected):
+    assert tablebase.probe(Position.from_fen(fen)) == expected
+
+
+@pytest.mark.parametrize('fen', [
+    "8/8/8/4k3/8/8/8/R3K3 w - - 0 1",
+    "7K/8/8/8/8/8/8/q6k w - - 0 1",
+])
+def test_principal_variation_ends_in_mate(fen):
+    position = Position.from_fen(fen)
+    result, plies = tablebase.probe(position)
+    pv = tablebase.principal_variation(position)
+    # The side to move is mated after plies plies, whoever is winning
+    assert len(pv) == plies
+    for move in pv:
+        position.make_move(move)
+    assert position.is_checkmate()
+    assert result == (WIN if plies & 1 else LOSS)
@@ -0,0 +1,26 @@
+"""Shared font registry and rendered-text cache for the pygame front-ends.
+
+SysFont does a system font lookup every time it is called, and rendering
+text allocates a new surface, so both are cached here. Rendered surfaces are
+shared: blit them, don't draw on them.
+"""
+from functools import lru_cache
+
+import pygame
+
+from profiling import PROFILER
+
+DEFAULT_FONT = 'Arial'
+
+
+@lru_cache(maxsize=None)
+def get_font(size, name=DEFAULT_FONT):
+    PROFILER.count('font load')
+    return pygame.font.SysFont(name, size)
+
+
+@lru_cache(maxsize=256)
+def render_text(text, size, color, name=DEFAULT_FONT, antialias=True):
+    """Rendered surface for (text, size, color), re-rendered only on a cache miss."""
+    PROFILER.count('text render')
+    return get_font(size, name).render(text, antialias, color)
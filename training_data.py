@@ -0,0 +1,366 @@
+"""Export labeled positions from self-play or PGN games as memory-mappable NumPy shards.
+
+    python training_data.py selfplay data/ --games 100000 --depth 2
+    python training_data.py pgn data/ games.pgn.gz --limit 500000
+
+Every game is replayed through chess_core.ChessGame. Each position a move is
+played from becomes one record:
+
+    planes   bool  (12, 8, 8)  white P N B R Q K, then black; rows are
+                               ranks 8 to 1, as in the game's (x, y)
+    mask     uint8 (512,)      packed 64 x 64 from/to bits of the moves
+                               ChessGame.get_valid_moves allows, with
+                               squares numbered y * 8 + x
+    outcome  int8              1, 0 or -1 for the side to move
+    side     uint8             0 white to move, 1 black
+
+Records go to shard-00000.npy, shard-00001.npy, ... in the output
+directory. Each holds exactly --shard-size records, except the last, which
+holds whatever is left over:
+
+    shards = load_shards('data')
+    planes = shards[0]['planes']
+    mask = np.unpackbits(shards[0]['mask'], axis=-1).reshape(-1, 64, 64)
+
+Games are played or parsed in batches on a process pool. Games that end
+without a result are dropped: PGN games marked '*', and self-play games
+still going at --max-plies. Self-play games are scored as draws under the
+fifty-move rule and threefold repetition. They start with --random-plies
+random moves, then use the engine at --depth, or random moves with
+--depth 0. Game n always comes out the same, whichever worker plays it.
+
+manifest.json records the settings and how far the full shards go. Run
+the same command again to resume after an interruption. A larger --games
+or --limit carries on from there, rewriting the short last shard.
+"""
+import argparse
+import collections
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from analyze_pgn import read_texts
+from bitboard import to_pos
+from chess_core import ChessGame
+from pgn import PGNError, parse_game, parse_san
+from pieces import color_of, type_of
+from search import Engine
+
+RECORD = np.dtype([('planes', np.bool_, (12, 8, 8)), ('mask', np.uint8, (512,)),
+                   ('outcome', np.int8), ('side', np.uint8)])
+
+DEFAULT_SHARD_SIZE = 1 << 16
+MANIFEST = 'manifest.json'
+# Seconds between progress lines
+PROGRESS_EVERY = 5.0
+# A fresh, small table per game keeps engine self-play reproducible
+SELFPLAY_HASH_MB = 1
+
+# Value of each result for white
+RESULT_VALUES = {'1-0': 1, '0-1': -1, '1/2-1/2': 0}
+
+# Plane per pieces.py code, -1 for empty squares
+_PLANE_OF_CODE = np.full(16, -1, dtype=np.int8)
+for _code in range(16):
+    if _code & 7:
+        _PLANE_OF_CODE[_code] = color_of(_code) * 6 + type_of(_code)
+
+
+def shard_path(directory, index):
+    return os.path.join(directory, f"shard-{index:05d}.npy")
+
+
+def encode_position(game, record):
+    """Fill a RECORD row with game's current pieces and valid-move mask."""
+    position = game.position
+    codes = np.frombuffer(position.mailbox, dtype=np.uint8)
+    squares = np.flatnonzero(codes)
+    # Square numbers count from a1; y counts from rank 8
+    record['planes'][_PLANE_OF_CODE[codes[squares]], 7 - (squares >> 3), squares & 7] = True
+    bits = np.zeros(4096, dtype=np.bool_)
+    side = position.side
+    for sq in squares.tolist():
+        if color_of(position.mailbox[sq]) != side:
+            continue
+        x, y = to_pos(sq)
+        start = (y * 8 + x) * 64
+        for tx, ty in game.get_valid_moves((x, y)):
+            bits[start + ty * 8 + tx] = True
+    record['mask'] = np.packbits(bits)
+    record['side'] = side
+
+
+def _label(records, result):
+    value = RESULT_VALUES[result]
+    records['outcome'] = np.where(records['side'] == 0, value, -value)
+    return records
+
+
+def selfplay_game(index, seed, depth, random_plies, max_plies):
+    """(records, status) for self-play game index; status is 'ok' or 'unfinished'."""
+    rng = random.Random(seed * 1000003 + index)
+    engine = Engine(SELFPLAY_HASH_MB) if depth else None
+    game = ChessGame()
+    records = np.zeros(max_plies, dtype=RECORD)
+    seen = collections.Counter()
+    ply = 0
+    result = game.result
+    while result is None:
+        if ply == max_plies:
+            return None, 'unfinished'
+        position = game.position
+        seen[position.key] += 1
+        if position.halfmove_clock >= 100 or seen[position.key] >= 3:
+            result = '1/2-1/2'
+            break
+        encode_position(game, records[ply])
+        if engine is None or ply < random_plies:
+            move = rng.choice(position.legal_moves())
+        else:
+            move = engine.search(position, depth=depth).best_move
+        game.play_move(move)
+        ply += 1
+        result = game.result
+    return _label(records[:ply], result), 'ok'
+
+
+def pgn_game(text):
+    """(records, status) for one game's PGN text; status is 'ok', 'unfinished' or 'error'."""
+    parsed = parse_game(text)
+    if parsed.result not in RESULT_VALUES:
+        return None, 'unfinished'
+    try:
+        game = ChessGame(fen=parsed.headers.get('FEN'))
+    except (ValueError, IndexError):
+        return None, 'error'
+    records = np.zeros(len(parsed.moves), dtype=RECORD)
+    for ply, san in enumerate(parsed.moves):
+        if game.game_over:
+            return None, 'error'
+        try:
+            move = parse_san(game.position, san)
+        except PGNError:
+            return None, 'error'
+        encode_position(game, records[ply])
+        game.play_move(move)
+    return _label(records, parsed.result), 'ok'
+
+
+def _selfplay_batch(batch):
+    indexes, options = batch
+    return [selfplay_game(index, **options) for index in indexes]
+
+
+def _pgn_batch(batch):
+    texts, _ = batch
+    return [pgn_game(text) for text in texts]
+
+
+def export_games(batches, worker, workers=None):
+    """Yield (records, status) per game for batches of (items, options), in order.
+
+    At most two batches per worker are queued at a time, as in analyze_pgn.
+    """
+    if workers == 1:
+        for batch in batches:
+            yield from worker(batch)
+        return
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = collections.deque()
+        for batch in batches:
+            pending.append(pool.submit(worker, batch))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+class ShardWriter:
+    """Cuts a stream of per-game records into shards and keeps the manifest up to date.
+
+    The manifest's next_game and skip say where the records after the last
+    full shard start: skip records into game next_game.
+    """
+
+    def __init__(self, directory, settings, shard_size):
+        self.directory = directory
+        self.shard_size = shard_size
+        self.manifest = {'settings': settings, 'shard_size': shard_size, 'shards': 0,
+                         'partial': 0, 'next_game': 0, 'skip': 0}
+        path = os.path.join(directory, MANIFEST)
+        if os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            if saved['settings'] != settings or saved['shard_size'] != shard_size:
+                raise ValueError(f"{directory} holds an export made with other settings: "
+                                 f"{saved['settings']}, shard size {saved['shard_size']}")
+            self.manifest = saved
+        # (game index, records of that game already written, records) not yet in a full shard
+        self._chunks = collections.deque()
+        self._buffered = 0
+        self._next_game = self.manifest['next_game']
+
+    @property
+    def shards(self):
+        return self.manifest['shards']
+
+    @property
+    def positions(self):
+        return self.manifest['shards'] * self.shard_size + self._buffered
+
+    def add(self, game_index, records):
+        """Buffer game game_index's records (None for a dropped game), writing full shards."""
+        self._next_game = game_index + 1
+        if records is not None and len(records):
+            self._chunks.append((game_index, 0, records))
+            self._buffered += len(records)
+        while self._buffered >= self.shard_size:
+            self._write(self.shard_size)
+
+    def finish(self):
+        """Write whatever is buffered as a short last shard."""
+        # The resume point stays at the last full shard, so a longer run rewrites this one
+        if self._buffered:
+            self._save_shard(np.concatenate([records for _, _, records in self._chunks]))
+        self.manifest['partial'] = self._buffered
+        self._save_manifest()
+
+    def _write(self, count):
+        parts = []
+        needed = count
+        while needed:
+            game_index, offset, records = self._chunks.popleft()
+            if len(records) > needed:
+                self._chunks.appendleft((game_index, offset + needed, records[needed:]))
+                records = records[:needed]
+            parts.append(records)
+            needed -= len(records)
+        self._buffered -= count
+        self._save_shard(np.concatenate(parts))
+        self.manifest['shards'] += 1
+        self.manifest['partial'] = 0
+        if self._chunks:
+            self.manifest['next_game'], self.manifest['skip'] = self._chunks[0][:2]
+        else:
+            self.manifest['next_game'], self.manifest['skip'] = self._next_game, 0
+        self._save_manifest()
+
+    def _save_shard(self, records):
+        path = shard_path(self.directory, self.manifest['shards'])
+        with open(path + '.tmp', 'wb') as f:
+            np.save(f, records)
+        os.replace(path + '.tmp', path)
+
+    def _save_manifest(self):
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(path + '.tmp', path)
+
+
+def load_shards(directory):
+    """The export's shards, memory-mapped read-only, in order."""
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    count = manifest['shards'] + (1 if manifest['partial'] else 0)
+    return [np.load(shard_path(directory, i), mmap_mode='r') for i in range(count)]
+
+
+def _batched(items, batch_size, options):
+    items = iter(items)
+    while True:
+        chunk = list(itertools.islice(items, batch_size))
+        if not chunk:
+            return
+        yield chunk, options
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', choices=('selfplay', 'pgn'))
+    parser.add_argument('output', help="directory for the shards and manifest.json")
+    parser.add_argument('paths', nargs='*', help="PGN files for the pgn source (.gz/.bz2/.xz ok)")
+    parser.add_argument('--games', type=int, default=1000, help="self-play games to play")
+    parser.add_argument('--limit', type=int, default=None, help="stop after this many PGN games")
+    parser.add_argument('--seed', type=int, default=0, help="self-play seed")
+    parser.add_argument('--depth', type=int, default=0,
+                        help="self-play engine depth after the random plies (0: random moves)")
+    parser.add_argument('--random-plies', type=int, default=8,
+                        help="random moves at the start of each self-play game")
+    parser.add_argument('--max-plies', type=int, default=400,
+                        help="self-play games still going after this many plies are dropped")
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE,
+                        help="records per shard file")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes (default: CPU count, 1 runs in-process)")
+    parser.add_argument('--batch-size', type=int, default=16,
+                        help="games sent to a worker at a time")
+    args = parser.parse_args(argv)
+
+    if args.source == 'pgn':
+        if not args.paths:
+            parser.error("the pgn source needs PGN files")
+        settings = {'source': 'pgn', 'paths': [os.path.abspath(p) for p in args.paths]}
+    else:
+        settings = {'source': 'selfplay', 'seed': args.seed, 'depth': args.depth,
+                    'random_plies': args.random_plies, 'max_plies': args.max_plies}
+    os.makedirs(args.output, exist_ok=True)
+    try:
+        writer = ShardWriter(args.output, settings, args.shard_size)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    first, skip = writer.manifest['next_game'], writer.manifest['skip']
+    if args.source == 'pgn':
+        texts = itertools.islice(read_texts(args.paths), first, args.limit)
+        results = export_games(_batched(texts, args.batch_size, None), _pgn_batch, args.workers)
+    else:
+        options = {key: settings[key] for key in ('seed', 'depth', 'random_plies', 'max_plies')}
+        indexes = range(first, max(first, args.games))
+        results = export_games(_batched(indexes, args.batch_size, options), _selfplay_batch,
+                               args.workers)
+    if first or skip:
+        print(f"resuming at game {first + 1} after {writer.positions:,} positions",
+              file=sys.stderr)
+
+    statuses = collections.Counter()
+    start = last_report = time.perf_counter()
+    start_positions = writer.positions
+    try:
+        for game_index, (records, status) in enumerate(results, first):
+            if records is not None and game_index == first and skip:
+                records = records[skip:]
+            statuses[status] += 1
+            writer.add(game_index, records)
+            now = time.perf_counter()
+            if now - last_report >= PROGRESS_EVERY:
+                last_report = now
+                print(f"game {game_index + 1:,}: {writer.positions:,} positions, "
+                      f"{writer.shards} shards, "
+                      f"{(writer.positions - start_positions) / (now - start):,.0f} positions/s",
+                      file=sys.stderr)
+        writer.finish()
+    except KeyboardInterrupt:
+        print(f"interrupted; {writer.shards} full shards kept, run again to resume",
+              file=sys.stderr)
+        return 130
+    elapsed = time.perf_counter() - start
+    positions = writer.positions - start_positions
+
+    print(f"{sum(statuses.values())} games: {statuses['ok']} exported, "
+          f"{statuses['unfinished']} unfinished, {statuses['error']} unreadable")
+    print(f"{positions:,} positions in {elapsed:.2f}s ({positions / elapsed:,.0f} positions/s); "
+          f"{writer.positions:,} in {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
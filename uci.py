@@ -0,0 +1,258 @@
+"""UCI front-end for the search engine, for chess GUIs and match runners.
+
+    python uci.py
+
+Supports uci, isready, ucinewgame, setoption (Hash, Clear Hash, OwnBook,
+BookFile), position (startpos or fen, with moves), go (depth, nodes,
+movetime, wtime/btime/winc/binc/movestogo, infinite, ponder), ponderhit,
+stop and quit. The search runs on its own thread while stdin keeps being read, so
+stop and quit take effect during a search.
+"""
+import sys
+import threading
+import time
+
+from bitboard import START_FEN, move_to_uci
+from book import OpeningBook
+from chess_core import ChessGame
+from search import MATE, MAX_PLY, Engine
+
+NAME = 'PyGame chess engine'
+AUTHOR = 'PyGame chess engine authors'
+
+DEFAULT_HASH_MB = 16
+MAX_HASH_MB = 1024
+
+# Assume this many moves remain when the GUI does not send movestogo
+DEFAULT_MOVES_TO_GO = 30
+# Seconds kept in reserve for process and GUI latency
+MOVE_OVERHEAD = 0.05
+
+
+def allocate_time(remaining, increment=0.0, moves_to_go=None):
+    """Seconds to spend on this move given the clock (all values in seconds)."""
+    moves_to_go = moves_to_go or DEFAULT_MOVES_TO_GO
+    budget = remaining / moves_to_go + increment * 0.8
+    return max(0.01, min(budget, remaining / 2) - MOVE_OVERHEAD)
+
+
+def format_score(score):
+    if score >= MATE - MAX_PLY:
+        return f"mate {(MATE - score + 1) // 2}"
+    if score <= -MATE + MAX_PLY:
+        return f"mate -{(MATE + score) // 2}"
+    return f"cp {score}"
+
+
+class UCIEngine:
+    """UCI session state: the game, the engine and the running search, if any.
+
+    handle() takes one command line; replies go to output, one line per
+    write, from both the reading thread and the search thread.
+    """
+
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self._output_lock = threading.Lock()
+        self.engine = Engine(DEFAULT_HASH_MB)
+        self.book = None
+        self.own_book = False
+        self.game = ChessGame()
+        self._thread = None
+        self._go_options = {}
+        # Set when a pondering or infinite search may report its best move
+        self._release = threading.Event()
+        # Set by stop(); search() resets the engine's own flag when it starts,
+        # so a stop sent before that would otherwise be lost
+        self._stopping = threading.Event()
+
+    def send(self, line):
+        with self._output_lock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+    def handle(self, line):
+        """Process one command; returns False after quit."""
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == 'quit':
+            self.stop()
+            return False
+        handler = getattr(self, 'cmd_' + command, None)
+        if handler is not None:
+            handler(args)
+        return True
+
+    def cmd_uci(self, args):
+        self.send(f"id name {NAME}")
+        self.send(f"id author {AUTHOR}")
+        self.send(f"option name Hash type spin default {DEFAULT_HASH_MB} min 1 max {MAX_HASH_MB}")
+        self.send("option name Clear Hash type button")
+        self.send("option name OwnBook type check default false")
+        self.send("option name BookFile type string default <empty>")
+        self.send("uciok")
+
+    def cmd_isready(self, args):
+        self.send("readyok")
+
+    def cmd_ucinewgame(self, args):
+        self.stop()
+        self.engine.tt.clear()
+        self.game = ChessGame(book=self.book)
+
+    def cmd_setoption(self, args):
+        # setoption name <id...> [value <x...>]
+        text = ' '.join(args)
+        name, _, value = text.partition(' value ')
+        name = name.removeprefix('name ').strip().lower()
+        self.stop()
+        if name == 'hash':
+            try:
+                size = min(max(int(value), 1), MAX_HASH_MB)
+            except ValueError:
+                return
+            self.engine.set_hash_size(size)
+        elif name == 'clear hash':
+            self.engine.tt.clear()
+        elif name == 'ownbook':
+            self.own_book = value.strip().lower() == 'true'
+        elif name == 'bookfile':
+            if self.book is not None:
+                self.book.close()
+            path = value.strip()
+            try:
+                self.book = OpeningBook(path) if path and path != '<empty>' else None
+            except (OSError, ValueError) as e:
+                self.book = None
+                self.send(f"info string cannot open book {path}: {e}")
+            self.game.book = self.book
+
+    def cmd_position(self, args):
+        self.stop()
+        if 'moves' in args:
+            split = args.index('moves')
+            args, moves = args[:split], args[split + 1:]
+        else:
+            moves = []
+        if args[:1] == ['fen']:
+            fen = ' '.join(args[1:])
+        else:
+            fen = START_FEN
+        try:
+            game = ChessGame(fen, self.book)
+        except (ValueError, IndexError):
+            return
+        for text in moves:
+            legal = {move_to_uci(move): move for move in game.position.legal_moves()}
+            if text not in legal:
+                break
+            game.play_move(legal[text])
+        self.game = game
+
+    def cmd_go(self, args):
+        self.stop()
+        options = {}
+        flags = set()
+        i = 0
+        while i < len(args):
+            if args[i] in ('infinite', 'ponder'):
+                flags.add(args[i])
+                i += 1
+            elif args[i] == 'searchmoves':
+                break  # not supported; search all moves
+            else:
+                if i + 1 < len(args):
+                    try:
+                        options[args[i]] = int(args[i + 1])
+                    except ValueError:
+                        pass
+                i += 2
+
+        if self.own_book and not flags:
+            move = self.game.book_move()
+            if move:
+                self.send(f"bestmove {move_to_uci(move)}")
+                return
+
+        position = self.game.position
+        movetime = options['movetime'] / 1000 if 'movetime' in options else None
+        if flags:
+            movetime = None  # infinite until stop; pondering gets the clock on ponderhit
+        elif movetime is None:
+            movetime = self._clock_time(options, position.side)
+        self._go_options = options
+        self._release.clear()
+        self._stopping.clear()
+        if not flags:
+            self._release.set()
+
+        self._thread = threading.Thread(
+            target=self._search, args=(position.copy(), options.get('depth'), movetime,
+                                       options.get('nodes')),
+            daemon=True)
+        self._thread.start()
+
+    def _clock_time(self, options, side):
+        prefix = 'wb'[side]
+        if prefix + 'time' not in options:
+            return None
+        return allocate_time(options[prefix + 'time'] / 1000,
+                             options.get(prefix + 'inc', 0) / 1000, options.get('movestogo'))
+
+    def cmd_ponderhit(self, args):
+        # The predicted move was played: keep searching, now against our clock
+        if self._thread is None:
+            return
+        movetime = self._clock_time(self._go_options, self.game.position.side)
+        if movetime is not None:
+            self.engine.deadline = time.perf_counter() + movetime
+        self._release.set()
+
+    def cmd_stop(self, args):
+        self.stop()
+
+    def stop(self):
+        """End any running search; its bestmove is sent before this returns."""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self.engine.stop()
+        self._release.set()
+        self._thread.join()
+        self._thread = None
+
+    def _search(self, position, depth, movetime, nodes):
+        def report(info):
+            pv = ' '.join(move_to_uci(move) for move in info.pv)
+            self.send(f"info depth {info.depth} score {format_score(info.score)} "
+                      f"nodes {info.nodes} nps {info.nps:.0f} time {info.time * 1000:.0f} "
+                      f"hashfull {self.engine.tt.hashfull()} pv {pv}")
+            if self._stopping.is_set():
+                self.engine.stop()
+
+        result = self.engine.search(position, depth=depth, movetime=movetime, nodes=nodes,
+                                    info=report)
+        # UCI: an infinite or pondering search reports only once stopped
+        self._release.wait()
+        if not result.pv:
+            self.send("bestmove 0000")
+        elif len(result.pv) > 1:
+            self.send(f"bestmove {move_to_uci(result.pv[0])} ponder {move_to_uci(result.pv[1])}")
+        else:
+            self.send(f"bestmove {move_to_uci(result.pv[0])}")
+
+
+def main():
+    session = UCIEngine()
+    for line in sys.stdin:
+        if not session.handle(line):
+            break
+    else:
+        session.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())